@@ -0,0 +1,111 @@
+"""Bootstrap confidence intervals for per-cell proportions, drawn as count arrays.
+
+Resampling a cell's n binary trials with replacement only changes how many
+of them succeed, so each resample is one binomial draw of n at the cell's
+observed rate. All resamples for a block of cells are drawn as one
+(cells, resamples) array and reduced to percentile intervals, instead of
+looping over pandas resamples.
+
+Cells are split into fixed-size chunks, each with its own spawned seed, so
+the intervals for a given seed are the same whether the chunks run in this
+process or across a process pool.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+N_RESAMPLES = 10000
+CONFIDENCE = 0.95
+CHUNK_CELLS = 64
+
+
+def _chunk_intervals(k, n, n_resamples, confidence, seed):
+    rng = np.random.default_rng(seed)
+    rate = np.where(n > 0, k / np.maximum(n, 1), 0.0)
+    successes = rng.binomial(n[:, None], rate[:, None], size=(len(n), n_resamples))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        resampled = successes / n[:, None]
+    tail = (1.0 - confidence) / 2.0
+    low, high = np.quantile(resampled, [tail, 1.0 - tail], axis=1)
+    empty = n == 0
+    low[empty] = np.nan
+    high[empty] = np.nan
+    return low, high
+
+
+def bootstrap_proportions(k, n, n_resamples=N_RESAMPLES, confidence=CONFIDENCE, seed=None, workers=None):
+    """Percentile intervals for k / n in every cell; arrays of any matching shape.
+
+    Returns (low, high) shaped like `k`, NaN where n is 0. `workers` > 1
+    spreads the chunks over that many processes.
+    """
+    k = np.asarray(k, dtype=np.int64)
+    n = np.asarray(n, dtype=np.int64)
+    shape = k.shape
+    k, n = k.ravel(), n.ravel()
+    bounds = range(0, len(n), CHUNK_CELLS)
+    seeds = np.random.SeedSequence(seed).spawn(len(bounds))
+    chunks = [
+        (k[start:start + CHUNK_CELLS], n[start:start + CHUNK_CELLS], n_resamples, confidence, chunk_seed)
+        for start, chunk_seed in zip(bounds, seeds)
+    ]
+    if workers and workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_chunk_intervals, *zip(*chunks)))
+    else:
+        results = [_chunk_intervals(*chunk) for chunk in chunks]
+    if not results:
+        return np.full(shape, np.nan), np.full(shape, np.nan)
+    low = np.concatenate([low for low, _ in results]).reshape(shape)
+    high = np.concatenate([high for _, high in results]).reshape(shape)
+    return low, high
+
+
+def accuracy_intervals(data, by=("datetime_bin", "locs", "abs_value_diff"), **kwargs):
+    """Mean accuracy, trial count and a bootstrap interval for every `by` cell.
+
+    Keyword arguments go to bootstrap_proportions.
+    """
+    agg = (
+        data.groupby(list(by), observed=True)
+            .agg(
+                accuracy_mean=("accuracy", "mean"),
+                n_trials=("accuracy", "size"),
+                n_correct=("accuracy", "sum"),
+            )
+            .reset_index()
+    )
+    low, high = bootstrap_proportions(agg["n_correct"].to_numpy(), agg["n_trials"].to_numpy(), **kwargs)
+    return agg.drop(columns="n_correct").assign(ci_low=low, ci_high=high)
+
+
+def choice_tensor_intervals(tensor, **kwargs):
+    """Add `ci_low` / `ci_high` (G, K, K) to a read_data.choice_tensor result.
+
+    Each unordered pair is resampled once and the reverse cell is mirrored,
+    so P(a over b) and P(b over a) stay complementary in every resample.
+    Keyword arguments go to bootstrap_proportions.
+    """
+    counts, n = tensor["counts"], tensor["n"]
+    upper = np.triu_indices(counts.shape[1], k=1)
+    low_upper, high_upper = bootstrap_proportions(counts[:, upper[0], upper[1]], n[:, upper[0], upper[1]], **kwargs)
+    low = np.full(counts.shape, np.nan)
+    high = np.full(counts.shape, np.nan)
+    low[:, upper[0], upper[1]] = low_upper
+    high[:, upper[0], upper[1]] = high_upper
+    low[:, upper[1], upper[0]] = 1.0 - high_upper
+    high[:, upper[1], upper[0]] = 1.0 - low_upper
+    return dict(tensor, ci_low=low, ci_high=high)
+
+
+def interval_labels(mean, low, high, n=None):
+    """Heatmap annotations: mean, [low, high] and optionally the trial count."""
+    mean, low, high = (np.asarray(values, dtype=float) for values in (mean, low, high))
+    labels = np.full(mean.shape, "", dtype=object)
+    for index in zip(*np.nonzero(~np.isnan(mean))):
+        text = f"{mean[index]:.2f}\n[{low[index]:.2f}, {high[index]:.2f}]"
+        if n is not None:
+            text += f"\n(n={int(np.asarray(n)[index])})"
+        labels[index] = text
+    return labels
+
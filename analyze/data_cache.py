@@ -0,0 +1,139 @@
+"""Incremental local cache of the `data` table for the analysis scripts.
+
+Each sync fetches only the rows above the last rowid seen and appends them
+as one pickled DataFrame per date under `<db>.cache/<date>/`, so re-running
+an analysis costs time proportional to the trials added since the last run.
+The last synced row is kept in the cache state, and the cache is rebuilt when
+that row no longer reads back the same (the database was replaced).
+
+    from analyze.data_cache import load_data
+    df = load_data("data.db")
+"""
+import glob
+import json
+import os
+import shutil
+import sqlite3
+
+import pandas as pd
+
+from analyze.trial_store import filter_frame, query_trials
+
+CACHE_FORMAT = 2
+STATE_FILE = "state.json"
+# Partition for rows without a date; only unbounded reads include it.
+UNDATED = "undated"
+
+
+def default_cache_dir(db_path):
+    return f"{os.path.abspath(db_path)}.cache"
+
+
+def _read_state(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, STATE_FILE)) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get("format") != CACHE_FORMAT:
+        return None
+    return state
+
+
+def _write_state(cache_dir, state):
+    path = os.path.join(cache_dir, STATE_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def _reset(cache_dir):
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.makedirs(cache_dir)
+    state = {"format": CACHE_FORMAT, "rowid": 0, "last_row": None}
+    _write_state(cache_dir, state)
+    return state
+
+
+def _row_contents(conn, rowid):
+    row = conn.execute("SELECT * FROM data WHERE rowid = ?", (rowid,)).fetchone()
+    return None if row is None else json.dumps(row, default=str)
+
+
+def sync(db_path, cache_dir=None):
+    """Append rows added since the last sync; returns how many were fetched."""
+    cache_dir = cache_dir or default_cache_dir(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        (max_rowid,) = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM data").fetchone()
+        state = _read_state(cache_dir)
+        # A changed last-synced row means the database was replaced or truncated.
+        if state is None or (state["rowid"] and _row_contents(conn, state["rowid"]) != state["last_row"]):
+            state = _reset(cache_dir)
+        if max_rowid == state["rowid"]:
+            return 0
+        new_rows = pd.read_sql_query(
+            "SELECT rowid AS _rowid, * FROM data WHERE rowid > ? ORDER BY rowid",
+            conn,
+            params=(state["rowid"],),
+        )
+        first, last = int(new_rows["_rowid"].iloc[0]), int(new_rows["_rowid"].iloc[-1])
+        last_row = _row_contents(conn, last)
+    finally:
+        conn.close()
+
+    for date, rows in new_rows.groupby("date", sort=False, dropna=False):
+        partition = os.path.join(cache_dir, UNDATED if pd.isna(date) else str(date))
+        os.makedirs(partition, exist_ok=True)
+        rows.reset_index(drop=True).to_pickle(os.path.join(partition, f"{first:012d}-{last:012d}.pickle"))
+    state["rowid"] = last
+    state["last_row"] = last_row
+    _write_state(cache_dir, state)
+    return len(new_rows)
+
+
+def read_cache(cache_dir, start=None, end=None, with_rowid=False):
+    """Read cached rows, optionally only the date partitions within [start, end].
+
+    With `with_rowid` each row keeps its `data` rowid in a `_rowid` column.
+    """
+    parts = []
+    for partition in sorted(glob.glob(os.path.join(cache_dir, "*", ""))):
+        date = os.path.basename(os.path.dirname(partition))
+        if date == UNDATED and (start is not None or end is not None):
+            continue
+        if (start is not None and date < start) or (end is not None and date > end):
+            continue
+        parts.extend(sorted(glob.glob(os.path.join(partition, "*.pickle"))))
+    if not parts:
+        return pd.DataFrame()
+    df = pd.concat([pd.read_pickle(part) for part in parts], ignore_index=True)
+    # A sync interrupted before its state was saved is re-fetched next time,
+    # which can leave the same rows in two part files.
+    df = df.drop_duplicates(subset="_rowid").sort_values("_rowid", kind="stable")
+    if not with_rowid:
+        df = df.drop(columns="_rowid")
+    return df.reset_index(drop=True)
+
+
+def load_data(db_path, cache_dir=None, start=None, end=None, cache=True, refresh=True, with_rowid=False, **filters):
+    """Return rows of the `data` table matching the trial_store filters.
+
+    With the cache, `db_path` is synced first (unless `refresh` is False)
+    and only the date partitions within the inclusive ISO dates [start, end]
+    are read; without it, the filters are pushed into a query against
+    `db_path` directly. `with_rowid` keeps each row's rowid in `_rowid`,
+    e.g. to join the typed table on data_rowid.
+    """
+    if not cache:
+        conn = sqlite3.connect(db_path)
+        try:
+            columns = "rowid AS _rowid, *" if with_rowid else "*"
+            return query_trials(conn, columns=columns, start=start, end=end, **filters)
+        finally:
+            conn.close()
+    cache_dir = cache_dir or default_cache_dir(db_path)
+    if refresh:
+        sync(db_path, cache_dir)
+    return filter_frame(read_cache(cache_dir, start=start, end=end, with_rowid=with_rowid), **filters)
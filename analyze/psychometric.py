@@ -0,0 +1,158 @@
+"""Batched psychometric fits: one stacked problem for every grouping cell.
+
+Each cell is fit with
+
+    P(choose left | x) = lapse + (1 - 2 * lapse) * sigmoid(slope * x + bias)
+
+where x is the left-minus-right value difference, bias is the log-odds of
+choosing left at x = 0 and lapse (in [0, 0.5)) is the symmetric lapse rate.
+All cells are solved together with damped Fisher scoring over a (cell, x)
+grid of counts, with weak priors that keep perfectly separated or
+near-empty cells finite. Standard errors come from the inverse of the
+posterior information at the optimum.
+"""
+import numpy as np
+import pandas as pd
+
+MAX_LAPSE = 0.5
+# Weak Gaussian priors on (slope, bias, lapse logit); the lapse prior centres
+# near 2% so cells without enough trials to pin it down stay sensible.
+PRIOR_MEAN = np.array([0.0, 0.0, -3.0])
+PRIOR_SD = np.array([10.0, 10.0, 2.0])
+MAX_ITER = 300
+TOLERANCE = 1e-8
+_EPS = 1e-12
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+def _predict(theta, x):
+    """Choice probabilities (C, X) and their parameter derivatives (C, X, 3)."""
+    slope, bias, eta = theta[:, 0:1], theta[:, 1:2], theta[:, 2:3]
+    s = _sigmoid(slope * x + bias)
+    sig_eta = _sigmoid(eta)
+    lapse = MAX_LAPSE * sig_eta
+    scale = 1.0 - 2.0 * lapse
+    p = lapse + scale * s
+    ds = scale * s * (1.0 - s)
+    dp = np.stack([
+        ds * x,
+        ds,
+        (1.0 - 2.0 * s) * MAX_LAPSE * sig_eta * (1.0 - sig_eta),
+    ], axis=-1)
+    return np.clip(p, _EPS, 1.0 - _EPS), dp
+
+
+def _objective(theta, x, k, n):
+    p, _ = _predict(theta, x)
+    nll = -(k * np.log(p) + (n - k) * np.log1p(-p)).sum(axis=1)
+    penalty = 0.5 * (((theta - PRIOR_MEAN) / PRIOR_SD) ** 2).sum(axis=1)
+    return nll + penalty
+
+
+def fit_counts(x, k, n, max_iter=MAX_ITER, tol=TOLERANCE):
+    """Fit every cell of a (C, X) grid of successes `k` out of `n` at levels `x`.
+
+    Returns (theta, covariance, objective, converged) with theta as
+    (slope, bias, lapse logit) per cell.
+    """
+    x = np.asarray(x, dtype=float)[None, :]
+    k = np.asarray(k, dtype=float)
+    n = np.asarray(n, dtype=float)
+    n_cells = k.shape[0]
+    prior_precision = np.diag(1.0 / PRIOR_SD ** 2)
+
+    theta = np.tile(PRIOR_MEAN, (n_cells, 1))
+    # Start the bias at the pooled log-odds of each cell.
+    rate = (k.sum(axis=1) + 0.5) / (n.sum(axis=1) + 1.0)
+    theta[:, 1] = np.log(rate / (1.0 - rate))
+    damping = np.full(n_cells, 1e-3)
+    objective = _objective(theta, x, k, n)
+    converged = np.zeros(n_cells, dtype=bool)
+
+    for _ in range(max_iter):
+        active = ~converged
+        if not active.any():
+            break
+        th = theta[active]
+        p, dp = _predict(th, x)
+        residual = (k[active] - n[active] * p) / (p * (1.0 - p))
+        gradient = -(residual[..., None] * dp).sum(axis=1) + (th - PRIOR_MEAN) / PRIOR_SD ** 2
+        weight = n[active] / (p * (1.0 - p))
+        info = np.einsum('cx,cxi,cxj->cij', weight, dp, dp) + prior_precision
+        damped = info + damping[active, None, None] * np.eye(3)
+        step = np.linalg.solve(damped, gradient[..., None])[..., 0]
+
+        candidate = th - step
+        new_objective = _objective(candidate, x, k[active], n[active])
+        improved = new_objective <= objective[active]
+        index = np.flatnonzero(active)
+        accept = index[improved]
+        theta[accept] = candidate[improved]
+        change = objective[accept] - new_objective[improved]
+        objective[accept] = new_objective[improved]
+        damping[accept] = np.maximum(damping[accept] / 10.0, 1e-9)
+        damping[index[~improved]] *= 10.0
+        converged[accept[change < tol]] = True
+        # A cell whose damping has blown up cannot improve further.
+        converged[index[~improved][damping[index[~improved]] > 1e10]] = True
+
+    p, dp = _predict(theta, x)
+    weight = n / (p * (1.0 - p))
+    info = np.einsum('cx,cxi,cxj->cij', weight, dp, dp) + prior_precision
+    covariance = np.linalg.inv(info)
+    return theta, covariance, objective, converged
+
+
+def count_grid(data, by, x="value_left_minus_right", y="chose_left"):
+    """Group keys plus (cell, x) success and trial counts for `data`."""
+    by = list(by)
+    levels = np.sort(data[x].dropna().unique())
+    x_index = np.searchsorted(levels, data[x].to_numpy())
+    if by:
+        grouped = data.groupby(by, observed=True, sort=True)
+        keys = grouped.size().index
+        cell = grouped.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+    else:
+        keys = None
+        cell = np.zeros(len(data), dtype=np.int64)
+    valid = (cell >= 0) & data[x].notna().to_numpy() & data[y].notna().to_numpy()
+    n_cells = len(keys) if keys is not None else 1
+    flat = cell[valid] * len(levels) + x_index[valid]
+    size = n_cells * len(levels)
+    n = np.bincount(flat, minlength=size).reshape(n_cells, len(levels))
+    k = np.bincount(flat, weights=data[y].to_numpy(dtype=float)[valid], minlength=size).reshape(n_cells, len(levels))
+    return keys, levels, k, n
+
+
+def fit_psychometric(data, by=("datetime_bin", "locs", "stimulus_set"), x="value_left_minus_right", y="chose_left"):
+    """Fit slope, bias and lapse for every `by` cell; returns one tidy row per cell."""
+    keys, levels, k, n = count_grid(data, by, x=x, y=y)
+    theta, covariance, objective, converged = fit_counts(levels, k, n)
+    se = np.sqrt(np.diagonal(covariance, axis1=1, axis2=2))
+    sig_eta = _sigmoid(theta[:, 2])
+    lapse = MAX_LAPSE * sig_eta
+    table = pd.DataFrame({
+        "n_trials": n.sum(axis=1).astype(int),
+        "slope": theta[:, 0],
+        "slope_se": se[:, 0],
+        "bias": theta[:, 1],
+        "bias_se": se[:, 1],
+        "lapse": lapse,
+        # Delta method through lapse = MAX_LAPSE * sigmoid(eta).
+        "lapse_se": MAX_LAPSE * sig_eta * (1.0 - sig_eta) * se[:, 2],
+        "neg_log_posterior": objective,
+        "converged": converged,
+    })
+    if keys is not None:
+        key_frame = keys.to_frame(index=False) if isinstance(keys, pd.MultiIndex) else pd.DataFrame({keys.name: keys})
+        table = pd.concat([key_frame, table], axis=1)
+    return table
+
+
+def psychometric_curve(row, x):
+    """Evaluate a fitted row of fit_psychometric at the values `x`."""
+    x = np.asarray(x, dtype=float)
+    return row["lapse"] + (1.0 - 2.0 * row["lapse"]) * _sigmoid(row["slope"] * x + row["bias"])
@@ -1,6 +1,7 @@
 import json
 import math
 import sqlite3
+from functools import lru_cache
 
 import numpy as np
 import pandas as pd
@@ -9,6 +10,11 @@ import matplotlib.pyplot as plt
 from PIL import Image
 from matplotlib.offsetbox import OffsetImage, AnnotationBbox
 
+from analyze.bootstrap import choice_tensor_intervals, interval_labels
+from analyze.data_cache import load_data
+from analyze.trial_store import distinct_blocks, typed_columns
+from trials.divergence import DivergenceTracker
+
 sns.set_theme(style="whitegrid")
 import matplotlib as mpl
 mpl.rcParams['svg.fonttype'] = 'none'
@@ -98,20 +104,58 @@ def add_date_bin(
     return out
 
 
-def build_choice_matrix(choice_df):
-    outcomes = choice_df.groupby("distribution_options_sorted")["sorted_first_chosen"].mean()
+def choice_tensor(choice_df, order=None, by=("date_bin",)):
+    """Choice counts for every (group, chosen, alternative) cell in one pass.
+
+    Groups are the distinct values of the `by` columns (e.g. date_bin,
+    locs, stimulus_set); rows with a missing key or an option outside
+    `order` are skipped. Returns a dict with
+        keys    group keys, in sorted order (None when `by` is empty)
+        order   distribution ids along the two option axes
+        counts  (G, K, K) times `chosen` was picked when offered with `alternative`
+        n       (G, K, K) trials offering that pair
+        p       counts / n, NaN where the pair was never offered
+    """
+    by = list(by)
+    options = np.array(choice_df["distribution_options"].tolist(), dtype=object).reshape(-1, 2)
+    if order is None:
+        order = sorted(set(options.ravel().tolist()))
+    ids = pd.Index(order)
+    first = ids.get_indexer(options[:, 0])
+    second = ids.get_indexer(options[:, 1])
+    chosen = ids.get_indexer(choice_df["chosen_distribution"].to_numpy())
+
+    if by:
+        grouped = choice_df.groupby(by, observed=True, sort=True)
+        keys = grouped.size().index
+        group = grouped.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+    else:
+        keys = None
+        group = np.zeros(len(choice_df), dtype=np.int64)
+
+    valid = (first >= 0) & (second >= 0) & (group >= 0) & ((chosen == first) | (chosen == second))
+    alternative = np.where(chosen == first, second, first)
+    n_groups = len(keys) if keys is not None else 1
+    k = len(ids)
+    flat = (group * k + chosen) * k + alternative
+    counts = np.bincount(flat[valid], minlength=n_groups * k * k).reshape(n_groups, k, k)
+    n = counts + counts.transpose(0, 2, 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        p = np.where(n > 0, counts / n, np.nan)
+    return {"keys": keys, "order": list(ids), "counts": counts, "n": n, "p": p}
+
+
+def choice_matrix(tensor, group=0):
+    """One group of a choice_tensor as a chosen x alternative DataFrame of P(chosen)."""
+    return pd.DataFrame(
+        tensor["p"][group],
+        index=pd.Index(tensor["order"], name="chosen"),
+        columns=pd.Index(tensor["order"], name="alternative"),
+    )
 
-    pairs = []
-    values = []
-    for pair, p in outcomes.items():
-        pairs.extend([pair, pair[::-1]])
-        values.extend([p, 1 - p])
 
-    s = pd.Series(
-        values,
-        index=pd.MultiIndex.from_tuples(pairs, names=["chosen", "alternative"])
-    )
-    return s.unstack()
+def build_choice_matrix(choice_df):
+    return choice_matrix(choice_tensor(choice_df, by=()))
 
 
 def build_experienced_distribution_table(
@@ -133,22 +177,53 @@ def build_experienced_distribution_table(
     return experienced[["id", "magnitude", "probability", "n"]]
 
 
+def build_divergence_table(
+    config,
+    distribution_df,
+    id_col="chosen_distribution",
+    sampled_col="sampled_magnitude",
+):
+    """KL and chi-square divergence of experienced from nominal magnitudes, per cue.
+
+    Counts only the trials in `distribution_df`. The live tracker also
+    starts from every draw already in the session database's typed table,
+    so its numbers cover all history and differ from a date-filtered table.
+    """
+    tracker = DivergenceTracker()
+    tracker.configure(config["distribution_cues"])
+    tracker.add_many(zip(distribution_df[id_col], distribution_df[sampled_col]))
+    table = pd.DataFrame.from_dict(tracker.summary(), orient="index")
+    table.index.name = "id"
+    return table
+
+
 # ----------------------------
 # Helpers: image drawing
 # ----------------------------
-def _load_image(img_ref):
-    if img_ref is None or (isinstance(img_ref, float) and np.isnan(img_ref)):
-        return None
-    return Image.open(img_ref)
+THUMBNAIL_CACHE_SIZE = 128
+
+
+def _is_missing(img_ref):
+    return img_ref is None or (isinstance(img_ref, float) and np.isnan(img_ref))
+
+
+@lru_cache(maxsize=THUMBNAIL_CACHE_SIZE)
+def _thumbnail(img_ref, zoom):
+    """Decode once and downsample to the drawn size; shared by every plot in the process."""
+    with Image.open(img_ref) as img:
+        img.load()
+        size = (max(1, round(img.width * zoom)), max(1, round(img.height * zoom)))
+        thumb = np.asarray(img.resize(size, Image.Resampling.LANCZOS))
+    thumb.setflags(write=False)
+    return thumb
 
 
 def _add_image_box(ax, img_ref, xy, xycoords, zoom=0.22):
-    img = _load_image(img_ref)
-    if img is None:
+    if _is_missing(img_ref):
         return
 
     ab = AnnotationBbox(
-        OffsetImage(img, zoom=zoom),
+        OffsetImage(_thumbnail(img_ref, zoom), zoom=1),
         xy,
         xycoords=xycoords,
         frameon=False,
@@ -241,8 +316,8 @@ def _decorate_distribution_axis_with_mag_images(ax, values, mag_images, show_tic
 # ----------------------------
 # Plot 1: choice heatmaps by bin + legend axis
 # ----------------------------
-def _plot_heatmap_legend(ax, order, actual_distribution_table, distribution_summary, sort_col="expected_value", ascending=False):
-    dist_to_image, dist_to_name, _ = _distribution_maps(actual_distribution_table)
+def _plot_heatmap_legend(ax, order, actual_distribution_table, distribution_summary, sort_col="expected_value", ascending=False, distribution_maps=None):
+    dist_to_image, dist_to_name, _ = distribution_maps or _distribution_maps(actual_distribution_table)
     summary_sorted = distribution_summary.sort_values(sort_col, ascending=ascending)
 
     ax.axis("off")
@@ -284,43 +359,53 @@ def plot_choice_heatmaps_by_bin(
     sort_col="expected_value",
     ascending=False,
     cmap="coolwarm",
+    distribution_maps=None,
+    n_resamples=0,
+    seed=None,
 ):
     order = distribution_summary.sort_values(sort_col, ascending=ascending).index.tolist()
 
-    grouped = [
-        (bin_name, group)
-        for bin_name, group in choice_df.groupby(bin_col, observed=False)
-        if pd.notna(bin_name) and not group.empty
-    ]
+    tensor = choice_tensor(choice_df, order=order, by=(bin_col,))
+    if n_resamples:
+        tensor = choice_tensor_intervals(tensor, n_resamples=n_resamples, seed=seed)
+    n_panels = 0 if tensor["keys"] is None else len(tensor["keys"])
 
-    if not grouped:
+    if not n_panels:
         raise ValueError("No non-empty bins found. Check your bin edges and time column.")
 
-    n_panels = len(grouped)
-    ncols = min(3, n_panels)
-    nrows = math.ceil(n_panels / ncols)
+    # One extra axis for the legend, so it never lands on a heatmap panel.
+    ncols = min(3, n_panels + 1)
+    nrows = math.ceil((n_panels + 1) / ncols)
 
     figsize=(5 * ncols, 4 * (nrows))
     fig, axes = plt.subplots(
         nrows=nrows,
         ncols=ncols,
         figsize=figsize,
+        squeeze=False,
     )
     flat_axes = axes.flatten()
     for ax in flat_axes[n_panels:-1]:
         ax.axis("off")
     legend_ax = flat_axes[-1]
 
-    dist_to_image, _, _ = _distribution_maps(actual_distribution_table)
+    distribution_maps = distribution_maps or _distribution_maps(actual_distribution_table)
+    dist_to_image, _, _ = distribution_maps
 
-    for ax, (bin_name, group) in zip(flat_axes, grouped):
-        mat = build_choice_matrix(group).reindex(index=order, columns=order)
+    for index, (ax, bin_name) in enumerate(zip(flat_axes, tensor["keys"])):
+        mat = choice_matrix(tensor, index)
+        if n_resamples:
+            annot = interval_labels(mat.to_numpy(), tensor["ci_low"][index], tensor["ci_high"][index])
+            fmt, annot_kws = "", {"fontsize": 7}
+        else:
+            annot, fmt, annot_kws = True, ".2f", None
 
         sns.heatmap(
             mat,
             ax=ax,
-            annot=True,
-            fmt=".2f",
+            annot=annot,
+            fmt=fmt,
+            annot_kws=annot_kws,
             cmap=cmap,
             vmin=0,
             vmax=1,
@@ -330,11 +415,19 @@ def plot_choice_heatmaps_by_bin(
 
         _decorate_heatmap_axes_with_images(ax, order, dist_to_image)
 
-        ax.set_title(f"{bin_name}  |  n={len(group)}", fontsize=11, pad=14)
+        ax.set_title(f"{bin_name}  |  n={tensor['counts'][index].sum()}", fontsize=11, pad=14)
         ax.set_xlabel("")
         ax.set_ylabel("")
 
-    _plot_heatmap_legend(legend_ax, order, actual_distribution_table, distribution_summary, sort_col=sort_col, ascending=ascending)
+    _plot_heatmap_legend(
+        legend_ax,
+        order,
+        actual_distribution_table,
+        distribution_summary,
+        sort_col=sort_col,
+        ascending=ascending,
+        distribution_maps=distribution_maps,
+    )
 
     fig.subplots_adjust(bottom=0.04, left=0.08, right=0.98, top=0.96)
     return fig, axes, legend_ax
@@ -349,8 +442,9 @@ def plot_actual_vs_experienced_distributions(
     id_order=None,
     ncols=2,
     bar=True,
+    distribution_maps=None,
 ):
-    dist_to_image, dist_to_name, mag_to_image = _distribution_maps(actual_distribution_table)
+    dist_to_image, dist_to_name, mag_to_image = distribution_maps or _distribution_maps(actual_distribution_table)
 
     ids = (
         list(id_order)
@@ -459,35 +553,72 @@ def plot_actual_vs_experienced_distributions(
 # ----------------------------
 # Example usage
 # ----------------------------
-def main():
-    conn = sqlite3.connect("data.db")
-    df = pd.read_sql_query("SELECT * FROM data", conn)
-
-    magnitude_data = []
-    distribution_data = []
-
-    for block, blockdata in df.groupby("block"):
+DISTRIBUTION_COLUMNS = ("option1_distribution", "option2_distribution", "chosen_distribution", "sampled_magnitude")
+
+
+def distribution_fields(conn, data):
+    """distribution_options, chosen_distribution and sampled_magnitude for `data` (loaded with_rowid).
+
+    Read from the typed table where it has the row; only the other rows'
+    JSON payloads are parsed.
+    """
+    typed = typed_columns(conn, data["_rowid"], DISTRIBUTION_COLUMNS)
+    fields = {
+        rowid: {
+            "distribution_options": [row.option1_distribution, row.option2_distribution],
+            "chosen_distribution": row.chosen_distribution,
+            "sampled_magnitude": row.sampled_magnitude,
+        }
+        for rowid, row in zip(typed.index, typed.itertuples(index=False))
+    }
+    for rowid, payload in zip(data["_rowid"], data["data"]):
+        if rowid not in fields:
+            payload = json.loads(payload)
+            fields[rowid] = {
+                "distribution_options": payload.get("distribution_options"),
+                "chosen_distribution": payload.get("chosen_distribution"),
+                "sampled_magnitude": payload.get("sampled_magnitude"),
+            }
+    return pd.DataFrame([fields[rowid] for rowid in data["_rowid"]], index=data.index)
+
+
+def load_distribution_choices(db_path, start=None, end=None, refresh=True):
+    """Latest session config and the prepared distribution-choice trials from `db_path`.
+
+    With `refresh=False` the cache is read as it stands, without syncing it first.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        blocks = distinct_blocks(conn)
+        config = get_latest_config(conn)
+    finally:
+        conn.close()
+    for block in blocks:
         assert isinstance(block, str), f"Expected block to be a string, got {type(block)}"
-        if block.endswith("magnitude"):
-            magnitude_data.append(blockdata)
-        else:
-            distribution_data.append(blockdata)
-
-    magnitude_data = pd.concat(magnitude_data, ignore_index=True)
-    distribution_data = pd.concat(distribution_data, ignore_index=True)
+    distribution_blocks = [block for block in blocks if not block.endswith("magnitude")]
 
-    distribution_data = distribution_data.query('outcome == "choice"').copy()
-    distribution_data = distribution_data.join(
-        pd.DataFrame(distribution_data.data.apply(json.loads).tolist(), index=distribution_data.index)
+    distribution_data = load_data(
+        db_path, start=start, end=end, outcomes=("choice",), blocks=distribution_blocks, refresh=refresh,
+        with_rowid=True,
     )
+    if distribution_data.empty:
+        return config, distribution_data.drop(columns="_rowid", errors="ignore")
+    conn = sqlite3.connect(db_path)
+    try:
+        fields = distribution_fields(conn, distribution_data)
+    finally:
+        conn.close()
+    distribution_data = distribution_data.drop(columns="_rowid").join(fields)
+    return config, prepare_choice_data(distribution_data, time_col="date")
 
-    config = get_latest_config(conn)
+
+def main():
+    config, choice_df = load_distribution_choices("data.db")
     assert config is not None, "No configuration found in the database."
 
     actual_distribution_table = build_actual_distribution_table(config)
     distribution_summary = summarize_distributions(actual_distribution_table)
-
-    choice_df = prepare_choice_data(distribution_data, time_col="date")
+    distribution_maps = _distribution_maps(actual_distribution_table)
 
     choice_df_binned = add_date_bin(
         choice_df,
@@ -515,6 +646,7 @@ def main():
         id_col="chosen_distribution",
         sampled_col="sampled_magnitude",
     )
+    print(build_divergence_table(config, choice_df).to_string())
 
     fig1, axes1, legend_ax1 = plot_choice_heatmaps_by_bin(
         choice_df=choice_df_binned,
@@ -523,6 +655,7 @@ def main():
         bin_col="date_bin",
         sort_col="expected_value",
         ascending=False,
+        distribution_maps=distribution_maps,
     )
     fig1.tight_layout()
 
@@ -532,6 +665,7 @@ def main():
         id_order=distribution_summary.sort_values("expected_value", ascending=False).index.tolist(),
         ncols=2,
         bar=False,
+        distribution_maps=distribution_maps,
     )
     fig2.tight_layout()
 
@@ -0,0 +1,237 @@
+"""Batch-render every behaviour figure to files, one process per (database, time bin).
+
+Usage (from the repository root):
+    python -m analyze.report rig1/data.db rig2/data.db --out reports --period 7D
+
+Each database gets a whole-history set of figures plus one set per time bin,
+written as PNG/SVG under <out>/<database>/<bin>/ with an index.html linking
+everything. Figures with no data for a bin are skipped and noted in the index.
+"""
+import matplotlib
+matplotlib.use("Agg")
+
+import argparse
+import glob
+import html
+import os
+import re
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib.pyplot as plt
+import pandas as pd
+
+import read_behaviour
+from analyze import read_data
+from analyze.data_cache import default_cache_dir, sync
+
+ALL_BINS = "all"
+DEFAULT_FORMATS = ("png", "svg")
+
+
+# ----------------------------
+# Job planning
+# ----------------------------
+def db_label(db_path):
+    """Readable, filesystem-safe name; generic names like data.db take their folder's name."""
+    path = os.path.abspath(db_path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if stem == "data":
+        stem = f"{os.path.basename(os.path.dirname(path))}-{stem}"
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", stem)
+
+
+def cached_dates(db_path):
+    """Dates present in the synced cache, read from its partition names."""
+    partitions = glob.glob(os.path.join(default_cache_dir(db_path), "*", ""))
+    return sorted(os.path.basename(os.path.dirname(partition)) for partition in partitions)
+
+
+def time_bins(dates, period):
+    """(label, start, end) per period-wide bin that contains at least one date."""
+    if not dates:
+        return []
+    width = pd.Timedelta(period)
+    starts = pd.to_datetime(pd.Series(dates)).dt.floor(period).drop_duplicates().sort_values()
+    return [
+        (
+            start.strftime("%Y-%m-%d"),
+            start.strftime("%Y-%m-%d"),
+            (start + width - pd.Timedelta(days=1)).strftime("%Y-%m-%d"),
+        )
+        for start in starts
+    ]
+
+
+def plan_jobs(db_paths, out_dir, period, formats, bootstrap=0):
+    jobs = []
+    for db_path in db_paths:
+        # Sync once here; the workers read the cache with refresh=False so
+        # none of them syncs (and writes partitions) while another reads.
+        sync(db_path)
+        label = db_label(db_path)
+        bins = [(ALL_BINS, None, None)] + time_bins(cached_dates(db_path), period)
+        for bin_label, start, end in bins:
+            jobs.append(dict(
+                db_path=db_path,
+                db_label=label,
+                bin_label=bin_label,
+                start=start,
+                end=end,
+                period=period,
+                out_dir=os.path.join(out_dir, label, bin_label),
+                formats=tuple(formats),
+                bootstrap=bootstrap,
+            ))
+    return jobs
+
+
+# ----------------------------
+# Rendering (runs in the worker processes)
+# ----------------------------
+def _save_new_figures(name, before, job):
+    paths = []
+    new_figures = sorted(set(plt.get_fignums()) - before)
+    for i, number in enumerate(new_figures, start=1):
+        fig = plt.figure(number)
+        stem = name if len(new_figures) == 1 else f"{name}-{i}"
+        for fmt in job["formats"]:
+            path = os.path.join(job["out_dir"], f"{stem}.{fmt}")
+            fig.savefig(path, bbox_inches="tight")
+            paths.append(path)
+    plt.close("all")
+    return paths
+
+
+def _render(name, job, draw, figures, notes):
+    before = set(plt.get_fignums())
+    try:
+        draw()
+    except Exception:
+        plt.close("all")
+        notes.append(f"{name}: failed\n{traceback.format_exc()}")
+        return
+    figures.extend(_save_new_figures(name, before, job))
+
+
+def render_behaviour(job, figures, notes):
+    data = read_behaviour.get_data(job["db_path"], start=job["start"], end=job["end"], refresh=False)
+    if data.empty:
+        notes.append("choice probability / heatmaps: no magnitude-choice trials")
+        return
+    _render("choice_probability", job, lambda: read_behaviour.plot_choice_probability(data.copy(), period=job["period"]), figures, notes)
+    _render("heatmaps_by_location", job, lambda: read_behaviour.plot_heatmaps(data.copy(), period=job["period"], n_resamples=job["bootstrap"]), figures, notes)
+
+
+def render_distributions(job, figures, notes):
+    config, choice_df = read_data.load_distribution_choices(
+        job["db_path"], start=job["start"], end=job["end"], refresh=False,
+    )
+    if config is None or choice_df.empty:
+        notes.append("choice matrices / distributions: no distribution-choice trials")
+        return
+    actual = read_data.build_actual_distribution_table(config)
+    summary = read_data.summarize_distributions(actual)
+    maps = read_data._distribution_maps(actual)
+    if job["bin_label"] == ALL_BINS:
+        choice_df = choice_df.assign(date_bin=choice_df["date"].dt.floor(job["period"]).dt.strftime("%Y-%m-%d"))
+    else:
+        choice_df = choice_df.assign(date_bin=job["bin_label"])
+    experienced = read_data.build_experienced_distribution_table(choice_df)
+    order = summary.sort_values("expected_value", ascending=False).index.tolist()
+
+    def choice_matrices():
+        fig, _, _ = read_data.plot_choice_heatmaps_by_bin(
+            choice_df, summary, actual, distribution_maps=maps, n_resamples=job["bootstrap"],
+        )
+        fig.tight_layout()
+
+    def distributions():
+        fig, _ = read_data.plot_actual_vs_experienced_distributions(
+            actual, experienced, id_order=order, ncols=2, bar=False, distribution_maps=maps,
+        )
+        fig.tight_layout()
+
+    _render("choice_matrices", job, choice_matrices, figures, notes)
+    _render("actual_vs_experienced", job, distributions, figures, notes)
+
+
+def render_job(job):
+    started = time.perf_counter()
+    os.makedirs(job["out_dir"], exist_ok=True)
+    figures, notes = [], []
+    for render in (render_behaviour, render_distributions):
+        try:
+            render(job, figures, notes)
+        except Exception:
+            plt.close("all")
+            notes.append(f"{render.__name__}: failed\n{traceback.format_exc()}")
+    return dict(job, figures=figures, notes=notes, seconds=time.perf_counter() - started)
+
+
+# ----------------------------
+# Index page
+# ----------------------------
+def write_index(out_dir, results):
+    by_db = {}
+    for result in results:
+        by_db.setdefault(result["db_label"], []).append(result)
+    lines = [
+        "<!doctype html>",
+        "<html><head><meta charset='utf-8'><title>Behaviour report</title>",
+        "<style>body{font-family:sans-serif;margin:2em}img{max-width:480px;margin:4px;border:1px solid #ddd}"
+        "pre{color:#a33;white-space:pre-wrap}</style></head><body>",
+        f"<h1>Behaviour report</h1><p>Generated {html.escape(time.strftime('%Y-%m-%d %H:%M'))}</p>",
+    ]
+    for label in sorted(by_db):
+        lines.append(f"<h2>{html.escape(label)}</h2>")
+        # Whole history first, then bins in date order.
+        for result in sorted(by_db[label], key=lambda r: (r["bin_label"] != ALL_BINS, r["bin_label"])):
+            lines.append(f"<h3>{html.escape(result['bin_label'])}</h3>")
+            for path in result["figures"]:
+                if path.endswith(".png"):
+                    rel = html.escape(os.path.relpath(path, out_dir))
+                    lines.append(f"<a href='{rel}'><img src='{rel}' loading='lazy'></a>")
+            if not any(path.endswith(".png") for path in result["figures"]):
+                for path in result["figures"]:
+                    rel = html.escape(os.path.relpath(path, out_dir))
+                    lines.append(f"<a href='{rel}'>{html.escape(os.path.basename(path))}</a>")
+            for note in result["notes"]:
+                lines.append(f"<pre>{html.escape(note)}</pre>")
+    lines.append("</body></html>")
+    path = os.path.join(out_dir, "index.html")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+    return path
+
+
+def build_report(db_paths, out_dir="reports", period="7D", formats=DEFAULT_FORMATS, workers=None, bootstrap=0):
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = plan_jobs(db_paths, out_dir, period, formats, bootstrap)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(render_job, job) for job in jobs]
+        for future in as_completed(futures):
+            results.append(future.result())
+    return write_index(out_dir, results), results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render every behaviour figure for one or more session databases")
+    parser.add_argument("databases", nargs="+", help="Session databases, e.g. rig1/data.db")
+    parser.add_argument("--out", default="reports", help="Output directory")
+    parser.add_argument("--period", default="7D", help="Time bin width, e.g. '2D' or '7D'")
+    parser.add_argument("--format", dest="formats", nargs="+", default=list(DEFAULT_FORMATS), help="Figure formats to write")
+    parser.add_argument("--bootstrap", type=int, default=0, help="Bootstrap resamples for heatmap intervals (0 to skip)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU)")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    index, results = build_report(args.databases, args.out, args.period, args.formats, args.workers, args.bootstrap)
+    n_figures = sum(len(result["figures"]) for result in results)
+    print(f"{len(results)} jobs, {n_figures} files in {time.perf_counter() - started:.1f}s -> {index}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""One live dashboard for several rigs, read straight from their session databases.
+
+Each rig's remote server keeps its own data/data.db. This service tails the
+`data` table of every database over read-only connections, keeps running
+aggregates per rig and serves a dashboard with a combined view and one view
+per rig, using the same behaviour worker and filters as server/index.html.
+
+Usage (from the repository root):
+    python -m analyze.rig_monitor rig1/data/data.db rig2/data/data.db --port 8780
+    python -m analyze.rig_monitor left=/mnt/left/data/data.db right=/mnt/right/data/data.db
+
+Try it on synthetic databases that keep growing:
+    python -m bench.rig_databases /tmp/rigs --rigs 3 --follow 2
+    python -m analyze.rig_monitor /tmp/rigs/*/data/data.db
+
+Endpoints:
+    /                                         the dashboard (server/rigs.html)
+    /rigs                                     per-rig and combined counts
+    /behaviour_summary?rig=<name>&since=...   trial deltas in the remote server's
+                                              {version, cursor, trials} format;
+                                              without rig, all rigs together,
+                                              numbered by arrival
+    /behaviour-worker.js                      the worker inlined in server/index.html
+    /behaviour-render.js                      server/index.html's filters and plots
+    /behaviour.css                            server/index.html's stylesheet
+    /plotly.min.js                            from the experiment library, if installed
+"""
+import argparse
+import importlib.util
+import json
+import os
+import pathlib
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from trials.aggregates import merge_counts, total_stats
+from trials.behaviour_feed import SessionTail, behaviour_delta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGE_PATH = os.path.join(REPO_ROOT, "server", "rigs.html")
+DASHBOARD_PATH = os.path.join(REPO_ROOT, "server", "index.html")
+WORKER_PATTERN = re.compile(r'<script type="text/js-worker" id="behaviour-worker">(.*?)</script>', re.S)
+RENDER_PATTERN = re.compile(r'<script id="behaviour-render">(.*?)</script>', re.S)
+STYLE_PATTERN = re.compile(r'<style id="behaviour-style">(.*?)</style>', re.S)
+DEFAULT_PORT = 8780
+# Requests arriving within this many seconds of the last poll reuse it.
+DEFAULT_INTERVAL = 1.0
+ALL_RIGS = "all"
+LAST_TRIAL_FIELDS = ("trialid", "date", "time", "outcome", "condition", "block", "block_number")
+
+
+def rig_name(db_path):
+    """A database's stem, or for data.db the nearest folder not called data (rig1/data/data.db: rig1)."""
+    path = pathlib.Path(os.path.abspath(db_path))
+    if path.stem.lower() != "data":
+        return path.stem
+    for part in reversed(path.parent.parts):
+        if part.lower() != "data" and part not in (path.anchor, os.sep):
+            return part
+    return path.stem
+
+
+def parse_rig(spec):
+    """A `name=path` or bare path command-line argument as (name, path)."""
+    name, sep, path = spec.partition("=")
+    if sep and name and not os.path.exists(spec):
+        return name, path
+    return rig_name(spec), spec
+
+
+class RigTail(SessionTail):
+    """One rig's session database, with each record tagged by the rig's name."""
+
+    def __init__(self, name, path):
+        self.name = name
+        super().__init__(path)
+
+    def _record(self, rowid, row, payload):
+        return {**super()._record(rowid, row, payload), "rig": self.name}
+
+    def summary(self):
+        last = self.records[-1][1] if self.records else None
+        return {
+            "name": self.name,
+            "path": self.path,
+            "error": self.error,
+            "records": len(self.records),
+            "stats": total_stats(self.aggregates.counts),
+            "last": {name: last.get(name) for name in LAST_TRIAL_FIELDS} if last else None,
+        }
+
+
+class RigMonitor:
+    """Every rig's tail plus the combined trial log, polled on demand."""
+
+    def __init__(self, rigs, interval=DEFAULT_INTERVAL):
+        self.rigs = {}
+        for name, path in rigs:
+            unique, n = name, 1
+            while unique in self.rigs or unique == ALL_RIGS:
+                n += 1
+                unique = f"{name}-{n}"
+            self.rigs[unique] = RigTail(unique, path)
+        self.interval = interval
+        # Versions change when the service restarts or any rig resets, so
+        # dashboards know to drop what they have.
+        self.boot = format(time.time_ns(), "x")
+        self.generation = 0
+        self.log = []
+        self.combined = []
+        self._polled = None
+        self._lock = threading.Lock()
+
+    def refresh(self, force=False):
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._polled is not None and now - self._polled < self.interval:
+                return
+            self._polled = now
+            for tail in self.rigs.values():
+                reset, added = tail.poll()
+                if reset:
+                    self.generation += 1
+                    self.log = [entry for entry in self.log if entry[0] != tail.name]
+                    self.combined = [self._combined(i, *entry) for i, entry in enumerate(self.log)]
+                for key, record in added:
+                    entry = (tail.name, f"{tail.name}:{key}", record)
+                    self.combined.append(self._combined(len(self.log), *entry))
+                    self.log.append(entry)
+
+    @staticmethod
+    def _combined(index, name, key, record):
+        # Every rig numbers its trials and blocks from its own start, so the
+        # combined log numbers trials by arrival and prefixes blocks by rig.
+        return key, {
+            **record,
+            "trialid": index,
+            "rig_trialid": record.get("trialid"),
+            "block_number": f"{name}:{record.get('block_number')}",
+        }
+
+    def behaviour(self, rig=None, since=None, version=None):
+        """Trials after cursor `since`, or all of them when `version` is stale."""
+        with self._lock:
+            if rig in (None, "", ALL_RIGS):
+                entries = self.combined
+                current = f"{self.boot}.{self.generation}"
+            else:
+                tail = self.rigs[rig]
+                entries = tail.records
+                current = f"{self.boot}.{tail.generation}"
+            return behaviour_delta(entries, current, since, version)
+
+    def overview(self):
+        with self._lock:
+            combined = {}
+            for tail in self.rigs.values():
+                merge_counts(combined, tail.aggregates.counts)
+            return {
+                "rigs": [tail.summary() for tail in self.rigs.values()],
+                "combined": {"records": len(self.log), "stats": total_stats(combined)},
+            }
+
+
+def find_plotly():
+    """plotly.min.js from the experiment library's static files, if it is installed."""
+    spec = importlib.util.find_spec("experiment")
+    for root in (spec.submodule_search_locations or []) if spec else []:
+        for directory, _, files in os.walk(root):
+            if "plotly.min.js" in files:
+                return os.path.join(directory, "plotly.min.js")
+    return None
+
+
+def load_dashboard_part(pattern, name, dashboard_path=DASHBOARD_PATH):
+    """One inline block of server/index.html, which stays a single template for the experiment server."""
+    with open(dashboard_path, encoding="utf-8") as f:
+        match = pattern.search(f.read())
+    if match is None:
+        raise ValueError(f"No {name} found in {dashboard_path}")
+    return match.group(1)
+
+
+def load_worker(dashboard_path=DASHBOARD_PATH):
+    return load_dashboard_part(WORKER_PATTERN, "behaviour worker", dashboard_path)
+
+
+def load_render(dashboard_path=DASHBOARD_PATH):
+    return load_dashboard_part(RENDER_PATTERN, "behaviour render script", dashboard_path)
+
+
+def load_style(dashboard_path=DASHBOARD_PATH):
+    return load_dashboard_part(STYLE_PATTERN, "behaviour stylesheet", dashboard_path)
+
+
+class _MonitorHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        if url.path == "/":
+            self._send("text/html; charset=utf-8", server.page)
+        elif url.path == "/behaviour-worker.js":
+            self._send("text/javascript; charset=utf-8", server.worker)
+        elif url.path == "/behaviour-render.js":
+            self._send("text/javascript; charset=utf-8", server.render)
+        elif url.path == "/behaviour.css":
+            self._send("text/css; charset=utf-8", server.style)
+        elif url.path == "/plotly.min.js":
+            if server.plotly_path is None:
+                self.send_error(404, "plotly.min.js not available")
+                return
+            with open(server.plotly_path, "rb") as f:
+                self._send("text/javascript", f.read())
+        elif url.path == "/rigs":
+            server.monitor.refresh()
+            self._send_json(server.monitor.overview())
+        elif url.path == "/behaviour_summary":
+            server.monitor.refresh()
+            since = query.get("since", [None])[0]
+            try:
+                data = server.monitor.behaviour(
+                    rig=query.get("rig", [None])[0],
+                    since=int(since) if since is not None and since.isdigit() else None,
+                    version=query.get("version", [None])[0],
+                )
+            except KeyError:
+                self.send_error(404, "Unknown rig")
+                return
+            self._send_json(data)
+        else:
+            self.send_error(404)
+
+    def _send_json(self, data):
+        self._send("application/json", json.dumps(data, default=str).encode("utf-8"))
+
+    def _send(self, content_type, body):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(monitor, port=DEFAULT_PORT, host="", plotly_path=None):
+    server = ThreadingHTTPServer((host, port), _MonitorHandler)
+    server.daemon_threads = True
+    server.monitor = monitor
+    with open(PAGE_PATH, encoding="utf-8") as f:
+        server.page = f.read()
+    server.worker = load_worker()
+    server.render = load_render()
+    server.style = load_style()
+    server.plotly_path = plotly_path
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve one live dashboard over several rigs' session databases")
+    parser.add_argument("databases", nargs="+", help="Session databases as path or name=path, e.g. rig1/data/data.db")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to serve the dashboard on")
+    parser.add_argument("--host", default="", help="Interface to bind (default: all)")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="Minimum seconds between database polls")
+    parser.add_argument("--plotly", default=None, help="Local plotly.min.js (default: the experiment library's, else a CDN)")
+    args = parser.parse_args(argv)
+
+    monitor = RigMonitor([parse_rig(spec) for spec in args.databases], args.interval)
+    monitor.refresh(force=True)
+    server = make_server(monitor, args.port, args.host, args.plotly or find_plotly())
+    for tail in monitor.rigs.values():
+        print(f"{tail.name}: {tail.path} ({len(tail.records)} trials{', ' + tail.error if tail.error else ''})")
+    print(f"Serving http://localhost:{server.server_address[1]}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Filtered queries against the `data` table, with the filters pushed into SQLite.
+
+Filters are keyword arguments shared by query_trials (SQL) and filter_frame
+(pandas, for already-loaded or cached data):
+    outcomes       outcome values to keep, e.g. ("correct", "incorrect")
+    blocks         block names to keep
+    start, end     inclusive ISO dates
+    stimulus_sets  stimulus set ids, matched on the "set<id>_" condition prefix
+
+Create or refresh the indexes these queries use with:
+    python -m analyze.trial_store data.db
+"""
+import sqlite3
+
+import pandas as pd
+
+TYPED_TABLE = "typed_trials"
+INDEX_PREFIX = "ix_data_"
+INDEXES = {
+    f"{INDEX_PREFIX}outcome_date": "CREATE INDEX IF NOT EXISTS {name} ON data (outcome, date)",
+    f"{INDEX_PREFIX}block_outcome": "CREATE INDEX IF NOT EXISTS {name} ON data (block, outcome)",
+    f"{INDEX_PREFIX}date": "CREATE INDEX IF NOT EXISTS {name} ON data (date)",
+    f"{INDEX_PREFIX}condition": "CREATE INDEX IF NOT EXISTS {name} ON data (condition)",
+}
+
+
+def _as_tuple(values):
+    if values is None:
+        return None
+    if isinstance(values, (str, int)):
+        return (values,)
+    return tuple(values)
+
+
+def _stimulus_set_prefix(stimulus_set):
+    return f"set{stimulus_set}_"
+
+
+def _filter_clauses(outcomes=None, blocks=None, start=None, end=None):
+    clauses, params = [], []
+    outcomes, blocks = _as_tuple(outcomes), _as_tuple(blocks)
+    if outcomes is not None:
+        clauses.append(f"outcome IN ({', '.join('?' * len(outcomes))})")
+        params.extend(outcomes)
+    if blocks is not None:
+        clauses.append(f"block IN ({', '.join('?' * len(blocks))})")
+        params.extend(blocks)
+    if start is not None:
+        clauses.append("date >= ?")
+        params.append(str(start))
+    if end is not None:
+        clauses.append("date <= ?")
+        params.append(str(end))
+    return clauses, params
+
+
+def _where(clauses):
+    return "WHERE " + " AND ".join(clauses) if clauses else ""
+
+
+def where_clause(outcomes=None, blocks=None, start=None, end=None, stimulus_sets=None):
+    clauses, params = _filter_clauses(outcomes, blocks, start, end)
+    stimulus_sets = _as_tuple(stimulus_sets)
+    if stimulus_sets is not None:
+        # GLOB is case-sensitive, so SQLite can answer a fixed prefix from the condition index.
+        clauses.append("(" + " OR ".join("condition GLOB ?" for _ in stimulus_sets) + ")")
+        params.extend(f"{_stimulus_set_prefix(s)}*" for s in stimulus_sets)
+    return _where(clauses), params
+
+
+def query_trials(conn, columns="*", **filters):
+    where, params = where_clause(**filters)
+    # Index scans return rows in index order; keep the insertion order SELECT * gives.
+    return pd.read_sql_query(f"SELECT {columns} FROM data {where} ORDER BY rowid", conn, params=params)
+
+
+def query_typed_trials(conn, columns="*", outcomes=None, start=None, end=None, stimulus_sets=None):
+    """Query the typed side table the recorder writes; no JSON parsing needed.
+
+    Takes the same filters as query_trials except `blocks`, which the typed
+    table does not record. Rows join back to `data` on data_rowid (or on
+    json_extract(data.data, '$.recorded_at') = recorded_at where it is NULL).
+    """
+    clauses, params = _filter_clauses(outcomes, None, start, end)
+    stimulus_sets = _as_tuple(stimulus_sets)
+    if stimulus_sets is not None:
+        clauses.append(f"stimulus_set IN ({', '.join('?' * len(stimulus_sets))})")
+        params.extend(int(s) for s in stimulus_sets)
+    return pd.read_sql_query(f"SELECT {columns} FROM {TYPED_TABLE} {_where(clauses)} ORDER BY id", conn, params=params)
+
+
+def typed_columns(conn, rowids, columns):
+    """Typed-table `columns` for the `data` rows in `rowids`, indexed by data_rowid.
+
+    Rows the recorder never matched to a `data` row (older sessions, or
+    records replayed from its journal) are absent; callers read those from
+    the JSON payload instead.
+    """
+    try:
+        typed = pd.read_sql_query(
+            f"SELECT data_rowid, {', '.join(columns)} FROM {TYPED_TABLE} WHERE data_rowid IS NOT NULL ORDER BY id",
+            conn,
+        )
+    except (sqlite3.Error, pd.errors.DatabaseError):
+        # No typed table: every row falls back to its payload.
+        typed = pd.DataFrame(columns=["data_rowid", *columns])
+    typed = typed.drop_duplicates(subset="data_rowid", keep="last").set_index("data_rowid")
+    return typed.loc[typed.index.isin(rowids)]
+
+
+def filter_frame(df, outcomes=None, blocks=None, start=None, end=None, stimulus_sets=None):
+    """Apply the query_trials filters to a DataFrame already in memory."""
+    if df.empty:
+        return df
+    mask = pd.Series(True, index=df.index)
+    outcomes, blocks, stimulus_sets = _as_tuple(outcomes), _as_tuple(blocks), _as_tuple(stimulus_sets)
+    if outcomes is not None:
+        mask &= df["outcome"].isin(outcomes)
+    if blocks is not None:
+        mask &= df["block"].isin(blocks)
+    if start is not None:
+        mask &= df["date"] >= str(start)
+    if end is not None:
+        mask &= df["date"] <= str(end)
+    if stimulus_sets is not None:
+        mask &= df["condition"].str.startswith(tuple(_stimulus_set_prefix(s) for s in stimulus_sets))
+    return df.loc[mask].reset_index(drop=True)
+
+
+def distinct_blocks(conn):
+    """Block names in `data`; rows without a block are skipped, as groupby("block") skips them."""
+    return [
+        block
+        for (block,) in conn.execute("SELECT DISTINCT block FROM data WHERE block IS NOT NULL ORDER BY block")
+    ]
+
+
+def migrate(conn):
+    """Create missing indexes, drop retired ones and refresh the planner statistics.
+
+    Only indexes named with INDEX_PREFIX are managed; returns (created, dropped).
+    """
+    existing = {
+        name
+        for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'data' AND name GLOB ?",
+            (f"{INDEX_PREFIX}*",),
+        )
+    }
+    created = [name for name in INDEXES if name not in existing]
+    dropped = sorted(existing - set(INDEXES))
+    with conn:
+        for name in dropped:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+        for name, sql in INDEXES.items():
+            conn.execute(sql.format(name=name))
+        conn.execute("ANALYZE data")
+    return created, dropped
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Create or refresh the trial store indexes")
+    parser.add_argument("db", help="Path to a session database, e.g. data/data.db")
+    args = parser.parse_args(argv)
+    conn = sqlite3.connect(args.db)
+    try:
+        created, dropped = migrate(conn)
+    finally:
+        conn.close()
+    print(f"{args.db}: created {created or 'none'}, dropped {dropped or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""Headless harness that runs the real trial classes without a display or pump.
+
+Usage (from the repository root):
+    python -m bench.harness configs/flea_distribution.py --trials 5000
+"""
+import argparse
+import contextlib
+import hashlib
+import importlib.util
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from trials.factory import trial_class_for, trial_factory
+from trials.latency import format_latency_summary, frame_probe, latency_summary, stage_latency
+from trials.recorder import trial_recorder
+from trials.scenes import session_scenes
+
+# Names the trial modules import from experiment.experiments.*; each is
+# swapped for a headless stand-in while the harness runs.
+PATCHED_NAMES = ('Scene', 'ImageAdapter', 'RectAdapter', 'TouchAdapter', 'RewardAdapter', 'TimeCounter')
+
+
+# ----------------------------
+# Touch sources
+# ----------------------------
+class RandomTouches:
+    def __init__(self, seed: Optional[int] = None, p_timeout: float = 0.05, rt_range: Tuple[float, float] = (0.3, 1.5)):
+        self.rng = random.Random(seed)
+        self.p_timeout = p_timeout
+        self.rt_range = rt_range
+
+    def touch(self, items: Sequence[Any]) -> Tuple[Any, Optional[float]]:
+        if not items or self.rng.random() < self.p_timeout:
+            return None, None
+        return self.rng.choice(list(items)), self.rng.uniform(*self.rt_range)
+
+
+class ScriptedTouches:
+    """Replays (choice, RT) pairs in order, cycling; a choice of 'quit' ends the scene with quit set."""
+
+    def __init__(self, script: Iterable[Tuple[Any, Optional[float]]]):
+        self.script = list(script)
+        self.position = 0
+
+    def touch(self, items: Sequence[Any]) -> Tuple[Any, Optional[float]]:
+        choice, rt = self.script[self.position % len(self.script)]
+        self.position += 1
+        return choice, rt
+
+
+# ----------------------------
+# Emulated pump and manager
+# ----------------------------
+class EmulatedPump:
+    def __init__(self):
+        self.commands: List[Dict[str, Any]] = []
+
+    def deliver(self, channels, duration=None, n_pulses=1, interpulse_interval=0.0) -> None:
+        self.commands.append({
+            'channels': tuple(channels) if channels is not None else None,
+            'duration': duration,
+            'n_pulses': n_pulses,
+            'interpulse_interval': interpulse_interval,
+        })
+
+
+class HeadlessManager:
+    def __init__(
+        self,
+        config: dict,
+        touches,
+        pump: Optional[EmulatedPump] = None,
+        on_record: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        self.config = config
+        self.touches = touches
+        self.pump = pump or EmulatedPump()
+        self.on_record = on_record
+        self.records: List[Dict[str, Any]] = []
+        self.frames = 0
+
+    def record(self, **fields: Any) -> None:
+        self.records.append(fields)
+        if self.on_record is not None:
+            self.on_record(fields)
+
+
+# ----------------------------
+# Null renderer: headless scene and adapters
+# ----------------------------
+class HeadlessAdapter:
+    def __init__(self, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+
+
+class HeadlessImageAdapter(HeadlessAdapter):
+    pass
+
+
+class HeadlessRectAdapter(HeadlessAdapter):
+    pass
+
+
+class HeadlessTimeCounter(HeadlessAdapter):
+    pass
+
+
+class HeadlessTouchAdapter(HeadlessAdapter):
+    def __init__(self, time_counter=None, items=None, allow_outside_touch=True, **kwargs):
+        super().__init__(time_counter=time_counter, items=items, allow_outside_touch=allow_outside_touch, **kwargs)
+        self.items = items or {}
+        self.chosen = None
+        self.RT = None
+
+
+class HeadlessRewardAdapter(HeadlessAdapter):
+    def __init__(self, channels=None, duration=None, n_pulses=1, interpulse_interval=0.0, manager=None, **kwargs):
+        super().__init__(**kwargs)
+        self.manager = manager
+        self.channels = channels
+        self.duration = duration
+        self.n_pulses = n_pulses
+        self.interpulse_interval = interpulse_interval
+
+    @classmethod
+    def from_manager(cls, manager, channels=None, **kwargs) -> 'HeadlessRewardAdapter':
+        return cls(channels=channels, manager=manager, **kwargs)
+
+    def start(self) -> None:
+        self.manager.pump.deliver(
+            self.channels,
+            duration=self.duration,
+            n_pulses=self.n_pulses,
+            interpulse_interval=self.interpulse_interval,
+        )
+
+
+class HeadlessScene:
+    def __init__(self, mgr, adapter=None, background=None):
+        self.mgr = mgr
+        self.adapter = adapter
+        self.background = background
+        self.quit = False
+
+    def run(self) -> None:
+        # Stands in for the display and touch hooks the frame probe has on pygame.
+        self.mgr.frames += 1
+        frame_probe.on_present()
+        adapter = self.adapter
+        if isinstance(adapter, HeadlessTouchAdapter):
+            choice, rt = self.mgr.touches.touch(list(adapter.items))
+            if choice == 'quit':
+                self.quit = True
+                return
+            if choice is not None:
+                frame_probe.on_touch()
+            adapter.chosen, adapter.RT = choice, rt
+        elif isinstance(adapter, HeadlessRewardAdapter):
+            adapter.start()
+
+
+HEADLESS = {
+    'Scene': HeadlessScene,
+    'ImageAdapter': HeadlessImageAdapter,
+    'RectAdapter': HeadlessRectAdapter,
+    'TouchAdapter': HeadlessTouchAdapter,
+    'RewardAdapter': HeadlessRewardAdapter,
+    'TimeCounter': HeadlessTimeCounter,
+}
+
+
+@contextlib.contextmanager
+def headless():
+    patched = []
+    for module_name, module in list(sys.modules.items()):
+        if not module_name.startswith('trials.'):
+            continue
+        for name in PATCHED_NAMES:
+            if hasattr(module, name):
+                patched.append((module, name, getattr(module, name)))
+                setattr(module, name, HEADLESS[name])
+    session_scenes.clear()
+    try:
+        yield
+    finally:
+        for module, name, original in patched:
+            setattr(module, name, original)
+        session_scenes.clear()
+
+
+# ----------------------------
+# Runner
+# ----------------------------
+def load_config(path: str) -> dict:
+    spec = importlib.util.spec_from_file_location('harness_config', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.config
+
+
+def derive_seed(seed: Optional[int], stream: str) -> Optional[int]:
+    """An independent seed per random stream (conditions, touches, sampling) from one run seed."""
+    if seed is None:
+        return None
+    digest = hashlib.sha256(f"{seed}:{stream}".encode()).digest()
+    return int.from_bytes(digest[:4], 'big')
+
+
+def _percentile(sorted_values: Sequence[float], q: float) -> float:
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def run_trials(
+    config: dict,
+    n_trials: int,
+    touches=None,
+    seed: Optional[int] = None,
+    track_allocations: bool = False,
+    quiet: bool = True,
+    on_record: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix='value-task-harness-') as journal_dir:
+        return _run_trials(
+            {**config, 'storage': {'type': 'memory', 'path': os.path.join(journal_dir, 'data.db')}},
+            n_trials,
+            touches=touches,
+            seed=seed,
+            track_allocations=track_allocations,
+            quiet=quiet,
+            on_record=on_record,
+        )
+
+
+def _run_trials(
+    config: dict,
+    n_trials: int,
+    touches,
+    seed: Optional[int],
+    track_allocations: bool,
+    quiet: bool,
+    on_record: Optional[Callable[[Dict[str, Any]], None]],
+) -> Dict[str, Any]:
+    rng = random.Random(derive_seed(seed, 'conditions'))
+    if seed is not None:
+        config.setdefault('sampling_seed', derive_seed(seed, 'sampling'))
+    mgr = HeadlessManager(config, touches or RandomTouches(derive_seed(seed, 'touches')), on_record=on_record)
+    conditions = list(config['conditions'].items())
+    # Import every trial module first so headless() can patch it.
+    classes = {
+        trial_type: trial_class_for(config, trial_type)
+        for trial_type in config['trial_types']
+    }
+    trial_factory.clear()
+    stage_latency.clear()
+
+    durations_ns: List[int] = []
+    peak_bytes: List[int] = []
+    outcomes: Dict[str, int] = {}
+    stdout = open(os.devnull, 'w') if quiet else sys.stdout
+    with headless(), contextlib.redirect_stdout(stdout):
+        trial_factory.compile(config)
+        if track_allocations:
+            tracemalloc.start()
+        started = time.perf_counter_ns()
+        for _ in range(n_trials):
+            _, condition = rng.choice(conditions)
+            if track_allocations:
+                tracemalloc.reset_peak()
+                baseline, _ = tracemalloc.get_traced_memory()
+            t0 = time.perf_counter_ns()
+            trial = classes[condition['trial_type']].from_config({**config, **condition})
+            result = trial.run(mgr)
+            durations_ns.append(time.perf_counter_ns() - t0)
+            if track_allocations:
+                _, peak = tracemalloc.get_traced_memory()
+                peak_bytes.append(peak - baseline)
+            outcomes[result.outcome] = outcomes.get(result.outcome, 0) + 1
+            if not result.continue_session:
+                break
+        elapsed_ns = time.perf_counter_ns() - started
+        if track_allocations:
+            tracemalloc.stop()
+        trial_recorder.flush()
+    if quiet:
+        stdout.close()
+
+    durations_us = sorted(ns / 1_000 for ns in durations_ns)
+    report = {
+        'trials': len(durations_ns),
+        'trials_per_second': len(durations_ns) / (elapsed_ns / 1e9) if elapsed_ns else float('nan'),
+        'mean_us': sum(durations_us) / len(durations_us) if durations_us else float('nan'),
+        'p50_us': _percentile(durations_us, 0.5),
+        'p99_us': _percentile(durations_us, 0.99),
+        'max_us': durations_us[-1] if durations_us else float('nan'),
+        'outcomes': outcomes,
+        'records': len(mgr.records),
+        'pump_commands': len(mgr.pump.commands),
+        'frames': mgr.frames,
+        'latency': latency_summary(),
+    }
+    if track_allocations and peak_bytes:
+        peak_bytes.sort()
+        report['mean_peak_bytes'] = sum(peak_bytes) / len(peak_bytes)
+        report['p99_peak_bytes'] = _percentile(peak_bytes, 0.99)
+    return report
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [
+        f"trials            {report['trials']}",
+        f"trials/s          {report['trials_per_second']:.0f}",
+        f"per-trial mean    {report['mean_us']:.1f} us",
+        f"per-trial p50     {report['p50_us']:.1f} us",
+        f"per-trial p99     {report['p99_us']:.1f} us",
+        f"per-trial max     {report['max_us']:.1f} us",
+    ]
+    if 'mean_peak_bytes' in report:
+        lines.append(f"peak alloc mean   {report['mean_peak_bytes']:.0f} B")
+        lines.append(f"peak alloc p99    {report['p99_peak_bytes']:.0f} B")
+    lines.append(f"outcomes          {report['outcomes']}")
+    lines.append(f"records / pump    {report['records']} / {report['pump_commands']}")
+    if any(stats['n'] for stats in report['latency'].values()):
+        lines.append('')
+        lines.append(format_latency_summary(report['latency']))
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Run trial classes headlessly and report per-trial overhead")
+    parser.add_argument("config", help="Path to a config module, e.g. configs/flea_distribution.py")
+    parser.add_argument("--trials", type=int, default=1000, help="Number of trials to run")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for condition choice, touches and sampling")
+    parser.add_argument("--p-timeout", type=float, default=0.05, help="Probability a random touch source times out")
+    parser.add_argument("--allocations", action="store_true", help="Track per-trial allocations with tracemalloc")
+    parser.add_argument("--verbose", action="store_true", help="Keep the trials' own console output")
+    args = parser.parse_args(argv)
+
+    report = run_trials(
+        load_config(args.config),
+        args.trials,
+        touches=RandomTouches(derive_seed(args.seed, 'touches'), p_timeout=args.p_timeout),
+        seed=args.seed,
+        track_allocations=args.allocations,
+        quiet=not args.verbose,
+    )
+    print(format_report(report))
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Synthetic rig databases for trying the rig monitor without any rigs.
+
+Usage (from the repository root):
+    python -m bench.rig_databases /tmp/rigs --rigs 3 --trials 500
+    python -m bench.rig_databases /tmp/rigs --rigs 3 --trials 500 --follow 2
+    python -m analyze.rig_monitor /tmp/rigs/*/data/data.db
+
+Each rig gets <out>/<rig>/data/data.db with a `data` and a `sessions` table
+shaped like the experiment library's, filled with records from the real
+trial classes run through the headless harness. --follow then keeps
+appending trials to every rig at that many trials per second until
+interrupted, so the monitor has something to tail.
+"""
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from bench.harness import RandomTouches, derive_seed, load_config, run_trials
+
+DEFAULT_CONFIGS = ('configs/flea_random.py', 'configs/flea_distribution.py')
+BLOCK_SIZE = 100
+# Spacing of the back-filled trials' timestamps.
+TRIAL_SPACING = datetime.timedelta(seconds=20)
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    return str(value)
+
+
+def generate_records(config_paths: Sequence[str], n_trials: int, seed: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Fields recorded by about `n_trials` harness trials, split evenly over the configs."""
+    records: List[Dict[str, Any]] = []
+    per_config = max(1, n_trials // len(config_paths))
+    for offset, path in enumerate(config_paths):
+        block = os.path.splitext(os.path.basename(path))[0]
+        collected: List[Dict[str, Any]] = []
+        config_seed = None if seed is None else seed + offset
+        run_trials(
+            load_config(path),
+            per_config,
+            touches=RandomTouches(derive_seed(config_seed, 'touches')),
+            seed=config_seed,
+            on_record=collected.append,
+        )
+        records.extend({**fields, 'block': block} for fields in collected)
+    return records
+
+
+class RigDatabase:
+    """One synthetic rig: appends records to its `data` table as the library would."""
+
+    def __init__(self, path: str, config_paths: Sequence[str]):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(path):
+            os.remove(path)
+        self.conn = sqlite3.connect(path)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE data (date TEXT, time TEXT, condition TEXT, block TEXT, "
+                "block_number INTEGER, trialid INTEGER, outcome TEXT, data TEXT)"
+            )
+            self.conn.execute("CREATE TABLE sessions (config TEXT, created_at TEXT)")
+            self.conn.execute(
+                "INSERT INTO sessions VALUES (?, ?)",
+                (json.dumps(load_config(config_paths[-1]), default=_jsonable), datetime.datetime.now().isoformat()),
+            )
+        self.trialid = 0
+
+    def append(self, records: Sequence[Dict[str, Any]], at: Sequence[datetime.datetime]) -> None:
+        rows = []
+        for fields, when in zip(records, at):
+            payload = dict(fields)
+            outcome = payload.pop('outcome', None)
+            block = payload.pop('block', 'N/A')
+            stimulus_set = payload.get('stimulus_set')
+            kind = payload.get('trial_kind') or 'trial'
+            condition = f"set{stimulus_set}_{kind}" if stimulus_set is not None else kind
+            rows.append((
+                when.date().isoformat(),
+                when.time().isoformat(timespec='microseconds'),
+                condition,
+                block,
+                self.trialid // BLOCK_SIZE,
+                self.trialid,
+                outcome,
+                json.dumps(payload, default=_jsonable),
+            ))
+            self.trialid += 1
+        with self.conn:
+            self.conn.executemany("INSERT INTO data VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def build_rigs(
+    out_dir: str,
+    n_rigs: int,
+    n_trials: int,
+    config_paths: Sequence[str] = DEFAULT_CONFIGS,
+    seed: int = 0,
+) -> List[RigDatabase]:
+    rigs = []
+    now = datetime.datetime.now()
+    for index in range(n_rigs):
+        rig = RigDatabase(os.path.join(out_dir, f"rig{index + 1}", 'data', 'data.db'), config_paths)
+        records = generate_records(config_paths, n_trials, seed=seed + 100 * index)
+        rig.append(records, [now - TRIAL_SPACING * (len(records) - i) for i in range(len(records))])
+        rigs.append(rig)
+    return rigs
+
+
+def follow(rigs: Sequence[RigDatabase], rate: float, config_paths: Sequence[str], seed: int = 0) -> None:
+    """Append one trial per rig every 1 / rate seconds, cycling through a pool of records."""
+    pools = [generate_records(config_paths, 500, seed=seed + 100 * index + 50) for index in range(len(rigs))]
+    position = 0
+    while True:
+        now = datetime.datetime.now()
+        for rig, pool in zip(rigs, pools):
+            rig.append([pool[position % len(pool)]], [now])
+        position += 1
+        time.sleep(1.0 / rate)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Write synthetic rig session databases for the rig monitor")
+    parser.add_argument("out", help="Directory to write <rig>/data/data.db under")
+    parser.add_argument("--rigs", type=int, default=3, help="Number of rigs")
+    parser.add_argument("--trials", type=int, default=500, help="Trials to back-fill per rig")
+    parser.add_argument("--config", dest="configs", nargs="+", default=list(DEFAULT_CONFIGS), help="Config modules to run trials from")
+    parser.add_argument("--seed", type=int, default=0, help="Base seed; each rig offsets it")
+    parser.add_argument("--follow", type=float, default=None, help="Keep appending this many trials per second to every rig")
+    args = parser.parse_args(argv)
+
+    rigs = build_rigs(args.out, args.rigs, args.trials, args.configs, args.seed)
+    for rig in rigs:
+        print(f"{rig.path}: {rig.trialid} trials")
+    if args.follow:
+        print(f"Appending {args.follow:g} trials/s per rig; Ctrl-C to stop")
+        try:
+            follow(rigs, args.follow, args.configs, args.seed)
+        except KeyboardInterrupt:
+            pass
+    for rig in rigs:
+        rig.close()
+
+
+if __name__ == "__main__":
+    main()
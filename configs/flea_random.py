@@ -3,8 +3,7 @@ from itertools import product, combinations
 import json
 import os
 
-import numpy as np
-import pandas as pd
+from configs.plan import load_or_build
 
 DISPLAY_SIZE = (1080, 1920)
 ASPECT_RATIO = DISPLAY_SIZE[0] / DISPLAY_SIZE[1]
@@ -15,170 +14,186 @@ BBOX_RATIO = 1.5
 STIMULUS_BBOX = {'width': STIMULUS_WIDTH * BBOX_RATIO, 'height': STIMULUS_HEIGHT * BBOX_RATIO}
 N_POSITIONS = 6
 RADIUS = 0.5
-ANGLES = np.arange(N_POSITIONS) * (360/N_POSITIONS) * np.pi/180
-x, y = RADIUS * np.cos(ANGLES), RADIUS * np.sin(ANGLES)
-STIMULUS_LOCATIONS = list(zip(x, y))
-LOCATIONS: Dict[int|str, tuple] = {
-    'center': (0.0, 0.0),
-}
-for i, (x, y) in enumerate(STIMULUS_LOCATIONS):
-    LOCATIONS[i] = (float(x), float(y))
-locations = range(N_POSITIONS)
-location_pairs = pd.read_csv('configs/locs.csv', index_col=0).loc[:, ['x','y']].values.tolist()
 MAGNITUDES = tuple(range(1, 6))
 
 # Edit this to choose which stimulus sets can appear in a session.
 ENABLED_STIMULUS_SETS = (1, 2, 3, 4, 5)
 TRIALS_PER_STIMULUS_SET_BLOCK = 50
 
-config: Dict[str, Any] = dict(
-    name='fleabottom',
-    coordinate_space='ndc',
-    storage={'type': 'sqlite', 'path': 'data/data.db'},
-    duration=10,
-    size=STIMULUS_SIZE,
-    bbox=STIMULUS_BBOX,
-    allow_outside_touch=True,
-    ITI=1.5,
-    cue_incorrect=True,
-    reward_feedback_method='bar_height',
-    locations=LOCATIONS,
-    display={
-        'size': DISPLAY_SIZE,
-        'display': 0,
-        'fullscreen': True
-    },
-    remote_server={
-        'enabled': True,
-        'show': False,
-        'template_path': 'server',
+# Files and environment variables the built config depends on; the cached
+# plan is rebuilt whenever any of them (or this file) changes.
+PLAN_INPUTS = ('configs/locs.csv', 'stimuli/stimuli.json')
+PLAN_ENV = ('PUMP',)
+
+
+def build_config() -> Dict[str, Any]:
+    import numpy as np
+    import pandas as pd
+
+    ANGLES = np.arange(N_POSITIONS) * (360/N_POSITIONS) * np.pi/180
+    x, y = RADIUS * np.cos(ANGLES), RADIUS * np.sin(ANGLES)
+    STIMULUS_LOCATIONS = list(zip(x, y))
+    LOCATIONS: Dict[int|str, tuple] = {
+        'center': (0.0, 0.0),
     }
-)
-config['io'] = {
-    'reward': {
-        'type': 'ISMATEC_SERIAL',
-        'address': os.environ.get('PUMP', '/dev/ttyACM0'),
-        'channels': [
-            {'channel': '1', 'clockwise': True, 'speed': 100},
-            {'channel': '4', 'clockwise': True, 'speed': 100}
-        ]
+    for i, (x, y) in enumerate(STIMULUS_LOCATIONS):
+        LOCATIONS[i] = (float(x), float(y))
+    locations = range(N_POSITIONS)
+    location_pairs = pd.read_csv('configs/locs.csv', index_col=0).loc[:, ['x','y']].values.tolist()
+
+    config: Dict[str, Any] = dict(
+        name='fleabottom',
+        coordinate_space='ndc',
+        storage={'type': 'sqlite', 'path': 'data/data.db'},
+        duration=10,
+        size=STIMULUS_SIZE,
+        bbox=STIMULUS_BBOX,
+        allow_outside_touch=True,
+        ITI=1.5,
+        cue_incorrect=True,
+        reward_feedback_method='bar_height',
+        locations=LOCATIONS,
+        display={
+            'size': DISPLAY_SIZE,
+            'display': 0,
+            'fullscreen': True
+        },
+        remote_server={
+            'enabled': True,
+            'show': False,
+            'template_path': 'server',
+        }
+    )
+    config['io'] = {
+        'reward': {
+            'type': 'ISMATEC_SERIAL',
+            'address': os.environ.get('PUMP', '/dev/ttyACM0'),
+            'channels': [
+                {'channel': '1', 'clockwise': True, 'speed': 100},
+                {'channel': '4', 'clockwise': True, 'speed': 100}
+            ]
+        }
     }
-}
-
-magnitudes = MAGNITUDES
-reward_duration = 0.8  # in seconds
-interpulse_interval = 0.2  # in seconds
-config['reward_channels'] = ('1','4')
-config['magnitude_mapping'] = {
-    mag: {'duration': reward_duration*mag, 'n_pulses': 1, 'interpulse_interval': 0}
-    for mag in magnitudes
-}
-
-with open('stimuli/stimuli.json') as f:
-    stimulus_data = json.load(f)
-STIMULUS_SETS = {
-    int(stimulus_set_id): {}
-    for stimulus_set_id in {
-        int(cue['stimulus_set_id'])
-        for cue in stimulus_data['magnitude_cues']
+
+    magnitudes = MAGNITUDES
+    reward_duration = 0.8  # in seconds
+    interpulse_interval = 0.2  # in seconds
+    config['reward_channels'] = ('1','4')
+    config['magnitude_mapping'] = {
+        mag: {'duration': reward_duration*mag, 'n_pulses': 1, 'interpulse_interval': 0}
+        for mag in magnitudes
     }
-}
-for cue in stimulus_data['magnitude_cues']:
-    STIMULUS_SETS[int(cue['stimulus_set_id'])][int(cue['magnitude'])] = cue['image']
-DISTRIBUTION_CUES = {
-    str(cue['id']): cue
-    for cue in stimulus_data.get('distribution_cues', [])
-}
-if not ENABLED_STIMULUS_SETS:
-    raise ValueError("ENABLED_STIMULUS_SETS must contain at least one stimulus set.")
-unknown_sets = set(ENABLED_STIMULUS_SETS) - set(STIMULUS_SETS)
-if unknown_sets:
-    raise ValueError(f"Unknown stimulus sets requested: {sorted(unknown_sets)}")
-missing_magnitudes = {
-    set_id: sorted(set(magnitudes) - set(STIMULUS_SETS[set_id]))
-    for set_id in ENABLED_STIMULUS_SETS
-    if set(magnitudes) - set(STIMULUS_SETS[set_id])
-}
-if missing_magnitudes:
-    raise ValueError(f"Stimulus sets are missing magnitudes: {missing_magnitudes}")
-
-config['stimulus_sets'] = STIMULUS_SETS
-config['distribution_cues'] = DISTRIBUTION_CUES
-# Fallback only; each generated condition below overrides items with its own
-# stimulus set so trials never mix images across sets.
-config['items'] = STIMULUS_SETS[ENABLED_STIMULUS_SETS[0]]
-
-forced_choice_trials = {
-    f'set{set_id}_forced_m{mag}_loc{loc}': dict(
-        stimulus_set=set_id,
-        items=STIMULUS_SETS[set_id],
-        magnitude=mag,
-        loc=loc,
-        trial_type='forced'
-    )
-    for set_id in ENABLED_STIMULUS_SETS
-    for mag, loc in product(magnitudes, locations)
-}
-
-two_afc_trials = {
-    f'set{set_id}_choice_m{option1}v{option2}_loc{locs[0]}v{locs[1]}': dict(
-        stimulus_set=set_id,
-        items=STIMULUS_SETS[set_id],
-        magnitudes=(option1, option2),
-        locs=locs,
-        trial_type='choice'
-    )
-    for set_id in ENABLED_STIMULUS_SETS
-    for (option1, option2), locs in product(combinations(magnitudes, 2), location_pairs)
-}
-
-config['conditions'] = {**forced_choice_trials, **two_afc_trials}
-
-# Random 50-trial blocks by stimulus set. Each block includes all magnitude
-# combinations and all opposite-position pairings for that stimulus set.
-stimulus_set_block_names = {
-    set_id: f'stimulus_set_{set_id}'
-    for set_id in ENABLED_STIMULUS_SETS
-}
-blocks = {}
-for set_id in ENABLED_STIMULUS_SETS:
-    current_block = stimulus_set_block_names[set_id]
-    next_from = list(set(stimulus_set_block_names.values()) - {current_block})
-    blocks[current_block] = dict(
-        stimulus_set=set_id,
-        conditions=[
-            condition_name
-            for condition_name, condition in two_afc_trials.items()
-            if condition['stimulus_set'] == set_id
-        ],
-        length=TRIALS_PER_STIMULUS_SET_BLOCK,
-        retry={'timeout': True},
-        transition=[{'next_from': next_from}],
-        method='random'
-    )
 
-config['blocks'] = blocks
+    with open('stimuli/stimuli.json') as f:
+        stimulus_data = json.load(f)
+    STIMULUS_SETS = {
+        int(stimulus_set_id): {}
+        for stimulus_set_id in {
+            int(cue['stimulus_set_id'])
+            for cue in stimulus_data['magnitude_cues']
+        }
+    }
+    for cue in stimulus_data['magnitude_cues']:
+        STIMULUS_SETS[int(cue['stimulus_set_id'])][int(cue['magnitude'])] = cue['image']
+    DISTRIBUTION_CUES = {
+        str(cue['id']): cue
+        for cue in stimulus_data.get('distribution_cues', [])
+    }
+    if not ENABLED_STIMULUS_SETS:
+        raise ValueError("ENABLED_STIMULUS_SETS must contain at least one stimulus set.")
+    unknown_sets = set(ENABLED_STIMULUS_SETS) - set(STIMULUS_SETS)
+    if unknown_sets:
+        raise ValueError(f"Unknown stimulus sets requested: {sorted(unknown_sets)}")
+    missing_magnitudes = {
+        set_id: sorted(set(magnitudes) - set(STIMULUS_SETS[set_id]))
+        for set_id in ENABLED_STIMULUS_SETS
+        if set(magnitudes) - set(STIMULUS_SETS[set_id])
+    }
+    if missing_magnitudes:
+        raise ValueError(f"Stimulus sets are missing magnitudes: {missing_magnitudes}")
+
+    config['stimulus_sets'] = STIMULUS_SETS
+    config['distribution_cues'] = DISTRIBUTION_CUES
+    # Fallback only; each generated condition below overrides items with its own
+    # stimulus set so trials never mix images across sets.
+    config['items'] = STIMULUS_SETS[ENABLED_STIMULUS_SETS[0]]
 
-config['trial_types'] = {
-    'forced': {
-        'module': 'trials/forced.py',
-        'class': 'ForcedChoiceTrial'
-    },
-    'choice': {
-        'module': 'trials/twoafc.py',
-        'class': 'TwoAFCTrial'
+    forced_choice_trials = {
+        f'set{set_id}_forced_m{mag}_loc{loc}': dict(
+            stimulus_set=set_id,
+            items=STIMULUS_SETS[set_id],
+            magnitude=mag,
+            loc=loc,
+            trial_type='forced'
+        )
+        for set_id in ENABLED_STIMULUS_SETS
+        for mag, loc in product(magnitudes, locations)
     }
-}
-config['hotkeys'] = {
-    '4': {'do':'pump_on'},
-    '8': {'do': 'pump_off'},
-    '3': {'do': 'pause'},
-    '7': {'do': 'unpause'},
-    '5': {'do': 'quit'}
-}
-config['valid_times'] = [
-    {'start': '08:00', 'end': '18:00'}
-]
+
+    two_afc_trials = {
+        f'set{set_id}_choice_m{option1}v{option2}_loc{locs[0]}v{locs[1]}': dict(
+            stimulus_set=set_id,
+            items=STIMULUS_SETS[set_id],
+            magnitudes=(option1, option2),
+            locs=locs,
+            trial_type='choice'
+        )
+        for set_id in ENABLED_STIMULUS_SETS
+        for (option1, option2), locs in product(combinations(magnitudes, 2), location_pairs)
+    }
+
+    config['conditions'] = {**forced_choice_trials, **two_afc_trials}
+
+    # Random 50-trial blocks by stimulus set. Each block includes all magnitude
+    # combinations and all opposite-position pairings for that stimulus set.
+    stimulus_set_block_names = {
+        set_id: f'stimulus_set_{set_id}'
+        for set_id in ENABLED_STIMULUS_SETS
+    }
+    blocks = {}
+    for set_id in ENABLED_STIMULUS_SETS:
+        current_block = stimulus_set_block_names[set_id]
+        next_from = list(set(stimulus_set_block_names.values()) - {current_block})
+        blocks[current_block] = dict(
+            stimulus_set=set_id,
+            conditions=[
+                condition_name
+                for condition_name, condition in two_afc_trials.items()
+                if condition['stimulus_set'] == set_id
+            ],
+            length=TRIALS_PER_STIMULUS_SET_BLOCK,
+            retry={'timeout': True},
+            transition=[{'next_from': next_from}],
+            method='random'
+        )
+
+    config['blocks'] = blocks
+
+    config['trial_types'] = {
+        'forced': {
+            'module': 'trials/forced.py',
+            'class': 'ForcedChoiceTrial'
+        },
+        'choice': {
+            'module': 'trials/twoafc.py',
+            'class': 'TwoAFCTrial'
+        }
+    }
+    config['hotkeys'] = {
+        '4': {'do':'pump_on'},
+        '8': {'do': 'pump_off'},
+        '3': {'do': 'pause'},
+        '7': {'do': 'unpause'},
+        '5': {'do': 'quit'}
+    }
+    config['valid_times'] = [
+        {'start': '08:00', 'end': '18:00'}
+    ]
+    return config
+
+
+config = load_or_build(__file__, build_config, inputs=PLAN_INPUTS, env=PLAN_ENV)
+
 if __name__ == '__main__':
     import pprint
     pprint.pprint(config)
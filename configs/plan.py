@@ -0,0 +1,92 @@
+"""Cached session plans for config modules.
+
+A config module wraps its expensive construction in a build function and
+calls load_or_build. The built config is pickled under configs/.plans/,
+keyed by a hash of the config source, its input files and any environment
+variables it reads. Later launches with the same inputs unpickle the plan
+without running the build, so pandas and numpy are not imported.
+
+Compile a plan ahead of time with:
+    python -m configs.plan configs/flea_random.py
+"""
+import glob
+import hashlib
+import importlib.util
+import os
+import pickle
+import sys
+from typing import Any, Callable, Dict, Sequence
+
+PLAN_DIR = os.path.join('configs', '.plans')
+PLAN_FORMAT = 1
+
+
+def plan_key(source_path: str, inputs: Sequence[str] = (), env: Sequence[str] = ()) -> str:
+    digest = hashlib.sha256(f'plan-format={PLAN_FORMAT}\0'.encode())
+    for path in (source_path, *inputs):
+        with open(path, 'rb') as f:
+            digest.update(f.read() + b'\0')
+    for name in env:
+        digest.update(f'\0{name}={os.environ.get(name)}'.encode())
+    return digest.hexdigest()[:16]
+
+
+def plan_name(source_path: str) -> str:
+    return os.path.splitext(os.path.basename(source_path))[0]
+
+
+def plan_path(source_path: str, key: str) -> str:
+    return os.path.join(PLAN_DIR, f'{plan_name(source_path)}-{key}.pickle')
+
+
+def load_plan(path: str) -> Dict[str, Any] | None:
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+
+
+def save_plan(source_path: str, path: str, config: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    for stale in glob.glob(os.path.join(PLAN_DIR, f'{plan_name(source_path)}-*.pickle')):
+        if stale != path:
+            os.remove(stale)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(config, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_or_build(
+    source_path: str,
+    build: Callable[[], Dict[str, Any]],
+    inputs: Sequence[str] = (),
+    env: Sequence[str] = (),
+) -> Dict[str, Any]:
+    path = plan_path(source_path, plan_key(source_path, inputs, env))
+    config = load_plan(path)
+    if config is None:
+        config = build()
+        save_plan(source_path, path, config)
+    return config
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    import argparse
+    parser = argparse.ArgumentParser(description="Compile config modules into cached session plans")
+    parser.add_argument("configs", nargs="+", help="Config module paths, e.g. configs/flea_random.py")
+    args = parser.parse_args(argv)
+    for source_path in args.configs:
+        spec = importlib.util.spec_from_file_location(plan_name(source_path), source_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        plans = sorted(glob.glob(os.path.join(PLAN_DIR, f'{plan_name(source_path)}-*.pickle')))
+        if plans:
+            print(f"{source_path}: {len(module.config.get('conditions', {}))} conditions -> {plans[-1]}")
+        else:
+            print(f"{source_path}: does not use a cached plan", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
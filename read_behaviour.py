@@ -1,10 +1,24 @@
 
+import numpy as np
 import pandas as pd
-import sqlite3
 import json
+import sqlite3
 import seaborn as sns
 import matplotlib.pyplot as plt
 
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+from analyze.data_cache import load_data
+from analyze.trial_store import typed_columns
+from analyze.bootstrap import accuracy_intervals
+from analyze.psychometric import fit_psychometric, psychometric_curve
+
+DB_PATH = r"C:\Users\akeeler\data.db"
+
 def draw_heatmap(data, **kwargs):
     # Pivot for heatmap values
     value_pivot = data.pivot(
@@ -13,13 +27,14 @@ def draw_heatmap(data, **kwargs):
         values="accuracy_mean"
     )
 
-    # Pivot for annotations
+    # Pivot for annotations; bootstrap intervals go under the mean when present
+    if "ci_low" in data:
+        label = lambda r: f"{r['accuracy_mean']:.2f}\n[{r['ci_low']:.2f}, {r['ci_high']:.2f}]\n(n={int(r['n_trials'])})"
+    else:
+        label = lambda r: f"{r['accuracy_mean']:.2f}\n(n={int(r['n_trials'])})"
     annot_pivot = (
         data.assign(
-            annot=lambda d: d.apply(
-                lambda r: f"{r['accuracy_mean']:.2f}\n(n={int(r['n_trials'])})",
-                axis=1
-            )
+            annot=lambda d: d.apply(label, axis=1)
         )
         .pivot(
             index="locs",
@@ -38,38 +53,93 @@ def draw_heatmap(data, **kwargs):
         cbar=False,
         **kwargs
     )
-def get_value_difference(x):
-    x = json.loads(x)
-    op_left, op_right = x['magnitudes']
-    loc1, loc2 = x['locations']
-    if loc1[0] > loc2[1]:
-        op_left, op_right = op_right, op_left
-    return op_left - op_right
-def get_chose_left(x):
-    x = json.loads(x)
-    loc1, loc2 = x['locations']
-    return (loc1[0] < loc2[1]) == (x['chosen'] == 'option1')
-
-def get_data():
-    conn = sqlite3.connect(r"C:\Users\akeeler\data.db")
-    query = """
-    SELECT * 
-    FROM data 
-    WHERE outcome in ("correct", "incorrect")
+_NO_PAIR = (float('nan'), float('nan'))
+_NO_LOCATIONS = (_NO_PAIR, _NO_PAIR)
+TYPED_COLUMNS = (
+    'option1_magnitude', 'option2_magnitude',
+    'option1_x', 'option1_y', 'option2_x', 'option2_y',
+    'chosen', 'RT',
+)
+
+
+def decode_payloads(payloads):
+    """Parse each `data` payload once and expand the fields used here into typed arrays.
+
+    Returns magnitudes (n, 2) and locations (n, 2, 2) as floats, chosen as an
+    object array and RT as floats; fields a payload lacks come back as NaN/None.
+    """
+    records = [_loads(payload) for payload in payloads]
+    return {
+        'magnitudes': np.array([r.get('magnitudes') or _NO_PAIR for r in records], dtype=float).reshape(-1, 2),
+        'locations': np.array([r.get('locations') or _NO_LOCATIONS for r in records], dtype=float).reshape(-1, 2, 2),
+        'chosen': np.array([r.get('chosen') for r in records], dtype=object),
+        'RT': np.array([r.get('RT') for r in records], dtype=float),
+    }
+
+
+def load_payloads(db_path, data):
+    """decode_payloads for `data` (loaded with_rowid), from the typed table where it has the row.
+
+    Only rows the typed table lacks, e.g. from before it existed, have their
+    JSON payload parsed.
     """
-    data = pd.read_sql(query, conn)
+    conn = sqlite3.connect(db_path)
+    try:
+        typed = typed_columns(conn, data['_rowid'], TYPED_COLUMNS)
+    finally:
+        conn.close()
+    rows = typed.reindex(data['_rowid'])
+    payload = {
+        'magnitudes': rows[['option1_magnitude', 'option2_magnitude']].to_numpy(dtype=float, copy=True),
+        'locations': rows[['option1_x', 'option1_y', 'option2_x', 'option2_y']].to_numpy(dtype=float, copy=True).reshape(-1, 2, 2),
+        'chosen': rows['chosen'].to_numpy(dtype=object, copy=True),
+        'RT': rows['RT'].to_numpy(dtype=float, copy=True),
+    }
+    untyped = ~data['_rowid'].isin(typed.index).to_numpy()
+    if untyped.any():
+        for name, values in decode_payloads(data.loc[untyped, 'data']).items():
+            payload[name][untyped] = values
+    return payload
+
+
+def add_choice_columns(data, payload):
+    magnitudes, locations = payload['magnitudes'], payload['locations']
+    # Same side rule as the original per-row helpers: option1 is on the left
+    # when its x is below option2's second coordinate.
+    option1_left = locations[:, 0, 0] < locations[:, 1, 1]
+    swap = locations[:, 0, 0] > locations[:, 1, 1]
+    data['value_left_minus_right'] = (np.where(swap, -1, 1) * (magnitudes[:, 0] - magnitudes[:, 1])).astype(int)
+    data['chose_left'] = option1_left == (payload['chosen'] == 'option1')
+    data['chosen'] = payload['chosen']
+    data['RT'] = payload['RT']
+    return data
+
+
+def get_data(db_path=DB_PATH, cache=True, start=None, end=None, refresh=True):
+    data = load_data(
+        db_path, start=start, end=end, outcomes=("correct", "incorrect"), cache=cache, refresh=refresh, with_rowid=True,
+    )
+    if data.empty:
+        return data.drop(columns='_rowid', errors='ignore')
+    payload = load_payloads(db_path, data)
+    data = data.drop(columns='_rowid')
+    # Only two-option trials carry a magnitude pair; forced trials share the outcomes.
+    keep = ~np.isnan(payload['magnitudes']).any(axis=1)
+    data = data.loc[keep].reset_index(drop=True)
+    payload = {name: values[keep] for name, values in payload.items()}
+
     data['datetime']=pd.to_datetime(data['date'] + ' ' + data['time'])
-    condition_split = data['condition'].str.split('_')
-    data['stimulus_set'] = condition_split.str[0]
-    data['values'] = condition_split.str[2]
-    data['locs'] = condition_split.str[3]
-    data['option1_value'], data['option2_value'] = data['values'].str[1].astype(int), data['values'].str[3].astype(int)
-    data['option1_loc'], data['option2_loc'] = data['locs'].str[3].astype(int), data['locs'].str[5].astype(int)
+    condition = data['condition'].str.extract(r'^(?P<stimulus_set>[^_]+)_[^_]+_(?P<values>[^_]+)_(?P<locs>loc(?P<option1_loc>\d+)v(?P<option2_loc>\d+))')
+    data['stimulus_set'] = condition['stimulus_set']
+    data['values'] = condition['values']
+    data['locs'] = condition['locs']
+    data['option1_value'] = payload['magnitudes'][:, 0].astype(int)
+    data['option2_value'] = payload['magnitudes'][:, 1].astype(int)
+    data['option1_loc'] = condition['option1_loc'].astype(int)
+    data['option2_loc'] = condition['option2_loc'].astype(int)
     data['abs_value_diff'] = abs(data['option1_value'] - data['option2_value'])
     data['accuracy'] = data['outcome'].map({'correct': 1, 'incorrect': 0})
-    data['value_left_minus_right'] = data['data'].apply(get_value_difference)
-    data['chose_left'] = data['data'].apply(get_chose_left)
-    return data
+    return add_choice_columns(data, payload)
 
 def plot_choice_probability(data, period="4D"):
     # Create 2-day bins
@@ -84,15 +154,9 @@ def plot_choice_probability(data, period="4D"):
     )
     
     fig, ax = plt.subplots(figsize=(6, 4))
-    sns.regplot(
-        data=data,
-        x='value_left_minus_right',
-        y='chose_left',
-        logistic=True,
-        scatter=False,
-        ci=None,
-        ax=ax
-    )
+    pooled = fit_psychometric(data, by=()).iloc[0]
+    x = np.linspace(data['value_left_minus_right'].min(), data['value_left_minus_right'].max(), 200)
+    ax.plot(x, psychometric_curve(pooled, x))
     sns.scatterplot(
         data=data.groupby(['value_left_minus_right', 'datetime_bin'])['chose_left'].mean().reset_index(),
         x='value_left_minus_right',
@@ -106,19 +170,22 @@ def plot_choice_probability(data, period="4D"):
     ax.axhline(0.5, color='gray', linestyle='--')
     ax.axvline(0, color='gray', linestyle='--')
 
-def plot_heatmaps(data, period="2D"):
+def plot_heatmaps(data, period="2D", n_resamples=0, seed=None):
     # Create bins
     data["datetime_bin"] = data["datetime"].dt.floor(period)
 
-    # Aggregate mean accuracy + trial counts
-    agg = (
-        data.groupby(["datetime_bin", "locs", "abs_value_diff"])
-            .agg(
-                accuracy_mean=("accuracy", "mean"),
-                n_trials=("accuracy", "size")
-            )
-            .reset_index()
-    )
+    # Aggregate mean accuracy + trial counts, with bootstrap intervals if asked
+    if n_resamples:
+        agg = accuracy_intervals(data, n_resamples=n_resamples, seed=seed)
+    else:
+        agg = (
+            data.groupby(["datetime_bin", "locs", "abs_value_diff"])
+                .agg(
+                    accuracy_mean=("accuracy", "mean"),
+                    n_trials=("accuracy", "size")
+                )
+                .reset_index()
+        )
 
     # Facet grid
     g = sns.FacetGrid(
@@ -150,9 +217,12 @@ if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Analyze TwoAFC behavior data")
     parser.add_argument("--period", type=str, default="2D", help="Time period for binning (e.g., '2D' for 2 days)")
+    parser.add_argument("--db", type=str, default=DB_PATH, help="Path to the session database")
+    parser.add_argument("--no-cache", action="store_true", help="Query the database directly instead of the local cache")
+    parser.add_argument("--bootstrap", type=int, default=0, help="Bootstrap resamples for accuracy intervals (0 to skip)")
     args = parser.parse_args()
-    data = get_data()
+    data = get_data(args.db, cache=not args.no_cache)
     plot_choice_probability(data, period=args.period)
     plt.show()
-    plot_heatmaps(data, period=args.period)
+    plot_heatmaps(data, period=args.period, n_resamples=args.bootstrap)
     plt.show()
\ No newline at end of file
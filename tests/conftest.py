@@ -0,0 +1,39 @@
+import json
+import sqlite3
+
+import pytest
+
+DATA_COLUMNS = ('date', 'time', 'condition', 'block', 'block_number', 'trialid', 'outcome', 'data')
+
+
+def append_rows(path, rows):
+    """Append rows shaped like the experiment library's `data` table, creating it if needed."""
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute(f"CREATE TABLE IF NOT EXISTS data ({', '.join(DATA_COLUMNS)})")
+        conn.executemany(
+            f"INSERT INTO data VALUES ({', '.join('?' * len(DATA_COLUMNS))})",
+            [
+                tuple(json.dumps(row.get(name, {})) if name == 'data' else row.get(name) for name in DATA_COLUMNS)
+                for row in rows
+            ],
+        )
+    conn.close()
+
+
+def trial_row(trialid, date='2026-01-01', outcome='correct', block='block_magnitude', stimulus_set=1, **payload):
+    return {
+        'date': date,
+        'time': f"10:00:{trialid % 60:02d}",
+        'condition': f"set{stimulus_set}_choice",
+        'block': block,
+        'block_number': trialid // 10,
+        'trialid': trialid,
+        'outcome': outcome,
+        'data': {'stimulus_set': stimulus_set, **payload},
+    }
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'data.db')
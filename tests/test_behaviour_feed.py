@@ -0,0 +1,104 @@
+import os
+import socket
+
+import trials.behaviour_feed as behaviour_feed_module
+from trials.behaviour_feed import DEFAULT_HOST, BehaviourFeed, SessionTail, behaviour_delta, configure_behaviour_feed
+from conftest import append_rows, trial_row
+
+
+def test_tail_reads_only_new_rows(db_path):
+    tail = SessionTail(db_path)
+    assert tail.poll() == (False, [])
+    assert tail.error == 'database not found'
+
+    append_rows(db_path, [trial_row(i) for i in range(3)])
+    reset, added = tail.poll()
+    assert not reset
+    assert [key for key, _ in added] == ['1', '2', '3']
+    assert added[0][1]['data'] == {'stimulus_set': 1}
+
+    append_rows(db_path, [trial_row(3)])
+    reset, added = tail.poll()
+    assert [record['trialid'] for _, record in added] == [3]
+    assert len(tail.records) == 4
+    assert tail.aggregates.counts['1']['stats']['records'] == 4
+
+
+def test_tail_resets_on_replaced_database(db_path):
+    tail = SessionTail(db_path)
+    append_rows(db_path, [trial_row(i) for i in range(2)])
+    tail.poll()
+    # A new session with more rows than the old one: the last-read row changed.
+    os.remove(db_path)
+    append_rows(db_path, [trial_row(100 + i, date='2026-02-01') for i in range(5)])
+    reset, added = tail.poll()
+    assert reset
+    assert tail.generation == 1
+    assert [record['trialid'] for _, record in added] == [100, 101, 102, 103, 104]
+    assert len(tail.records) == 5
+
+
+def test_delta_follows_cursor_and_version():
+    entries = [(str(i), {'trialid': i}) for i in range(4)]
+    full = behaviour_delta(entries, 'v1')
+    assert full['cursor'] == 4 and list(full['trials']) == ['0', '1', '2', '3']
+    assert list(behaviour_delta(entries, 'v1', since=3, version='v1')['trials']) == ['3']
+    assert behaviour_delta(entries, 'v1', since=4, version='v1')['trials'] == {}
+    # A stale version or an out-of-range cursor gets everything again.
+    assert len(behaviour_delta(entries, 'v2', since=3, version='v1')['trials']) == 4
+    assert len(behaviour_delta(entries, 'v1', since=9, version='v1')['trials']) == 4
+
+
+def test_feed_serves_deltas(db_path):
+    append_rows(db_path, [trial_row(i) for i in range(2)])
+    feed = BehaviourFeed()
+    feed.path = db_path
+    feed.tail = SessionTail(db_path)
+    feed.boot = 'b'
+    first = feed.behaviour()
+    append_rows(db_path, [trial_row(2)])
+    second = feed.behaviour(since=first['cursor'], version=first['version'])
+    assert list(second['trials']) == ['3']
+    assert second['version'] == first['version']
+
+
+def test_busy_port_leaves_feed_disabled(db_path):
+    with socket.socket() as sock:
+        sock.bind(('', 0))
+        sock.listen()
+        feed = BehaviourFeed()
+        feed.configure(enabled=True, port=sock.getsockname()[1], path=db_path)
+    assert not feed.running
+    assert not feed.enabled
+
+
+def test_feed_is_off_unless_enabled(monkeypatch, db_path):
+    feed = BehaviourFeed()
+    monkeypatch.setattr(behaviour_feed_module, 'behaviour_feed', feed)
+    configure_behaviour_feed({'storage': {'type': 'sqlite', 'path': db_path}})
+    assert not feed.enabled
+    assert not feed.running
+
+
+def test_feed_binds_the_remote_server_interface(monkeypatch, db_path):
+    feed = BehaviourFeed()
+    monkeypatch.setattr(behaviour_feed_module, 'behaviour_feed', feed)
+    with socket.socket() as sock:
+        sock.bind(('', 0))
+        port = sock.getsockname()[1]
+    config = {
+        'storage': {'type': 'sqlite', 'path': db_path},
+        'behaviour_feed': {'enabled': True, 'port': port},
+        'remote_server': {'host': '127.0.0.1'},
+    }
+    configure_behaviour_feed(config)
+    try:
+        assert feed.running
+        assert feed._server.server_address == ('127.0.0.1', port)
+    finally:
+        feed.stop()
+    configure_behaviour_feed({**config, 'remote_server': {}})
+    try:
+        assert feed.host == DEFAULT_HOST
+    finally:
+        feed.stop()
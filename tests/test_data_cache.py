@@ -0,0 +1,103 @@
+import os
+
+import pandas as pd
+
+from analyze.data_cache import default_cache_dir, load_data, read_cache, sync
+from conftest import append_rows, trial_row
+
+
+def test_sync_fetches_only_new_rows(db_path):
+    append_rows(db_path, [trial_row(i) for i in range(5)])
+    cache_dir = default_cache_dir(db_path)
+    assert sync(db_path) == 5
+    assert sync(db_path) == 0
+
+    append_rows(db_path, [trial_row(i, date='2026-01-02') for i in range(5, 8)])
+    assert sync(db_path) == 3
+    cached = read_cache(cache_dir)
+    assert cached['trialid'].tolist() == list(range(8))
+    assert sorted(os.listdir(cache_dir)) == ['2026-01-01', '2026-01-02', 'state.json']
+
+
+def test_read_cache_selects_date_partitions(db_path):
+    append_rows(db_path, [
+        trial_row(0, date='2026-01-01'),
+        trial_row(1, date='2026-01-02'),
+        trial_row(2, date='2026-01-03'),
+    ])
+    sync(db_path)
+    cached = read_cache(default_cache_dir(db_path), start='2026-01-02', end='2026-01-02')
+    assert cached['trialid'].tolist() == [1]
+
+
+def test_replaced_database_resets_cache(db_path):
+    append_rows(db_path, [trial_row(i) for i in range(6)])
+    sync(db_path)
+    os.remove(db_path)
+    append_rows(db_path, [trial_row(100 + i) for i in range(2)])
+    assert sync(db_path) == 2
+    assert read_cache(default_cache_dir(db_path))['trialid'].tolist() == [100, 101]
+
+
+def test_replaced_database_with_more_rows_resets_cache(db_path):
+    append_rows(db_path, [trial_row(i) for i in range(2)])
+    sync(db_path)
+    os.remove(db_path)
+    append_rows(db_path, [trial_row(100 + i) for i in range(5)])
+    assert sync(db_path) == 5
+    assert read_cache(default_cache_dir(db_path))['trialid'].tolist() == [100, 101, 102, 103, 104]
+
+
+def test_interrupted_sync_does_not_duplicate_rows(db_path):
+    append_rows(db_path, [trial_row(i) for i in range(2)])
+    cache_dir = default_cache_dir(db_path)
+    sync(db_path)
+    state_path = os.path.join(cache_dir, 'state.json')
+    with open(state_path) as f:
+        saved = f.read()
+    append_rows(db_path, [trial_row(i) for i in range(2, 4)])
+    sync(db_path)
+    # As if the part files were written but the process died before saving state.
+    with open(state_path, 'w') as f:
+        f.write(saved)
+    assert sync(db_path) == 2
+    assert read_cache(cache_dir)['trialid'].tolist() == [0, 1, 2, 3]
+
+
+def test_undated_rows_are_cached(db_path):
+    append_rows(db_path, [trial_row(0), trial_row(1, date=None), trial_row(2, date='2026-01-02')])
+    assert sync(db_path) == 3
+    cache_dir = default_cache_dir(db_path)
+    assert read_cache(cache_dir)['trialid'].tolist() == [0, 1, 2]
+    assert read_cache(cache_dir, start='2026-01-01')['trialid'].tolist() == [0, 2]
+    pd.testing.assert_frame_equal(
+        load_data(db_path, start='2026-01-01'),
+        load_data(db_path, cache=False, start='2026-01-01'),
+        check_dtype=False,
+    )
+
+
+def test_cached_and_direct_reads_agree(db_path):
+    append_rows(db_path, [
+        trial_row(i, date=f"2026-01-0{1 + i % 3}", outcome=('correct', 'incorrect', 'timeout')[i % 3],
+                  block=('a_magnitude', 'b_distribution')[i % 2], stimulus_set=1 + i % 2)
+        for i in range(30)
+    ])
+    filters = [
+        {},
+        {'outcomes': ('correct', 'incorrect')},
+        {'blocks': 'a_magnitude', 'start': '2026-01-02'},
+        {'stimulus_sets': [2], 'end': '2026-01-02'},
+    ]
+    for kwargs in filters:
+        cached = load_data(db_path, **kwargs)
+        direct = load_data(db_path, cache=False, **kwargs)
+        pd.testing.assert_frame_equal(cached, direct, check_dtype=False)
+
+
+def test_load_without_refresh_reads_cache_as_is(db_path):
+    append_rows(db_path, [trial_row(i) for i in range(3)])
+    sync(db_path)
+    append_rows(db_path, [trial_row(i) for i in range(3, 5)])
+    assert load_data(db_path, refresh=False)['trialid'].tolist() == [0, 1, 2]
+    assert load_data(db_path)['trialid'].tolist() == list(range(5))
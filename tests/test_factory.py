@@ -0,0 +1,130 @@
+import pytest
+
+pytest.importorskip('experiment')
+
+import trials.factory as factory_module
+from trials.factory import TrialFactory
+
+
+class FakeTrial:
+    CONDITION_FIELDS = ('stimulus_set', 'magnitudes')
+    CONFIG_FIELDS = ('duration', 'items')
+    resolved = 0
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+    @classmethod
+    def trial_kwargs(cls, config):
+        cls.resolved += 1
+        return {field: config.get(field) for field in cls.CONDITION_FIELDS + cls.CONFIG_FIELDS}
+
+
+configured = []
+
+
+@pytest.fixture
+def factory(monkeypatch):
+    configured.clear()
+    monkeypatch.setattr(factory_module, 'trial_class_for', lambda config, trial_type: FakeTrial)
+    monkeypatch.setattr(factory_module, 'configure_session', configured.append)
+    monkeypatch.setattr(factory_module, 'preflight_stimuli', lambda config, stimuli: None)
+    FakeTrial.resolved = 0
+    return TrialFactory()
+
+
+def session_config():
+    return {
+        'duration': 2.0,
+        'items': {'a': [1, 2]},
+        'conditions': {
+            'set1': {'trial_type': 'fake', 'stimulus_set': 1, 'magnitudes': [1, 2]},
+            'set2': {'trial_type': 'fake', 'stimulus_set': 2, 'magnitudes': [1, 2]},
+        },
+    }
+
+
+def test_draws_reuse_the_compiled_spec_without_resolving(factory):
+    config = session_config()
+    compiled = factory.compile(config)
+    resolved = FakeTrial.resolved
+    for name, condition in config['conditions'].items():
+        spec = factory.spec_for(FakeTrial, {**config, **condition})
+        assert spec is compiled[name]
+    # An equal but separately built value still matches the compiled one.
+    spec = factory.spec_for(FakeTrial, {**config, **config['conditions']['set1'], 'items': {'a': [1, 2]}})
+    assert spec is compiled['set1']
+    assert FakeTrial.resolved == resolved
+
+
+def test_block_overrides_resolve_once_per_variant(factory):
+    config = session_config()
+    compiled = factory.compile(config)
+    resolved = FakeTrial.resolved
+    drawn = {**config, **config['conditions']['set1'], 'duration': 0.5}
+    first = factory.spec_for(FakeTrial, drawn)
+    second = factory.spec_for(FakeTrial, dict(drawn))
+    assert first is second
+    assert first is not compiled['set1']
+    assert first.condition == 'set1'
+    assert first.kwargs['duration'] == 0.5
+    assert FakeTrial.resolved == resolved + 1
+
+
+def test_unknown_condition_fields_resolve_a_variant(factory):
+    config = session_config()
+    factory.compile(config)
+    drawn = {**config, 'trial_type': 'fake', 'stimulus_set': 3, 'magnitudes': [4]}
+    spec = factory.spec_for(FakeTrial, drawn)
+    assert spec.condition is None
+    assert spec.kwargs['stimulus_set'] == 3
+    assert factory.spec_for(FakeTrial, dict(drawn)) is spec
+
+
+def test_recompiling_does_not_reconfigure_the_session(factory):
+    config = session_config()
+    factory.compile(config)
+    changed = {**config, 'conditions': {'set3': {'trial_type': 'fake', 'stimulus_set': 3, 'magnitudes': [1]}}}
+    spec = factory.spec_for(FakeTrial, {**changed, **changed['conditions']['set3']})
+    assert spec.condition == 'set3'
+    assert configured == [config]
+    factory.clear()
+    factory.compile(changed)
+    assert configured == [config, changed]
+
+
+def test_config_fields_cover_trial_kwargs():
+    from trials.calibration import CalibrationTrial
+    from trials.distribution_twoafc import DistributionTwoAFCTrial
+    from trials.forced import ForcedChoiceTrial
+    from trials.twoafc import TwoAFCTrial
+
+    class Anything:
+        """Stands in for any config value so trial_kwargs reads every key it would."""
+
+        def __getitem__(self, key):
+            return Anything()
+
+        def __iter__(self):
+            return iter([Anything()])
+
+        def get(self, key, default=None):
+            return Anything()
+
+    class Recording(dict):
+        def __init__(self):
+            super().__init__()
+            self.read = set()
+
+        def get(self, key, default=None):
+            self.read.add(key)
+            return default
+
+        def __getitem__(self, key):
+            self.read.add(key)
+            return Anything()
+
+    for cls in (TwoAFCTrial, DistributionTwoAFCTrial, ForcedChoiceTrial, CalibrationTrial):
+        config = Recording()
+        cls.trial_kwargs(config)
+        assert config.read <= set(cls.CONDITION_FIELDS + cls.CONFIG_FIELDS), cls.__name__
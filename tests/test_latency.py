@@ -0,0 +1,86 @@
+import json
+import os
+import socket
+import urllib.request
+
+import pygame
+import pytest
+
+from trials.behaviour_feed import BehaviourFeed
+from trials.latency import STAGES, StageLatency, TrialTimeline, frame_probe, stage_latency
+from conftest import append_rows, trial_row
+
+
+@pytest.fixture
+def display():
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.display.init()
+    surface = pygame.display.set_mode((64, 48))
+    yield surface
+    frame_probe.disarm()
+    pygame.display.quit()
+
+
+def press():
+    pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=(1, 1), button=1))
+
+
+def test_probe_stamps_first_frame_and_last_press(display):
+    timeline = TrialTimeline()
+    timeline.mark('choice_scene_start')
+    frame_probe.arm(timeline, 'choice_first_frame', 'touch_registered')
+    pygame.display.flip()
+    first_frame = timeline.stamps['choice_first_frame']
+    pygame.display.flip()
+    assert timeline.stamps['choice_first_frame'] == first_frame
+    pygame.event.get()
+    assert 'touch_registered' not in timeline.stamps
+    press()
+    pygame.event.get()
+    first_touch = timeline.stamps['touch_registered']
+    press()
+    pygame.event.get()
+    assert timeline.stamps['touch_registered'] > first_touch
+    frame_probe.disarm()
+    timeline.mark('choice_scene_end')
+    assert list(timeline.offsets()) == ['choice_scene_start', 'choice_first_frame', 'touch_registered', 'choice_scene_end']
+
+
+def test_disarmed_probe_stamps_nothing(display):
+    timeline = TrialTimeline()
+    frame_probe.arm(timeline, 'reward_start')
+    frame_probe.disarm()
+    press()
+    pygame.event.get()
+    pygame.display.update()
+    assert timeline.stamps == {}
+
+
+def test_summary_counts_intervals_into_bins():
+    latency = StageLatency(window=10)
+    timeline = TrialTimeline()
+    for offset, stage in enumerate(STAGES):
+        timeline.mark_at(stage, offset * 2_000_000)
+    latency.add(timeline)
+    summary = latency.summary()
+    assert list(summary) == list(STAGES[1:])
+    record = summary['record_complete']
+    assert record['n'] == 1
+    assert record['p50_us'] == 2_000.0
+    assert sum(record['counts']) == 1
+    assert record['counts'][4] == 1
+
+
+def test_feed_serves_latency_summary(db_path):
+    append_rows(db_path, [trial_row(0)])
+    with socket.socket() as sock:
+        sock.bind(('', 0))
+        port = sock.getsockname()[1]
+    feed = BehaviourFeed()
+    feed.configure(enabled=True, port=port, path=db_path)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/latency_summary", timeout=5) as response:
+            summary = json.load(response)
+    finally:
+        feed.stop()
+    assert summary == json.loads(json.dumps(stage_latency.summary()))
@@ -0,0 +1,25 @@
+import pytest
+
+pytest.importorskip('experiment')
+
+import bench.harness as harness
+
+
+@pytest.mark.parametrize('prestage', [False, True])
+def test_only_the_chosen_reward_reaches_the_pump(monkeypatch, prestage):
+    built = []
+    from_manager = harness.HeadlessRewardAdapter.from_manager.__func__
+
+    def counting(cls, manager, channels=None, **kwargs):
+        built.append(kwargs)
+        return from_manager(cls, manager, channels=channels, **kwargs)
+
+    monkeypatch.setattr(harness.HeadlessRewardAdapter, 'from_manager', classmethod(counting))
+    config = {**harness.load_config('configs/flea_distribution.py'), 'prestage_rewards': prestage}
+    records = []
+    report = harness.run_trials(config, 40, seed=3, on_record=records.append)
+    rewarded = [record for record in records if record['outcome'] != 'timeout']
+    # Staging builds both candidates every trial; the unchosen adapter never pumps.
+    assert len(built) == (2 * len(records) if prestage else len(rewarded))
+    assert report['pump_commands'] == len(rewarded)
+    assert report['latency']['reward_start']['n'] == len(rewarded)
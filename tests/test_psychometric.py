@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analyze.psychometric import count_grid, fit_counts, fit_psychometric, psychometric_curve
+
+LEVELS = np.arange(-4, 5, dtype=float)
+
+
+def simulate(rng, slope, bias, lapse, n_per_level, **keys):
+    x = np.repeat(LEVELS, n_per_level)
+    p = lapse + (1.0 - 2.0 * lapse) / (1.0 + np.exp(-(slope * x + bias)))
+    return pd.DataFrame(dict(keys, value_left_minus_right=x, chose_left=(rng.random(len(x)) < p).astype(int)))
+
+
+def test_fit_recovers_known_parameters():
+    rng = np.random.default_rng(0)
+    data = simulate(rng, slope=1.2, bias=-0.5, lapse=0.05, n_per_level=4000)
+    fit = fit_psychometric(data, by=())
+    row = fit.iloc[0]
+    assert row["converged"]
+    assert row["n_trials"] == len(data)
+    assert row["slope"] == pytest.approx(1.2, abs=0.1)
+    assert row["bias"] == pytest.approx(-0.5, abs=0.1)
+    assert row["lapse"] == pytest.approx(0.05, abs=0.02)
+    for column in ("slope_se", "bias_se", "lapse_se"):
+        assert 0.0 < row[column] < 0.1
+
+
+def test_stacked_cells_match_separate_fits():
+    rng = np.random.default_rng(1)
+    data = pd.concat([
+        simulate(rng, slope=0.8, bias=0.3, lapse=0.02, n_per_level=300, locs="loc1v2"),
+        simulate(rng, slope=2.0, bias=-0.2, lapse=0.10, n_per_level=300, locs="loc2v1"),
+    ], ignore_index=True)
+    stacked = fit_psychometric(data, by=["locs"])
+    assert stacked["locs"].tolist() == ["loc1v2", "loc2v1"]
+    for _, row in stacked.iterrows():
+        alone = fit_psychometric(data[data["locs"] == row["locs"]], by=()).iloc[0]
+        for column in ("slope", "bias", "lapse", "slope_se"):
+            assert row[column] == pytest.approx(alone[column], rel=1e-4, abs=1e-6)
+
+
+def test_count_grid_tallies_each_cell():
+    data = pd.DataFrame({
+        "locs": ["a", "a", "a", "b"],
+        "value_left_minus_right": [-1, -1, 1, 1],
+        "chose_left": [0, 1, 1, 0],
+    })
+    keys, levels, k, n = count_grid(data, ["locs"])
+    assert list(keys) == ["a", "b"]
+    assert levels.tolist() == [-1, 1]
+    assert n.tolist() == [[2, 1], [0, 1]]
+    assert k.tolist() == [[1, 1], [0, 0]]
+
+
+def test_separated_cell_stays_finite():
+    # Every trial goes to the larger side: without the priors the slope diverges.
+    k = np.array([[0, 0, 10, 10]])
+    n = np.full((1, 4), 10)
+    theta, covariance, _, _ = fit_counts([-2, -1, 1, 2], k, n)
+    assert np.isfinite(theta).all()
+    assert np.isfinite(covariance).all()
+    assert theta[0, 0] > 0
+
+
+def test_curve_evaluates_fitted_row():
+    row = {"slope": 1.0, "bias": 0.0, "lapse": 0.1}
+    assert psychometric_curve(row, [0.0]).tolist() == pytest.approx([0.5])
+    assert psychometric_curve(row, [50.0])[0] == pytest.approx(0.9)
@@ -0,0 +1,131 @@
+import json
+import sqlite3
+
+import pytest
+
+from trials.recorder import RecordWriteError, WriteBehindRecorder
+from trials.trial_table import TABLE_NAME, TrialTable
+
+
+class Manager:
+    def __init__(self):
+        self.records = []
+
+    def record(self, **fields):
+        self.records.append(fields)
+
+
+class FailingTable(TrialTable):
+    """Fails the first `failures` writes, as a locked or unwritable database would."""
+
+    def __init__(self, path, failures):
+        super().__init__(path)
+        self.failures = failures
+
+    def write(self, records):
+        records = list(records)
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError('database is locked')
+        super().write(records)
+
+
+def journal_lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def typed_outcomes(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return [row[0] for row in conn.execute(f"SELECT outcome FROM {TABLE_NAME} ORDER BY id")]
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / 'record_journal.jsonl'), str(tmp_path / 'data.db')
+
+
+def test_records_on_trial_thread_and_writes_typed_rows_in_batches(paths):
+    journal_path, db_path = paths
+    recorder = WriteBehindRecorder(journal_path, batch_size=2, flush_interval=60, table=TrialTable(db_path))
+    mgr = Manager()
+    for outcome in ('correct', 'incorrect', 'timeout'):
+        recorder.record(mgr, outcome=outcome)
+    # mgr.record ran synchronously, stamped on the trial thread.
+    assert [fields['outcome'] for fields in mgr.records] == ['correct', 'incorrect', 'timeout']
+    assert all('recorded_at' in fields for fields in mgr.records)
+    recorder.flush()
+    assert typed_outcomes(db_path) == ['correct', 'incorrect', 'timeout']
+    assert recorder.pending == 0
+    recorder.close()
+
+    lines = journal_lines(journal_path)
+    assert [line['seq'] for line in lines if 'seq' in line] == [1, 2, 3]
+    assert sorted(seq for line in lines if 'done' in line for seq in line['done']) == [1, 2, 3]
+
+
+def test_journal_compaction_replays_unfinished_entries(paths):
+    journal_path, db_path = paths
+    with open(journal_path, 'w') as f:
+        f.write(json.dumps({'seq': 1, 'fields': {'outcome': 'correct'}}) + '\n')
+        f.write(json.dumps({'seq': 2, 'fields': {'outcome': 'incorrect'}}) + '\n')
+        f.write(json.dumps({'done': [1]}) + '\n')
+        # A line cut short by a crash.
+        f.write('{"seq": 3, "fie')
+    recorder = WriteBehindRecorder(journal_path, table=TrialTable(db_path))
+    recorder.start()
+    assert journal_lines(journal_path)[0] == {'seq': 2, 'fields': {'outcome': 'incorrect'}}
+    recorder.flush()
+    assert typed_outcomes(db_path) == ['incorrect']
+
+    # New entries continue after the replayed sequence numbers.
+    recorder.record(Manager(), outcome='timeout')
+    recorder.flush()
+    recorder.close()
+    assert typed_outcomes(db_path) == ['incorrect', 'timeout']
+    assert max(line['seq'] for line in journal_lines(journal_path) if 'seq' in line) == 3
+
+    # Everything was marked done, so the next session replays nothing.
+    again = WriteBehindRecorder(journal_path, table=TrialTable(db_path))
+    again.start()
+    again.flush()
+    again.close()
+    assert journal_lines(journal_path) == []
+    assert typed_outcomes(db_path) == ['incorrect', 'timeout']
+
+
+def test_failed_batch_is_kept_and_retried(paths, capsys):
+    journal_path, db_path = paths
+    # Fails the batch write and the retry made by flush().
+    table = FailingTable(db_path, failures=2)
+    recorder = WriteBehindRecorder(journal_path, batch_size=1, flush_interval=60, table=table)
+    recorder.record(Manager(), outcome='correct')
+    with pytest.raises(RecordWriteError):
+        recorder.flush()
+    assert recorder.pending == 1
+    assert 'remain in' in capsys.readouterr().out
+
+    recorder.record(Manager(), outcome='incorrect')
+    recorder.flush()
+    recorder.close()
+    assert recorder.pending == 0
+    assert recorder.error is None
+    assert typed_outcomes(db_path) == ['correct', 'incorrect']
+
+
+def test_unwritten_rows_survive_a_restart(paths):
+    journal_path, db_path = paths
+    recorder = WriteBehindRecorder(journal_path, batch_size=1, table=FailingTable(db_path, failures=10))
+    recorder.record(Manager(), outcome='correct')
+    with pytest.raises(RecordWriteError):
+        recorder.flush()
+    recorder.close()
+
+    replay = WriteBehindRecorder(journal_path, table=TrialTable(db_path))
+    replay.start()
+    replay.flush()
+    replay.close()
+    assert typed_outcomes(db_path) == ['correct']
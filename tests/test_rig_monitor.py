@@ -0,0 +1,144 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+
+import pytest
+
+from analyze.rig_monitor import PAGE_PATH, RigMonitor, RigTail, load_render, load_style, load_worker, parse_rig, rig_name
+from trials.aggregates import merge_counts, total_stats
+from conftest import append_rows, trial_row
+
+
+def rig_paths(tmp_path, *names):
+    paths = []
+    for name in names:
+        os.makedirs(tmp_path / name / 'data')
+        paths.append((name, str(tmp_path / name / 'data' / 'data.db')))
+    return paths
+
+
+def test_rig_names_come_from_paths():
+    assert rig_name('/rigs/rig1/data/data.db') == 'rig1'
+    assert rig_name('/rigs/left.db') == 'left'
+    assert parse_rig('right=/mnt/right/data/data.db') == ('right', '/mnt/right/data/data.db')
+
+
+def test_tail_poll_reads_increments_and_tags_rig(db_path):
+    tail = RigTail('rig1', db_path)
+    append_rows(db_path, [trial_row(i) for i in range(3)])
+    reset, added = tail.poll()
+    assert not reset
+    assert [record['rig'] for _, record in added] == ['rig1'] * 3
+    append_rows(db_path, [trial_row(3), trial_row(4)])
+    reset, added = tail.poll()
+    assert [record['trialid'] for _, record in added] == [3, 4]
+    assert tail.summary()['records'] == 5
+    assert tail.summary()['last']['trialid'] == 4
+
+
+def test_tail_poll_resets_on_replaced_database(db_path):
+    tail = RigTail('rig1', db_path)
+    append_rows(db_path, [trial_row(i) for i in range(4)])
+    tail.poll()
+    os.remove(db_path)
+    append_rows(db_path, [trial_row(50 + i, date='2026-01-05') for i in range(4)])
+    reset, added = tail.poll()
+    assert reset
+    assert [record['trialid'] for _, record in tail.records] == [50, 51, 52, 53]
+    assert tail.summary()['stats']['records'] == 4
+
+
+def test_behaviour_follows_cursor_and_drops_stale_versions(tmp_path):
+    (_, first), (_, second) = paths = rig_paths(tmp_path, 'rig1', 'rig2')
+    monitor = RigMonitor(paths, interval=0)
+    append_rows(first, [trial_row(i) for i in range(2)])
+    monitor.refresh(force=True)
+    full = monitor.behaviour()
+    assert full['cursor'] == 2
+
+    append_rows(second, [trial_row(0)])
+    monitor.refresh(force=True)
+    delta = monitor.behaviour(since=full['cursor'], version=full['version'])
+    assert list(delta['trials']) == ['rig2:1']
+    assert len(monitor.behaviour(since=full['cursor'], version='stale')['trials']) == 3
+
+    # Replacing one rig's database changes the combined version.
+    os.remove(first)
+    append_rows(first, [trial_row(7, date='2026-02-01')])
+    monitor.refresh(force=True)
+    after = monitor.behaviour(since=delta['cursor'], version=delta['version'])
+    assert after['version'] != delta['version']
+    assert list(after['trials']) == ['rig2:1', 'rig1:1']
+    single = monitor.behaviour(rig='rig2')
+    assert list(single['trials']) == ['1']
+
+
+def test_combined_feed_namespaces_trials_and_blocks(tmp_path):
+    (_, first), (_, second) = paths = rig_paths(tmp_path, 'rig1', 'rig2')
+    append_rows(first, [trial_row(i) for i in range(2)])
+    append_rows(second, [trial_row(i) for i in range(2)])
+    monitor = RigMonitor(paths, interval=0)
+    monitor.refresh(force=True)
+    records = list(monitor.behaviour()['trials'].values())
+    assert [record['trialid'] for record in records] == [0, 1, 2, 3]
+    assert [record['rig_trialid'] for record in records] == [0, 1, 0, 1]
+    assert [record['block_number'] for record in records] == ['rig1:0', 'rig1:0', 'rig2:0', 'rig2:0']
+    # Each rig's own feed keeps its numbering.
+    assert [record['trialid'] for record in monitor.behaviour(rig='rig2')['trials'].values()] == [0, 1]
+    overview = monitor.overview()
+    assert overview['combined'] == {'records': 4, 'stats': {'records': 4}}
+
+
+def test_merge_counts_and_total_stats():
+    combined = {}
+    merge_counts(combined, {'1': {'stats': {'records': 2, 'correct': 1}, 'value_pairs': {'k': {2: {'total': 2}}}}})
+    merge_counts(combined, {'1': {'stats': {'records': 1}}, '2': {'stats': {'records': 3, 'correct': 3}}})
+    assert combined['1'] == {'stats': {'records': 3, 'correct': 1}, 'value_pairs': {'k': {2: {'total': 2}}}}
+    assert total_stats(combined) == {'records': 6, 'correct': 4}
+    assert total_stats({}) == {}
+
+
+def test_worker_and_overview_count_outcomes_alike(tmp_path):
+    node = shutil.which('node')
+    if node is None:
+        pytest.skip('node is not installed')
+    rows = [
+        trial_row(0, magnitudes=[1, 3], locations=[[0, 1], [1, 0]]),
+        trial_row(1, outcome='incorrect', magnitudes=[3, 1], locations=[[0, 1], [1, 0]]),
+        trial_row(2, outcome='timeout', magnitudes=[2, 2], locations=[[0, 1], [1, 0]]),
+        trial_row(3, outcome='choice', stimulus_set=2, distribution_options=['a', 'b'],
+                  chosen_distribution='a', locations=[[0, 1], [1, 0]]),
+        trial_row(4, outcome='correct', stimulus_set=2),
+    ]
+    db_path = str(tmp_path / 'data.db')
+    append_rows(db_path, rows)
+    tail = RigTail('rig', db_path)
+    _, added = tail.poll()
+    script = tmp_path / 'count.js'
+    script.write_text(
+        "const self = { postMessage() {} };\n"
+        f"{load_worker()}\n"
+        "applyBehaviour(JSON.parse(require('fs').readFileSync(0, 'utf8')));\n"
+        "const view = buildView({ mode: 'all', stimulusSets: [1, 2], distributionPair: 'all' });\n"
+        "process.stdout.write(JSON.stringify(view.stats));\n"
+    )
+    result = subprocess.run(
+        [node, str(script)], input=json.dumps(dict(added)), capture_output=True, text=True, check=True,
+    )
+    worker = json.loads(result.stdout)
+    stats = total_stats(tail.aggregates.counts)
+    assert worker['records'] == 5
+    assert worker == {name: stats.get(name, 0) for name in worker}
+
+
+def test_rig_page_takes_render_code_and_style_from_the_dashboard():
+    with open(PAGE_PATH, encoding='utf-8') as f:
+        page = f.read()
+    shared = set(re.findall(r'function (\w+)\(', load_render()))
+    assert {'currentFilters', 'updatePlot', 'updateDistributionHeatmap', 'resetFilters'} <= shared
+    assert '<script src="/behaviour-render.js">' in page
+    assert '<link rel="stylesheet" href="/behaviour.css">' in page
+    assert shared.isdisjoint(re.findall(r'function (\w+)\(', page))
+    assert '.plot-layout' in load_style()
@@ -0,0 +1,84 @@
+import random
+from collections import Counter
+
+import pytest
+
+from trials.sampling import AliasTable, DistributionSampler, SampleStream, replay_draws
+
+CUES = {
+    'A': {'magnitude_values': [1, 2, 3, 4, 5], 'probabilities': [0.1, 0.2, 0.4, 0.2, 0.1]},
+    'B': {'magnitude_values': [1, 5], 'probabilities': [0.5, 0.5]},
+    'C': {'magnitude_values': [2, 3, 4], 'probabilities': [0.7, 0.0, 0.3]},
+}
+
+
+def implied_probabilities(table: AliasTable) -> dict:
+    n = len(table.values)
+    mass = Counter()
+    for i, value in enumerate(table.values):
+        mass[value] += table.prob[i] / n
+        mass[table.values[table.alias[i]]] += (1.0 - table.prob[i]) / n
+    return mass
+
+
+@pytest.mark.parametrize('cue', CUES.values())
+def test_alias_table_reproduces_weights(cue):
+    table = AliasTable.from_cue(cue)
+    mass = implied_probabilities(table)
+    for value, probability in zip(cue['magnitude_values'], cue['probabilities']):
+        assert mass[value] == pytest.approx(probability, abs=1e-12)
+
+
+def test_alias_table_normalizes_weights():
+    table = AliasTable(['x', 'y'], [3, 1])
+    assert implied_probabilities(table) == pytest.approx({'x': 0.75, 'y': 0.25})
+
+
+def test_alias_table_never_draws_zero_weight_values():
+    table = AliasTable.from_cue(CUES['C'])
+    rng = random.Random(0)
+    assert 3 not in {table.value_for(rng.random()) for _ in range(10_000)}
+
+
+@pytest.mark.parametrize('values, weights', [
+    ([], []),
+    ([1, 2], [1.0]),
+    ([1, 2], [1.0, -0.5]),
+    ([1, 2], [0.0, 0.0]),
+])
+def test_alias_table_rejects_bad_weights(values, weights):
+    with pytest.raises(ValueError):
+        AliasTable(values, weights)
+
+
+def test_stream_does_not_depend_on_batch_size():
+    small = SampleStream(seed=7, batch_size=3)
+    large = SampleStream(seed=7, batch_size=1000)
+    assert [small.next() for _ in range(20)] == [large.next() for _ in range(20)]
+    assert small.index == 20
+
+
+def test_replay_regenerates_interleaved_draws():
+    sampler = DistributionSampler()
+    sampler.configure(CUES, seed=1234, batch_size=16)
+    rng = random.Random(5)
+    recorded = []
+    for _ in range(200):
+        cue_id = rng.choice(sorted(CUES))
+        magnitude, index = sampler.draw(cue_id)
+        recorded.append((cue_id, magnitude, index))
+
+    # Replaying a subset out of order only needs the indices kept with it.
+    subset = recorded[::7][::-1]
+    replayed = replay_draws(sampler.seed, [(CUES[cue_id], index) for cue_id, _, index in subset])
+    assert replayed == [magnitude for _, magnitude, _ in subset]
+
+
+def test_sampler_builds_tables_for_unconfigured_cues():
+    sampler = DistributionSampler()
+    sampler.configure({}, seed=3)
+    with pytest.raises(KeyError):
+        sampler.draw('A')
+    magnitude, index = sampler.draw('A', CUES['A'])
+    assert magnitude in CUES['A']['magnitude_values']
+    assert index == 0
@@ -0,0 +1,53 @@
+import os
+import socket
+import time
+
+import pygame
+import pytest
+
+from trials.screen_mirror import ScreenMirror
+
+
+@pytest.fixture
+def display():
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.display.init()
+    surface = pygame.display.set_mode((64, 48))
+    yield surface
+    pygame.display.quit()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('', 0))
+        return sock.getsockname()[1]
+
+
+def test_busy_port_leaves_mirror_disabled():
+    with socket.socket() as sock:
+        sock.bind(('', 0))
+        sock.listen()
+        mirror = ScreenMirror()
+        mirror.configure(enabled=True, port=sock.getsockname()[1])
+    assert not mirror.running
+    assert not mirror.enabled
+    assert pygame.display.flip.__name__ == 'flip'
+
+
+def test_flips_are_sampled_and_only_changes_published(display):
+    mirror = ScreenMirror()
+    mirror.configure(enabled=True, port=free_port(), fps=1000, width=32)
+    try:
+        for n, color in enumerate(('red', 'red', 'red', 'blue'), start=1):
+            display.fill(color)
+            time.sleep(0.002)
+            pygame.display.flip()
+            deadline = time.monotonic() + 2.0
+            while mirror.samples < n and time.monotonic() < deadline:
+                time.sleep(0.001)
+    finally:
+        mirror.stop()
+    assert pygame.display.flip.__name__ == 'flip'
+    assert mirror.samples == 4
+    assert mirror.frame_id == 2
+    assert mirror.frame is not None
@@ -0,0 +1,121 @@
+import json
+import sqlite3
+
+import pandas as pd
+
+from analyze.read_data import load_distribution_choices
+from read_behaviour import get_data
+from trials.trial_table import COLUMN_NAMES, TABLE_NAME, TrialTable
+from conftest import append_rows, trial_row
+
+LOCATIONS = {1: (0.5, 0.0), 2: (-0.5, 0.0), 'center': (0.0, 0.0)}
+
+
+def typed_rows(path):
+    conn = sqlite3.connect(path)
+    try:
+        conn.row_factory = sqlite3.Row
+        return [dict(row) for row in conn.execute(f"SELECT * FROM {TABLE_NAME} ORDER BY id")]
+    finally:
+        conn.close()
+
+
+def test_row_for_maps_choice_and_forced_fields():
+    table = TrialTable(locations=LOCATIONS)
+    row = dict(zip(COLUMN_NAMES, table.row_for({
+        'recorded_at': 1_700_000_000.5, 'outcome': 'correct', 'trial_kind': 'twoafc', 'stimulus_set': 1,
+        'magnitudes': [1, 3], 'locations': [[0.5, 0.0], [-0.5, 0.0]], 'chosen': 'option2', 'RT': 0.4,
+    }, data_rowid=7)))
+    assert row['data_rowid'] == 7
+    assert (row['option1_magnitude'], row['option2_magnitude']) == (1, 3)
+    assert (row['option1_loc'], row['option2_loc']) == (1, 2)
+    assert (row['option1_x'], row['option1_y'], row['option2_x'], row['option2_y']) == (0.5, 0.0, -0.5, 0.0)
+    assert (row['chosen'], row['RT'], row['outcome']) == ('option2', 0.4, 'correct')
+
+    forced = dict(zip(COLUMN_NAMES, table.row_for({'recorded_at': 1.0, 'magnitude': 2, 'location': [-0.5, 0.0]})))
+    assert (forced['option1_magnitude'], forced['option2_magnitude']) == (2, None)
+    assert (forced['option1_loc'], forced['option2_loc']) == (2, None)
+    assert forced['option2_x'] is None
+    assert forced['data_rowid'] is None
+
+
+def test_write_matches_records_to_their_data_rows(db_path):
+    append_rows(db_path, [trial_row(i, recorded_at=100.0 + i) for i in range(3)])
+    table = TrialTable(db_path, locations=LOCATIONS)
+    table.write([
+        {'recorded_at': 101.0, 'outcome': 'correct'},
+        {'recorded_at': 102.0, 'outcome': 'incorrect'},
+        {'recorded_at': 999.0, 'outcome': 'timeout'},
+    ])
+    table.close()
+    assert [(row['recorded_at'], row['data_rowid']) for row in typed_rows(db_path)] == [
+        (101.0, 2), (102.0, 3), (999.0, None),
+    ]
+
+
+def choice_rows(n):
+    rows = []
+    for i in range(n):
+        magnitudes = [1 + i % 4, 4 - i % 3]
+        locations = [[0.5, 0.0], [-0.5, 0.0]] if i % 2 else [[-0.5, 0.0], [0.5, 0.0]]
+        row = trial_row(
+            i, outcome=('correct', 'incorrect')[i % 2 == 0 and i % 3 == 0], recorded_at=100.0 + i,
+            magnitudes=magnitudes, locations=locations, chosen=('option1', 'option2')[i % 2], RT=0.3 + i / 100,
+        )
+        row['condition'] = f"set1_choice_{magnitudes[0]}v{magnitudes[1]}_loc{1 + i % 2}v{2 - i % 2}"
+        rows.append(row)
+    return rows
+
+
+def distribution_rows(n):
+    rows = []
+    for i in range(n):
+        options = [('a', 'b'), ('b', 'c'), ('c', 'a')][i % 3]
+        rows.append(trial_row(
+            i, outcome='choice', block='b_distribution', recorded_at=200.0 + i,
+            distribution_options=list(options), chosen_distribution=options[i % 2], sampled_magnitude=1 + i % 4,
+        ))
+    return rows
+
+
+def write_typed(path, rows):
+    table = TrialTable(path, locations=LOCATIONS)
+    table.write([{**row['data'], 'outcome': row['outcome']} for row in rows])
+    table.close()
+
+
+def drop_typed(path):
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute(f"DROP TABLE {TABLE_NAME}")
+    conn.close()
+
+
+def test_get_data_reads_typed_columns_with_json_fallback(db_path):
+    rows = choice_rows(12)
+    append_rows(db_path, rows)
+    # Only the newer half has typed rows, as in a database that predates the table.
+    write_typed(db_path, rows[6:])
+    mixed = get_data(db_path, cache=False)
+    drop_typed(db_path)
+    from_json = get_data(db_path, cache=False)
+    assert len(mixed) == 12
+    pd.testing.assert_frame_equal(mixed, from_json)
+    assert '_rowid' not in mixed
+
+
+def test_distribution_choices_read_typed_columns_with_json_fallback(db_path):
+    rows = distribution_rows(9)
+    append_rows(db_path, rows)
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("CREATE TABLE sessions (config, created_at)")
+        conn.execute("INSERT INTO sessions VALUES (?, 1)", (json.dumps({'distribution_cues': {}}),))
+    conn.close()
+    write_typed(db_path, rows[4:])
+    _, mixed = load_distribution_choices(db_path)
+    drop_typed(db_path)
+    _, from_json = load_distribution_choices(db_path)
+    assert len(mixed) == 9
+    columns = ['distribution_options', 'chosen_distribution', 'sampled_magnitude', 'sorted_first_chosen']
+    pd.testing.assert_frame_equal(mixed[columns], from_json[columns], check_dtype=False)
@@ -0,0 +1,84 @@
+import threading
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+NO_STIMULUS_SET = 'none'
+
+Path = Tuple[Any, ...]
+
+
+def _pair(values) -> Optional[List[Any]]:
+    values = list(values or ())
+    return values if len(values) == 2 else None
+
+
+def trial_increments(fields: Mapping[str, Any]) -> List[Path]:
+    """Outcome counters one recorded trial adds to, each by one, for the rig overview.
+
+    stats/...   records, choice, completed, timeouts, scored, correct
+
+    The dashboard's own counters (value pairs, distribution preferences,
+    blocks) are counted by the behaviour worker in server/index.html from
+    the trials themselves.
+    """
+    outcome = str(fields.get('outcome') or '').lower()
+    magnitudes = _pair(fields.get('magnitudes'))
+    locations = _pair(fields.get('locations'))
+    options = _pair(fields.get('distribution_options'))
+
+    paths: List[Path] = [('stats', 'records')]
+    if magnitudes is None and options is None:
+        return paths
+    paths.append(('stats', 'choice'))
+    paths.append(('stats', 'timeouts') if outcome == 'timeout' else ('stats', 'completed'))
+    if magnitudes is not None and locations is not None and outcome in ('correct', 'incorrect'):
+        paths.append(('stats', 'scored'))
+        if outcome == 'correct':
+            paths.append(('stats', 'correct'))
+    return paths
+
+
+def _stimulus_set_key(fields: Mapping[str, Any]) -> str:
+    stimulus_set = fields.get('stimulus_set')
+    return NO_STIMULUS_SET if stimulus_set is None else str(stimulus_set)
+
+
+class BehaviourAggregates:
+    """Running outcome counts per stimulus set, updated once per trial read."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Dict[str, Dict[str, Any]] = {}
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counts = {}
+
+    def add(self, fields: Mapping[str, Any]) -> None:
+        stimulus_set = _stimulus_set_key(fields)
+        paths = trial_increments(fields)
+        with self._lock:
+            node = self.counts.setdefault(stimulus_set, {})
+            for path in paths:
+                cell = node
+                for part in path[:-1]:
+                    cell = cell.setdefault(part, {})
+                cell[path[-1]] = cell.get(path[-1], 0) + 1
+
+
+def merge_counts(target: Dict[str, Any], counts: Mapping[str, Any]) -> Dict[str, Any]:
+    """Add one nested counts dict into another, e.g. to combine several rigs."""
+    for key, value in counts.items():
+        if isinstance(value, Mapping):
+            merge_counts(target.setdefault(key, {}), value)
+        else:
+            target[key] = target.get(key, 0) + value
+    return target
+
+
+def total_stats(counts: Mapping[str, Any]) -> Dict[str, int]:
+    """The stats/... counters summed over stimulus sets."""
+    totals: Dict[str, int] = {}
+    for set_counts in counts.values():
+        for name, value in set_counts.get('stats', {}).items():
+            totals[name] = totals.get(name, 0) + value
+    return totals
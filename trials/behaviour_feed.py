@@ -0,0 +1,230 @@
+"""Cursor-based behaviour deltas for the remote dashboard, served by the rig.
+
+The experiment server's /behaviour_summary returns the whole session history
+on every poll. This feed tails the session database's `data` table over a
+read-only connection instead, by rowid, and answers
+
+    http://<rig>:<port>/behaviour_summary?since=<cursor>&version=<version>
+    http://<rig>:<port>/latency_summary
+
+The first returns {version, cursor, trials: {key: record}}: only the trials
+after `since`, or all of them when `version` no longer matches (the feed
+restarted or the database was replaced). The second is this process's
+per-stage touch-to-reward histograms (trials/latency.py). The dashboard connects to DEFAULT_PORT (or the
+template's behaviour_feed_port) and falls back to the experiment server's
+full-history endpoint when the feed is not running.
+
+Config (optional; the feed is off unless enabled, and needs sqlite storage):
+
+    config['behaviour_feed'] = {'enabled': True, 'port': 8766, 'host': '0.0.0.0'}
+
+The feed listens on `host`, else on config['remote_server']['host'], else on
+DEFAULT_HOST (this machine only).
+"""
+import json
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+import traceback
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from trials.aggregates import BehaviourAggregates
+from trials.latency import latency_summary
+
+DEFAULT_PORT = 8766
+DEFAULT_HOST = '127.0.0.1'
+
+
+def _payload(value: Any) -> Dict[str, Any]:
+    if isinstance(value, dict):
+        return value
+    try:
+        payload = json.loads(value)
+    except (TypeError, ValueError):
+        return {}
+    return payload if isinstance(payload, dict) else {}
+
+
+def behaviour_delta(entries: List[Tuple[str, dict]], current: str, since=None, version=None) -> Dict[str, Any]:
+    """Entries after cursor `since`, or all of them when `version` is stale."""
+    start = since if version == current and since is not None and 0 <= since <= len(entries) else 0
+    return {'version': current, 'cursor': len(entries), 'trials': dict(entries[start:])}
+
+
+class SessionTail:
+    """Rows of one session database's `data` table, read by rowid, with their running outcome counts."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.generation = 0
+        self.error: Optional[str] = None
+        self.clear()
+
+    def clear(self) -> None:
+        self.rowid = 0
+        self.last_row = None
+        self.records: List[Tuple[str, dict]] = []
+        self.aggregates = BehaviourAggregates()
+
+    def _connect(self) -> sqlite3.Connection:
+        uri = f"{pathlib.Path(os.path.abspath(self.path)).as_uri()}?mode=ro"
+        return sqlite3.connect(uri, uri=True, timeout=1.0)
+
+    def poll(self) -> Tuple[bool, List[Tuple[str, dict]]]:
+        """Read the rows added since the last poll; returns (reset, [(key, record), ...])."""
+        if not os.path.exists(self.path):
+            self.error = 'database not found'
+            return False, []
+        try:
+            conn = self._connect()
+            try:
+                # A changed last-read row means the database was replaced or truncated.
+                last_row = conn.execute('SELECT * FROM data WHERE rowid = ?', (self.rowid,)).fetchone()
+                reset = self.rowid > 0 and last_row != self.last_row
+                cursor = conn.execute(
+                    'SELECT rowid AS _rowid, * FROM data WHERE rowid > ? ORDER BY rowid',
+                    (0 if reset else self.rowid,),
+                )
+                names = [column[0] for column in cursor.description]
+                rows = cursor.fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error as error:
+            # No data table until the first trial is recorded.
+            self.error = str(error)
+            return False, []
+        self.error = None
+        if reset:
+            self.clear()
+            self.generation += 1
+        if rows:
+            self.last_row = rows[-1][1:]
+        return reset, [self._add(dict(zip(names, row))) for row in rows]
+
+    def _record(self, rowid: int, row: Dict[str, Any], payload: Dict[str, Any]) -> Dict[str, Any]:
+        record = {**row, 'data': payload}
+        if record.get('trialid') is None:
+            record['trialid'] = payload.get('trialid', rowid)
+        return record
+
+    def _add(self, row: Dict[str, Any]) -> Tuple[str, dict]:
+        rowid = row.pop('_rowid')
+        payload = _payload(row.get('data'))
+        record = self._record(rowid, row, payload)
+        self.aggregates.add({**payload, **{key: value for key, value in row.items() if key != 'data'}})
+        key = str(rowid)
+        self.records.append((key, record))
+        self.rowid = rowid
+        return key, record
+
+
+class BehaviourFeed:
+    def __init__(self):
+        self.enabled = False
+        self.port = DEFAULT_PORT
+        self.host = DEFAULT_HOST
+        self.path: Optional[str] = None
+        self.tail: Optional[SessionTail] = None
+        self.boot = ''
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def configure(self, enabled=False, port=None, path=None, host=None) -> None:
+        host = DEFAULT_HOST if host is None else host
+        settings = (bool(enabled and path), int(port or DEFAULT_PORT), path, host)
+        if self.running and settings == self.settings:
+            return
+        self.stop()
+        self.enabled, self.port, self.path, self.host = settings
+        if self.enabled:
+            self.start()
+
+    @property
+    def settings(self) -> tuple:
+        return (self.enabled, self.port, self.path, self.host)
+
+    @property
+    def running(self) -> bool:
+        return self._server is not None
+
+    def start(self) -> None:
+        if self._server is not None:
+            return
+        try:
+            server = ThreadingHTTPServer((self.host, self.port), _FeedHandler)
+        except OSError:
+            # A busy port only costs the dashboard its cursor; it falls back to full polls.
+            traceback.print_exc()
+            print(f"Behaviour feed disabled: could not listen on {self.host or '*'}:{self.port}.")
+            self.enabled = False
+            return
+        server.daemon_threads = True
+        server.feed = self
+        self.tail = SessionTail(self.path)
+        # The version changes whenever the feed restarts, so dashboards drop what they hold.
+        self.boot = format(time.time_ns(), 'x')
+        self._server = server
+        threading.Thread(target=server.serve_forever, name='behaviour-feed-http', daemon=True).start()
+
+    def stop(self) -> None:
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        self.tail = None
+
+    def behaviour(self, since=None, version=None) -> Dict[str, Any]:
+        with self._lock:
+            self.tail.poll()
+            current = f"{self.boot}.{self.tail.generation}"
+            return behaviour_delta(self.tail.records, current, since, version)
+
+
+class _FeedHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        feed: BehaviourFeed = self.server.feed
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        if url.path == '/behaviour_summary':
+            since = query.get('since', [None])[0]
+            data = feed.behaviour(
+                since=int(since) if since is not None and since.isdigit() else None,
+                version=query.get('version', [None])[0],
+            )
+        elif url.path == '/latency_summary':
+            data = latency_summary()
+        else:
+            self.send_error(404)
+            return
+        body = json.dumps(data, default=str).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        # The dashboard page is served by the experiment server on another port.
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+behaviour_feed = BehaviourFeed()
+
+
+def configure_behaviour_feed(config: dict) -> None:
+    settings = config.get('behaviour_feed') or {}
+    storage = config.get('storage') or {}
+    path = storage.get('path') if storage.get('type') == 'sqlite' else None
+    behaviour_feed.configure(
+        enabled=settings.get('enabled', False),
+        port=settings.get('port'),
+        path=path,
+        host=settings.get('host', (config.get('remote_server') or {}).get('host')),
+    )
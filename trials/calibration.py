@@ -1,8 +1,13 @@
 from experiment.trial import Trial, TrialResult
-from experiment.experiments.adapters import ImageAdapter, TouchAdapter, RewardAdapter, TimeCounter, RectAdapter
+from experiment.experiments.adapters import TouchAdapter, RewardAdapter, RectAdapter
 from experiment.experiments.scene import Scene
 from experiment.util.bbox import T_BBOX_SPEC
-from typing import Optional, Tuple, List
+from typing import Any, Optional, Tuple, List
+
+from trials.scenes import session_scenes
+from trials.recorder import trial_recorder
+from trials.factory import trial_factory
+from trials.stimulus_cache import image_adapter
 
 INTERPULSE_INTERVAL = 0.2
 class CalibrationTrial(Trial):
@@ -18,6 +23,8 @@ class CalibrationTrial(Trial):
         'timeout': (0, 0, 255),
     }
     CENTER = (640, 360)
+    CONDITION_FIELDS = ('magnitudes', 'locs')
+    CONFIG_FIELDS = ('items', 'locations', 'magnitude_mapping', 'duration', 'size', 'bbox', 'reward_channels')
     def __init__(self, 
         options: List[str],
         magnitudes: List[int],
@@ -47,6 +54,10 @@ class CalibrationTrial(Trial):
     
     @classmethod
     def from_config(cls, config: dict) -> 'CalibrationTrial':
+        return trial_factory.build(cls, config)
+
+    @classmethod
+    def trial_kwargs(cls, config: dict) -> dict[str, Any]:
         magnitudes = config['magnitudes']
         options = tuple( config['items'][ mag ] for mag in magnitudes )
         locs = tuple(config['locations'].get(loc, loc) for loc in config['locs'])
@@ -56,7 +67,7 @@ class CalibrationTrial(Trial):
         bbox = config.get('bbox', None)
         reward_channels = tuple(config.get('reward_channels', (1, 2)))
         center = tuple(config['locations'].get('center', cls.CENTER))
-        return cls(
+        return dict(
             options=options,
             magnitudes=magnitudes,
             locs=locs,
@@ -68,6 +79,9 @@ class CalibrationTrial(Trial):
             center=center,
         )
     
+    def stimulus_images(self) -> list[tuple]:
+        return [(image, self.size, None) for image in self.options]
+
     def get_reward_scene(self, mgr, reward_params, background):
         progress_params = dict(
             position=self.center,
@@ -82,7 +96,7 @@ class CalibrationTrial(Trial):
     def run(self, mgr) -> TrialResult:
         reward_params = [self.magnitude_mapping[mag] for mag in self.magnitudes]
         targets = {
-            i: ImageAdapter(
+            i: image_adapter(
                 image=image,
                 position=loc,
                 size=self.size,
@@ -100,6 +114,7 @@ class CalibrationTrial(Trial):
         data = {}
         scene.run()
         if scene.quit:
+            trial_recorder.flush()
             return TrialResult(
                 continue_session=False, 
                 outcome="quit",
@@ -127,13 +142,15 @@ class CalibrationTrial(Trial):
                 background=self.backgrounds['correct']
             )
         else:
-            outcome_scene = Scene(
+            outcome_scene = session_scenes.time_counter(
                 mgr, 
-                adapter=TimeCounter(self.timeout_duration), 
-                background=self.backgrounds['timeout']
+                self.timeout_duration, 
+                self.backgrounds['timeout']
             )
         outcome_scene.run()
         if outcome_scene.quit:
             res.continue_session = False
-        mgr.record(**data, outcome=res.outcome)
+        trial_recorder.record(mgr, **data, outcome=res.outcome)
+        if not res.continue_session:
+            trial_recorder.flush()
         return res
\ No newline at end of file
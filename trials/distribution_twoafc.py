@@ -1,15 +1,23 @@
-import random
 from typing import Any, Mapping, Optional, Tuple
 
-from experiment.experiments.adapters import ImageAdapter, RewardAdapter, TimeCounter
+from experiment.experiments.adapters import RewardAdapter
 from experiment.experiments.scene import Scene
 from experiment.trial import TrialResult
 from experiment.util.bbox import T_BBOX_SPEC
 
+from trials.divergence import divergence_tracker
+from trials.sampling import distribution_sampler
+from trials.stimulus_cache import image_adapter
 from trials.twoafc import HIDDEN_PROGRESS_SIZE, TwoAFCTrial
 
 
 class DistributionTwoAFCTrial(TwoAFCTrial):
+    CONDITION_FIELDS = ('stimulus_set', 'distribution_options', 'locs')
+    CONFIG_FIELDS = (
+        'distribution_cues', 'items', 'stimulus_sets', 'locations', 'magnitude_mapping', 'duration',
+        'size', 'bbox', 'reward_channels', 'coordinate_space', 'prestage_rewards',
+    )
+
     def __init__(
         self,
         distribution_options: Tuple[str, str],
@@ -24,6 +32,7 @@ class DistributionTwoAFCTrial(TwoAFCTrial):
         center=TwoAFCTrial.CENTER,
         coordinate_space: str = 'ndc',
         stimulus_set: int | None = None,
+        prestage_rewards: bool = False,
     ):
         self.distribution_options = tuple(distribution_options)
         self.distribution_cues = {
@@ -53,10 +62,12 @@ class DistributionTwoAFCTrial(TwoAFCTrial):
             reward_feedback_method='sampled_image',
             coordinate_space=coordinate_space,
             stimulus_set=stimulus_set,
+            prestage_rewards=prestage_rewards,
         )
+        self.samples: dict[str, Tuple[int, int]] = {}
 
     @classmethod
-    def from_config(cls, config: dict) -> 'DistributionTwoAFCTrial':
+    def trial_kwargs(cls, config: dict) -> dict[str, Any]:
         distribution_options = tuple(str(cue_id) for cue_id in config['distribution_options'])
         distribution_cues = config['distribution_cues']
         stimulus_set = config.get('stimulus_set')
@@ -71,7 +82,8 @@ class DistributionTwoAFCTrial(TwoAFCTrial):
         reward_channels = tuple(config.get('reward_channels', (1, 2)))
         center = tuple(config['locations'].get('center', cls.CENTER))
         coordinate_space = config.get('coordinate_space', 'ndc')
-        return cls(
+        prestage_rewards = config.get('prestage_rewards', False)
+        return dict(
             distribution_options=distribution_options,
             distribution_cues=distribution_cues,
             magnitude_items=magnitude_items,
@@ -84,8 +96,16 @@ class DistributionTwoAFCTrial(TwoAFCTrial):
             center=center,
             coordinate_space=coordinate_space,
             stimulus_set=stimulus_set,
+            prestage_rewards=prestage_rewards,
         )
 
+    def stimulus_images(self) -> list[tuple]:
+        # Sampled feedback shows a magnitude image in the centre at stimulus size.
+        return super().stimulus_images() + [
+            (image, self.size, self.coordinate_space)
+            for image in self.magnitude_items.values()
+        ]
+
     def _validate_distribution_options(self) -> None:
         for cue_id in self.distribution_options:
             if cue_id not in self.distribution_cues:
@@ -126,16 +146,30 @@ class DistributionTwoAFCTrial(TwoAFCTrial):
             "stimulus_set": self.stimulus_set,
         }
 
-    def sample_magnitude(self, cue_id: str) -> int:
-        cue = self.distribution_cues[cue_id]
-        magnitude_values = [int(value) for value in cue['magnitude_values']]
-        probabilities = [float(probability) for probability in cue['probabilities']]
-        return random.choices(magnitude_values, weights=probabilities, k=1)[0]
+    def sample_magnitude(self, cue_id: str) -> Tuple[int, int]:
+        return distribution_sampler.draw(cue_id, self.distribution_cues[cue_id])
+
+    def sample_for_choice(self, chosen: str) -> Tuple[int, int]:
+        sample = self.samples.get(chosen)
+        if sample is None:
+            cue_id = self.distribution_options[self.CHOICE_NAMES.index(chosen)]
+            sample = self.samples[chosen] = self.sample_magnitude(cue_id)
+        return sample
+
+    def outcome_for_choice(self, chosen: str) -> str:
+        return 'choice'
+
+    def stage_reward_scenes(self, mgr, reward_params) -> dict[str, Scene]:
+        # Draw each option's magnitude ahead so both reward scenes can be built;
+        # the unused draw keeps its place in the session stream.
+        for choice_name in self.CHOICE_NAMES:
+            self.sample_for_choice(choice_name)
+        return super().stage_reward_scenes(mgr, reward_params)
 
     def result_for_choice(self, chosen: str, data: dict[str, Any], reward_params) -> TrialResult:
         chosen_index = self.CHOICE_NAMES.index(chosen)
         chosen_distribution = self.distribution_options[chosen_index]
-        sampled_magnitude = self.sample_magnitude(chosen_distribution)
+        sampled_magnitude, draw_index = self.sample_for_choice(chosen)
         sampled_reward_params = self.magnitude_mapping[sampled_magnitude]
         sampled_image = self.magnitude_items[sampled_magnitude]
 
@@ -146,6 +180,13 @@ class DistributionTwoAFCTrial(TwoAFCTrial):
             "sampled_magnitude": sampled_magnitude,
             "sampled_magnitude_image": sampled_image,
             "sampled_reward_params": sampled_reward_params,
+            "sample_seed": distribution_sampler.seed,
+            "sample_draw_index": draw_index,
+            "experienced_divergence": divergence_tracker.add(
+                chosen_distribution,
+                sampled_magnitude,
+                self.distribution_cues[chosen_distribution],
+            ),
         })
         return TrialResult(
             continue_session=True,
@@ -160,7 +201,7 @@ class DistributionTwoAFCTrial(TwoAFCTrial):
             channels=self.reward_channels,
             **reward_params,
             children=[
-                ImageAdapter(
+                image_adapter(
                     image=sampled_image,
                     position=self.center,
                     size=self.size,
@@ -175,25 +216,13 @@ class DistributionTwoAFCTrial(TwoAFCTrial):
                 coordinate_space=self.coordinate_space,
             ),
         )
-        return Scene(mgr, rew, background=background)
+        return self.reward_scene(mgr, rew, background)
 
-    def outcome_scene_for_result(
-        self,
-        mgr,
-        result: TrialResult,
-        chosen: str | None,
-        data: dict[str, Any],
-        reward_params,
-    ) -> Scene:
-        if result.outcome == 'timeout':
-            return Scene(
-                mgr,
-                adapter=TimeCounter(self.timeout_duration),
-                background=self.backgrounds['timeout'],
-            )
+    def reward_scene_for_choice(self, mgr, chosen: str, outcome: str, reward_params) -> Scene:
+        sampled_magnitude, _ = self.sample_for_choice(chosen)
         return self.get_reward_scene(
             mgr,
-            data['sampled_reward_params'],
-            data['sampled_magnitude'],
+            self.magnitude_mapping[sampled_magnitude],
+            sampled_magnitude,
             background=self.backgrounds['correct'],
         )
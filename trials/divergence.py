@@ -0,0 +1,202 @@
+import math
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
+
+from trials.trial_table import TABLE_NAME
+
+# Continued-fraction / series cut-offs for the incomplete gamma function.
+_GAMMA_ITERATIONS = 200
+_GAMMA_EPS = 1e-14
+
+
+def _upper_gamma_regularized(a: float, x: float) -> float:
+    """Q(a, x) = Gamma(a, x) / Gamma(a), as in Numerical Recipes' gammq."""
+    if x <= 0:
+        return 1.0
+    log_prefix = -x + a * math.log(x) - math.lgamma(a)
+    if x < a + 1.0:
+        term = total = 1.0 / a
+        for n in range(1, _GAMMA_ITERATIONS):
+            term *= x / (a + n)
+            total += term
+            if abs(term) < abs(total) * _GAMMA_EPS:
+                break
+        return max(0.0, 1.0 - total * math.exp(log_prefix))
+    tiny = 1e-300
+    b = x + 1.0 - a
+    c = 1.0 / tiny
+    d = 1.0 / b
+    h = d
+    for n in range(1, _GAMMA_ITERATIONS):
+        an = -n * (n - a)
+        b += 2.0
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1.0 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1.0) < _GAMMA_EPS:
+            break
+    return math.exp(log_prefix) * h
+
+
+def chi2_sf(statistic: float, df: int) -> float:
+    if df <= 0:
+        return float('nan')
+    return _upper_gamma_regularized(df / 2.0, statistic / 2.0)
+
+
+def _xlogx(count: int) -> float:
+    return count * math.log(count) if count > 0 else 0.0
+
+
+class CueDivergence:
+    """Running experienced-vs-nominal statistics for one distribution cue.
+
+    With counts c_v over N draws and nominal probabilities p_v,
+        KL(experienced || nominal) = (sum c log c - sum c log p) / N - log N
+        chi-square                 = sum c^2 / p / N - N
+    so keeping the three sums makes each added draw O(1).
+    """
+
+    __slots__ = ('probabilities', 'counts', 'n', 'unexpected', '_c_log_c', '_c_log_p', '_c2_over_p')
+
+    def __init__(self, magnitude_values: Iterable[Any], probabilities: Iterable[float]):
+        weights: Dict[int, float] = {}
+        for value, probability in zip(magnitude_values, probabilities):
+            weights[int(value)] = weights.get(int(value), 0.0) + float(probability)
+        total = sum(weights.values())
+        self.probabilities = {
+            value: weight / total for value, weight in weights.items() if weight > 0
+        }
+        self.counts: Dict[int, int] = {value: 0 for value in self.probabilities}
+        self.n = 0
+        self.unexpected = 0
+        self._c_log_c = 0.0
+        self._c_log_p = 0.0
+        self._c2_over_p = 0.0
+
+    @classmethod
+    def from_cue(cls, cue: Mapping[str, Any]) -> 'CueDivergence':
+        return cls(cue['magnitude_values'], cue['probabilities'])
+
+    def add(self, magnitude: int, count: int = 1) -> None:
+        magnitude = int(magnitude)
+        p = self.probabilities.get(magnitude)
+        if p is None:
+            # Outside the nominal support; counted but kept out of the statistics.
+            self.unexpected += count
+            return
+        before = self.counts[magnitude]
+        after = before + count
+        self.counts[magnitude] = after
+        self.n += count
+        self._c_log_c += _xlogx(after) - _xlogx(before)
+        self._c_log_p += count * math.log(p)
+        self._c2_over_p += (after * after - before * before) / p
+
+    def summary(self) -> Dict[str, Any]:
+        n = self.n
+        df = len(self.probabilities) - 1
+        if n:
+            kl = max(0.0, (self._c_log_c - self._c_log_p) / n - math.log(n))
+            chi2 = max(0.0, self._c2_over_p / n - n)
+            p_value = chi2_sf(chi2, df)
+        else:
+            kl = chi2 = p_value = None
+        return {
+            'n': n,
+            'kl': kl,
+            'chi2': chi2,
+            'df': df,
+            'p_value': p_value,
+            'unexpected': self.unexpected,
+        }
+
+
+class DivergenceTracker:
+    """Per-cue counts of experienced magnitudes and their divergence from the nominal cue."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.cues: Dict[str, CueDivergence] = {}
+
+    def configure(self, distribution_cues: Mapping[str, Mapping[str, Any]]) -> None:
+        with self._lock:
+            self.cues = {
+                str(cue_id): CueDivergence.from_cue(cue)
+                for cue_id, cue in distribution_cues.items()
+            }
+
+    def _cue(self, cue_id: str, cue: Optional[Mapping[str, Any]]) -> CueDivergence:
+        tracked = self.cues.get(cue_id)
+        if tracked is None:
+            if cue is None:
+                raise KeyError(f"Unknown distribution cue: {cue_id}")
+            tracked = self.cues[cue_id] = CueDivergence.from_cue(cue)
+        return tracked
+
+    def add(self, cue_id: str, magnitude: int, cue: Optional[Mapping[str, Any]] = None, count: int = 1) -> Dict[str, Any]:
+        """Count one experienced draw and return the cue's updated summary."""
+        with self._lock:
+            tracked = self._cue(str(cue_id), cue)
+            tracked.add(magnitude, count)
+            return tracked.summary()
+
+    def add_many(self, draws: Iterable[Tuple[Any, Any]]) -> None:
+        """Count (cue_id, magnitude) pairs for cues already configured."""
+        with self._lock:
+            for cue_id, magnitude in draws:
+                tracked = self.cues.get(str(cue_id))
+                if tracked is not None:
+                    tracked.add(magnitude)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {cue_id: tracked.summary() for cue_id, tracked in self.cues.items()}
+
+    def seed_from_table(self, path: str) -> int:
+        """Start from the experienced draws already in a session database's typed table.
+
+        One grouped query at configure time; returns the number of draws counted.
+        """
+        if not os.path.exists(path):
+            return 0
+        conn = sqlite3.connect(path)
+        try:
+            rows = conn.execute(
+                f"SELECT chosen_distribution, sampled_magnitude, COUNT(*) FROM {TABLE_NAME} "
+                "WHERE trial_kind = 'distribution_choice' AND sampled_magnitude IS NOT NULL "
+                "GROUP BY chosen_distribution, sampled_magnitude"
+            ).fetchall()
+        except sqlite3.Error:
+            # No typed table yet.
+            return 0
+        finally:
+            conn.close()
+        total = 0
+        with self._lock:
+            for cue_id, magnitude, count in rows:
+                tracked = self.cues.get(str(cue_id))
+                if tracked is not None:
+                    tracked.add(magnitude, count)
+                    total += count
+        return total
+
+
+divergence_tracker = DivergenceTracker()
+
+
+def divergence_summary() -> Dict[str, Dict[str, Any]]:
+    return divergence_tracker.summary()
+
+
+def configure_divergence(config: dict) -> None:
+    divergence_tracker.configure(config.get('distribution_cues') or {})
+    storage = config.get('storage') or {}
+    if storage.get('type') == 'sqlite' and storage.get('path') and config.get('divergence_history', True):
+        divergence_tracker.seed_from_table(storage['path'])
@@ -0,0 +1,167 @@
+import importlib
+from types import MappingProxyType
+from typing import Any, Dict, Hashable, Mapping, Tuple
+
+from trials.session import configure_session
+from trials.stimulus_cache import CacheKey, preflight_stimuli, stimulus_cache
+
+SpecKey = Tuple[str, Hashable]
+_MISSING = object()
+
+
+def freeze(value: Any) -> Hashable:
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, range):
+        return tuple(value)
+    if isinstance(value, Mapping):
+        return tuple(sorted((key, freeze(item)) for key, item in value.items()))
+    return value
+
+
+class TrialSpec:
+    __slots__ = ('key', 'condition', 'kwargs', 'fields')
+
+    def __init__(self, key: SpecKey, condition: str | None, kwargs: Dict[str, Any], fields: Dict[str, Any]):
+        object.__setattr__(self, 'key', key)
+        object.__setattr__(self, 'condition', condition)
+        object.__setattr__(self, 'kwargs', MappingProxyType(dict(kwargs)))
+        # The CONFIG_FIELDS values the kwargs were resolved from.
+        object.__setattr__(self, 'fields', MappingProxyType(dict(fields)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __repr__(self) -> str:
+        return f"TrialSpec(key={self.key!r}, condition={self.condition!r})"
+
+
+def trial_class_for(config: dict, trial_type: str):
+    trial_type_config = config['trial_types'][trial_type]
+    module_name = trial_type_config['module'].removesuffix('.py').replace('/', '.')
+    module = importlib.import_module(module_name)
+    return getattr(module, trial_type_config['class'])
+
+
+class TrialFactory:
+    """Compiles every configured condition into a TrialSpec once per session.
+
+    Trial classes list the config fields that distinguish one of their
+    conditions from another in CONDITION_FIELDS, and every other field
+    trial_kwargs reads in CONFIG_FIELDS; from_config looks the spec up by
+    the condition fields and builds the trial from its resolved kwargs.
+    The config a trial is drawn with can still differ from the compiled one
+    (e.g. a block overriding `duration`), so each lookup compares the
+    CONFIG_FIELDS values (by identity first) and resolves a separate spec,
+    once, per set of overrides that actually differ.
+    """
+
+    def __init__(self):
+        self._specs: Dict[SpecKey, TrialSpec] = {}
+        self._variants: Dict[SpecKey, TrialSpec] = {}
+        self._conditions = None
+        self._compiled = False
+        self._session_configured = False
+
+    def spec_key(self, cls, config: dict) -> SpecKey:
+        return (cls.__name__, tuple(freeze(config.get(field)) for field in cls.CONDITION_FIELDS))
+
+    @staticmethod
+    def config_fields(cls, config: dict) -> Dict[str, Any]:
+        return {field: config.get(field, _MISSING) for field in cls.CONFIG_FIELDS}
+
+    def compile(self, config: dict) -> Dict[str, TrialSpec]:
+        # Only the first compile since clear() configures the session: a
+        # recompile for a changed condition set must not reseed the sampler,
+        # reset divergence or drop the stimulus cache mid-session.
+        if not self._session_configured:
+            configure_session(config)
+            self._session_configured = True
+        specs: Dict[SpecKey, TrialSpec] = {}
+        by_condition: Dict[str, TrialSpec] = {}
+        stimuli: Dict[CacheKey, None] = {}
+        for condition_name, condition in config.get('conditions', {}).items():
+            merged = {**config, **condition}
+            try:
+                cls = trial_class_for(config, condition['trial_type'])
+                key = self.spec_key(cls, merged)
+                kwargs = cls.trial_kwargs(merged)
+                # Build one trial so constructor validation runs before the session starts.
+                trial = cls(**kwargs)
+            except Exception as exc:
+                raise ValueError(f"Condition {condition_name!r} could not be compiled: {exc!r}") from exc
+            existing = specs.get(key)
+            if existing is not None and dict(existing.kwargs) != kwargs:
+                raise ValueError(
+                    f"Conditions {existing.condition!r} and {condition_name!r} share "
+                    f"{cls.__name__}.CONDITION_FIELDS but resolve to different trials."
+                )
+            spec = existing or TrialSpec(key, condition_name, kwargs, self.config_fields(cls, merged))
+            specs[key] = spec
+            by_condition[condition_name] = spec
+            if existing is None and hasattr(trial, 'stimulus_images'):
+                stimuli.update(
+                    (stimulus_cache.key(image, size, coordinate_space), None)
+                    for image, size, coordinate_space in trial.stimulus_images()
+                )
+        # Decode every image up front so a missing or corrupt file stops the
+        # session here rather than when its condition is first drawn.
+        preflight_stimuli(config, stimuli)
+        self._specs = specs
+        self._variants = {}
+        self._conditions = config.get('conditions')
+        self._compiled = True
+        return by_condition
+
+    def is_compiled_for(self, config: dict) -> bool:
+        conditions = config.get('conditions')
+        if not self._compiled:
+            return False
+        if conditions is self._conditions:
+            return True
+        # A copied config still matches; a different one needs compiling.
+        if conditions == self._conditions:
+            self._conditions = conditions
+            return True
+        return False
+
+    def spec_for(self, cls, config: dict) -> TrialSpec:
+        if not self.is_compiled_for(config):
+            self.compile(config)
+        key = self.spec_key(cls, config)
+        spec = self._specs.get(key)
+        if spec is None:
+            # Condition fields no compiled condition has: key on every field.
+            overrides = tuple(self.config_fields(cls, config).items())
+        else:
+            overrides = tuple(
+                (field, value)
+                for field, value in ((field, config.get(field, _MISSING)) for field in cls.CONFIG_FIELDS)
+                if value is not spec.fields[field] and value != spec.fields[field]
+            )
+            if not overrides:
+                return spec
+        variant_key = (key, freeze(overrides))
+        variant = self._variants.get(variant_key)
+        if variant is None:
+            variant = TrialSpec(
+                variant_key,
+                spec.condition if spec is not None else None,
+                cls.trial_kwargs(config),
+                self.config_fields(cls, config),
+            )
+            self._variants[variant_key] = variant
+        return variant
+
+    def build(self, cls, config: dict):
+        return cls(**self.spec_for(cls, config).kwargs)
+
+    def clear(self) -> None:
+        self._specs.clear()
+        self._variants.clear()
+        self._conditions = None
+        self._compiled = False
+        self._session_configured = False
+
+
+trial_factory = TrialFactory()
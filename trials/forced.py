@@ -1,9 +1,14 @@
 from experiment.trial import Trial, TrialResult
-from experiment.experiments.adapters import ImageAdapter, TouchAdapter, RewardAdapter, TimeCounter
+from experiment.experiments.adapters import TouchAdapter, RewardAdapter
 from experiment.experiments.scene import Scene
 from experiment.util.bbox import T_BBOX_SPEC
 from typing import Optional, Tuple, Dict, Any, Literal
 
+from trials.scenes import session_scenes
+from trials.recorder import trial_recorder
+from trials.factory import trial_factory
+from trials.stimulus_cache import image_adapter
+
 INTERPULSE_INTERVAL = 0.2
 REWARD_PROGRESS_SIZE = (0.4166666667, 0.0925925926)
 REWARD_PROGRESS_GAP = 0.0185185185
@@ -22,6 +27,11 @@ class ForcedChoiceTrial(Trial):
         'timeout': (0, 0, 255),
     }
     CENTER = (0.0, 0.0)
+    CONDITION_FIELDS = ('stimulus_set', 'magnitude', 'loc')
+    CONFIG_FIELDS = (
+        'items', 'locations', 'magnitude_mapping', 'duration', 'size', 'bbox', 'reward_channels',
+        'allow_outside_touch',
+    )
     def __init__(self, 
         stimulus: str, 
         magnitude: int, 
@@ -55,6 +65,10 @@ class ForcedChoiceTrial(Trial):
     
     @classmethod
     def from_config(cls, config: dict) -> 'ForcedChoiceTrial':
+        return trial_factory.build(cls, config)
+
+    @classmethod
+    def trial_kwargs(cls, config: dict) -> dict[str, Any]:
         magnitude = config['magnitude']
         stimulus = config['items'][ magnitude ]
         loc = tuple(config['locations'][config['loc']])
@@ -67,7 +81,7 @@ class ForcedChoiceTrial(Trial):
         
         allow_outside_touch=config.get("allow_outside_touch", True)
         stimulus_set = config.get('stimulus_set')
-        return cls(
+        return dict(
             stimulus=stimulus,
             magnitude=magnitude,
             loc=loc,
@@ -81,6 +95,9 @@ class ForcedChoiceTrial(Trial):
             stimulus_set=stimulus_set,
         )
 
+    def stimulus_images(self) -> list[tuple]:
+        return [(self.stimulus, self.size, None)]
+
     def get_reward_scene(self, mgr, reward_params) -> Scene:
         rew = RewardAdapter.from_manager(
             manager=mgr, 
@@ -96,9 +113,17 @@ class ForcedChoiceTrial(Trial):
         reward_scene = Scene(mgr, rew, background=self.backgrounds['correct'])
         return reward_scene
 
+    def outcome_scene_for_result(self, mgr, result: TrialResult, reward_params) -> Scene:
+        if result.outcome == 'correct':
+            return self.get_reward_scene(mgr, reward_params)
+        if result.outcome == 'incorrect':
+            return session_scenes.time_counter(mgr, self.error_duration, self.backgrounds['incorrect'])
+        return session_scenes.time_counter(mgr, self.timeout_duration, self.backgrounds['timeout'])
+
     def run(self, mgr) -> TrialResult:
         reward_params = self.magnitude_mapping[self.magnitude]
         data = {
+            "trial_kind": "forced_choice",
             "stimulus": self.stimulus,
             "magnitude": self.magnitude,
             "location": self.loc,
@@ -106,7 +131,7 @@ class ForcedChoiceTrial(Trial):
             "stimulus_set": self.stimulus_set,
         }
 
-        target = ImageAdapter(
+        target = image_adapter(
             image=self.stimulus,
             position=self.loc,
             size=self.size,
@@ -118,17 +143,10 @@ class ForcedChoiceTrial(Trial):
             allow_outside_touch=self.allow_outside_touch
         )
         scene = Scene(mgr, adapter=tc)
-        reward_scene = self.get_reward_scene(mgr, reward_params)
-        incorrect_scene = Scene(mgr, adapter=TimeCounter(self.error_duration), background=self.backgrounds['incorrect'])
-        timeout_scene = Scene(mgr, adapter=TimeCounter(self.timeout_duration), background=self.backgrounds['timeout'])
-        outcome_scenes = {
-            'correct': reward_scene,
-            'incorrect': incorrect_scene,
-            'timeout': timeout_scene
-        }
 
         scene.run()
         if scene.quit:
+            trial_recorder.flush()
             return TrialResult(
                 continue_session=False, 
                 outcome="quit", 
@@ -146,9 +164,11 @@ class ForcedChoiceTrial(Trial):
                 outcome="timeout", 
                 data=data
             )
-        outcome_scene = outcome_scenes[res.outcome]
+        outcome_scene = self.outcome_scene_for_result(mgr, res, reward_params)
         outcome_scene.run()
         if outcome_scene.quit:
             res.continue_session = False
-        mgr.record(**data, outcome=res.outcome)
+        trial_recorder.record(mgr, **data, outcome=res.outcome)
+        if not res.continue_session:
+            trial_recorder.flush()
         return res
@@ -0,0 +1,201 @@
+import functools
+import threading
+import time
+from bisect import bisect_right
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+import pygame
+
+# The *_first_frame and reward_start stamps are taken as the frame is handed
+# to pygame.display; reward_start is the reward scene's first frame, which is
+# when the library starts the reward adapter and with it the pump.
+STAGES = (
+    'choice_scene_start',
+    'choice_first_frame',
+    'touch_registered',
+    'choice_scene_end',
+    'result_computed',
+    'outcome_scene_built',
+    'reward_start',
+    'record_complete',
+)
+# Bin edges in microseconds: the first bin is everything faster than the first
+# edge and the last bin everything from the final edge up.
+HISTOGRAM_EDGES_US = (100, 250, 500, 1_000, 2_500, 5_000, 10_000, 25_000, 50_000, 100_000, 250_000)
+DEFAULT_WINDOW = 500
+
+
+class TrialTimeline:
+    __slots__ = ('stamps',)
+
+    def __init__(self):
+        self.stamps: Dict[str, int] = {}
+
+    def mark(self, stage: str) -> int:
+        now = time.perf_counter_ns()
+        self.stamps[stage] = now
+        return now
+
+    def mark_at(self, stage: str, timestamp_ns: int) -> None:
+        self.stamps[stage] = timestamp_ns
+
+    def offsets(self) -> Dict[str, int]:
+        """Nanoseconds from choice-scene start to each stamped stage."""
+        origin = self.stamps.get(STAGES[0])
+        if origin is None:
+            return {}
+        return {
+            stage: self.stamps[stage] - origin
+            for stage in STAGES
+            if stage in self.stamps
+        }
+
+    def intervals(self) -> Dict[str, int]:
+        """Nanoseconds spent reaching each stage from the previous stamped one."""
+        intervals = {}
+        previous: Optional[int] = None
+        for stage in STAGES:
+            stamp = self.stamps.get(stage)
+            if stamp is None:
+                continue
+            if previous is not None:
+                intervals[stage] = stamp - previous
+            previous = stamp
+        return intervals
+
+
+class StageLatency:
+    """Rolling per-stage latency windows for the most recent trials."""
+
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[int]] = {
+            stage: deque(maxlen=window) for stage in STAGES[1:]
+        }
+
+    def add(self, timeline: TrialTimeline) -> None:
+        with self._lock:
+            for stage, interval in timeline.intervals().items():
+                self._samples[stage].append(interval)
+
+    def clear(self) -> None:
+        with self._lock:
+            for samples in self._samples.values():
+                samples.clear()
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            snapshot = {stage: sorted(samples) for stage, samples in self._samples.items()}
+        summary = {}
+        for stage, samples in snapshot.items():
+            counts = [0] * (len(HISTOGRAM_EDGES_US) + 1)
+            for sample in samples:
+                counts[bisect_right(HISTOGRAM_EDGES_US, sample / 1_000)] += 1
+            summary[stage] = {
+                'n': len(samples),
+                'p50_us': _percentile_us(samples, 0.5),
+                'p90_us': _percentile_us(samples, 0.9),
+                'p99_us': _percentile_us(samples, 0.99),
+                'max_us': samples[-1] / 1_000 if samples else None,
+                'bin_edges_us': list(HISTOGRAM_EDGES_US),
+                'counts': counts,
+            }
+        return summary
+
+
+def _percentile_us(sorted_samples, q: float) -> Optional[float]:
+    if not sorted_samples:
+        return None
+    index = min(len(sorted_samples) - 1, int(q * len(sorted_samples)))
+    return sorted_samples[index] / 1_000
+
+
+class FrameProbe:
+    """Stamps the armed timeline from the render loop's own calls into pygame.
+
+    pygame.display.flip/update mark `frame_stage` the first time a frame is
+    presented while armed, and pygame.event.get marks `touch_stage` each time
+    it hands the loop a press, so the last one before the scene ends is the
+    touch that ended it. Disarmed, each hook costs one attribute check.
+    """
+
+    PRESS_EVENTS = (pygame.MOUSEBUTTONDOWN, pygame.FINGERDOWN)
+
+    def __init__(self):
+        self.timeline: Optional[TrialTimeline] = None
+        self.frame_stage: Optional[str] = None
+        self.touch_stage: Optional[str] = None
+
+    def arm(self, timeline: TrialTimeline, frame_stage: str, touch_stage: Optional[str] = None) -> None:
+        self.install()
+        self.timeline = timeline
+        self.frame_stage = frame_stage
+        self.touch_stage = touch_stage
+
+    def disarm(self) -> None:
+        self.timeline = None
+
+    def install(self) -> None:
+        # Checked on every arm: the screen mirror restores the functions it
+        # wrapped when it stops, which can drop these hooks.
+        for module, name, hook in (
+            (pygame.display, 'flip', self._presenting),
+            (pygame.display, 'update', self._presenting),
+            (pygame.event, 'get', self._polling),
+        ):
+            current = getattr(module, name)
+            if not getattr(current, '_frame_probe', False):
+                wrapped = hook(current)
+                wrapped._frame_probe = True
+                setattr(module, name, wrapped)
+
+    def on_present(self) -> None:
+        timeline = self.timeline
+        if timeline is not None and self.frame_stage not in timeline.stamps:
+            timeline.mark(self.frame_stage)
+
+    def on_touch(self) -> None:
+        timeline = self.timeline
+        if timeline is not None and self.touch_stage is not None:
+            timeline.mark(self.touch_stage)
+
+    def _presenting(self, present):
+        @functools.wraps(present)
+        def stamp_then_present(*args, **kwargs):
+            self.on_present()
+            return present(*args, **kwargs)
+        return stamp_then_present
+
+    def _polling(self, get):
+        @functools.wraps(get)
+        def get_then_stamp(*args, **kwargs):
+            events = get(*args, **kwargs)
+            if self.timeline is not None and any(event.type in self.PRESS_EVENTS for event in events):
+                self.on_touch()
+            return events
+        return get_then_stamp
+
+
+frame_probe = FrameProbe()
+
+
+stage_latency = StageLatency()
+
+
+def latency_summary() -> Dict[str, Dict[str, Any]]:
+    return stage_latency.summary()
+
+
+def format_latency_summary(summary: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+    summary = latency_summary() if summary is None else summary
+    lines = [f"{'stage':<22}{'n':>6}{'p50 us':>12}{'p90 us':>12}{'p99 us':>12}{'max us':>12}"]
+    for stage, stats in summary.items():
+        if not stats['n']:
+            continue
+        lines.append(
+            f"{stage:<22}{stats['n']:>6}{stats['p50_us']:>12.1f}{stats['p90_us']:>12.1f}"
+            f"{stats['p99_us']:>12.1f}{stats['max_us']:>12.1f}"
+        )
+    return '\n'.join(lines)
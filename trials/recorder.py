@@ -0,0 +1,231 @@
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import traceback
+from typing import Any, Dict, List, Optional, Tuple
+
+from trials.trial_table import TrialTable, trial_table
+
+DEFAULT_JOURNAL_NAME = 'record_journal.jsonl'
+DEFAULT_BATCH_SIZE = 10
+DEFAULT_FLUSH_INTERVAL = 5.0
+
+_FLUSH = object()
+_STOP = object()
+
+
+class RecordWriteError(RuntimeError):
+    pass
+
+
+class WriteBehindRecorder:
+    """Records each trial through mgr.record and writes its typed row from a background thread.
+
+    Only the typed side table is written behind. mgr.record, and with it the
+    SQLite insert into `data`, still runs synchronously on the trial thread:
+    the experiment library owns that connection, stamps each record with its
+    own trial state and handles pause itself, so none of that can be moved
+    off the trial-to-ITI path from here. The typed rows are journalled to
+    disk and written by a writer thread in one transaction per batch of
+    `batch_size` records or `flush_interval` seconds, whichever comes first;
+    trials flush on quit, and a pause (invisible to trial code) is covered
+    by the interval.
+
+    The journal is append-only. A batch that commits appends a line marking
+    its entries done; entries never marked done (e.g. after a crash) are
+    written when the next session starts. A failed batch is logged, kept
+    and retried with the next one, and flush() raises while it stays
+    unwritten.
+    """
+
+    def __init__(
+        self,
+        journal_path: str = os.path.join('data', DEFAULT_JOURNAL_NAME),
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        table: Optional[TrialTable] = None,
+    ):
+        self.journal_path = journal_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.table = table
+        self.error: Optional[BaseException] = None
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._journal = None
+        self._seq = 0
+        self._unwritten: Dict[int, Dict[str, Any]] = {}
+
+    def configure(self, journal_path=None, batch_size=None, flush_interval=None) -> None:
+        if self._thread is not None:
+            return
+        if journal_path is not None:
+            self.journal_path = journal_path
+        if batch_size is not None:
+            self.batch_size = max(1, int(batch_size))
+        if flush_interval is not None:
+            self.flush_interval = float(flush_interval)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        journal_dir = os.path.dirname(self.journal_path)
+        if journal_dir:
+            os.makedirs(journal_dir, exist_ok=True)
+        leftovers = self._compact_journal()
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        self._thread = threading.Thread(target=self._run, name='trial-recorder', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        for seq, fields in leftovers:
+            self._unwritten[seq] = fields
+            self._queue.put((seq, fields))
+
+    def record(self, mgr, **fields: Any) -> None:
+        # Stamped on the trial thread, so typed rows written later (or replayed
+        # next session) keep the trial's own time and join back to `data`.
+        fields['recorded_at'] = time.time()
+        mgr.record(**fields)
+        if self.table is None or not self.table.enabled:
+            return
+        self.start()
+        self._enqueue(fields)
+
+    def flush(self) -> None:
+        """Write everything queued so far; raises if some of it could not be written."""
+        if self._thread is None:
+            return
+        self._queue.put(_FLUSH)
+        self._queue.join()
+        self._raise_unwritten()
+
+    def close(self) -> None:
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._queue.join()
+        self._thread.join()
+        self._thread = None
+        with self._lock:
+            self._journal.close()
+            self._journal = None
+        if self._unwritten:
+            print(f"{len(self._unwritten)} typed trial rows left in {self.journal_path}; they are written next session.")
+
+    @property
+    def pending(self) -> int:
+        return len(self._unwritten)
+
+    def _raise_unwritten(self) -> None:
+        if self._unwritten and self.error is not None:
+            raise RecordWriteError(
+                f"{len(self._unwritten)} typed trial rows could not be written and remain in "
+                f"{self.journal_path}: {self.error!r}"
+            ) from self.error
+
+    def _compact_journal(self) -> List[Tuple[int, Dict[str, Any]]]:
+        """Entries not yet marked done, after rewriting the journal to hold only them."""
+        if not os.path.exists(self.journal_path):
+            return []
+        entries: Dict[int, Dict[str, Any]] = {}
+        with open(self.journal_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash.
+                    continue
+                if 'done' in item:
+                    for seq in item['done']:
+                        entries.pop(seq, None)
+                elif 'seq' in item:
+                    entries[item['seq']] = item['fields']
+        self._seq = max(entries, default=0)
+        tmp_path = self.journal_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for seq, fields in entries.items():
+                f.write(json.dumps({'seq': seq, 'fields': fields}, default=list) + '\n')
+        os.replace(tmp_path, self.journal_path)
+        return list(entries.items())
+
+    def _append_journal(self, item: Dict[str, Any]) -> None:
+        self._journal.write(json.dumps(item, default=list) + '\n')
+        self._journal.flush()
+
+    def _enqueue(self, fields: Dict[str, Any]) -> None:
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            self._unwritten[seq] = fields
+            self._append_journal({'seq': seq, 'fields': fields})
+        self._queue.put((seq, fields))
+
+    def _run(self) -> None:
+        batch: list = []
+        # Items from a failed batch, written again with the next one.
+        retry: list = []
+        deadline = 0.0
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if batch else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                retry = self._write(retry, batch)
+                batch = []
+                continue
+            if item is _FLUSH or item is _STOP:
+                retry = self._write(retry, batch)
+                batch = []
+                self._queue.task_done()
+                if item is _STOP:
+                    return
+                continue
+            if not batch:
+                deadline = time.monotonic() + self.flush_interval
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                retry = self._write(retry, batch)
+                batch = []
+
+    def _write(self, retry: list, batch: list) -> list:
+        """Write one batch in one transaction; returns the items still unwritten."""
+        items = retry + batch
+        try:
+            if items:
+                self.table.write(fields for _, fields in items)
+        except (sqlite3.Error, OSError) as exc:
+            self.error = exc
+            traceback.print_exc()
+            print(f"Could not write {len(items)} typed trial rows; {len(self._unwritten)} remain in {self.journal_path}.")
+            return items
+        else:
+            if items:
+                with self._lock:
+                    for seq, _ in items:
+                        self._unwritten.pop(seq, None)
+                    self._append_journal({'done': [seq for seq, _ in items]})
+            self.error = None
+            return []
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+
+trial_recorder = WriteBehindRecorder(table=trial_table)
+
+
+def configure_recorder(config: dict) -> None:
+    storage = config.get('storage') or {}
+    journal_path = None
+    if storage.get('path'):
+        journal_path = os.path.join(os.path.dirname(storage['path']), DEFAULT_JOURNAL_NAME)
+    trial_recorder.configure(
+        journal_path=journal_path,
+        batch_size=config.get('record_batch_size'),
+        flush_interval=config.get('record_flush_interval'),
+    )
@@ -0,0 +1,161 @@
+import random
+import secrets
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+DEFAULT_BATCH_SIZE = 256
+
+
+class AliasTable:
+    """Walker/Vose alias table: O(1) draws from a discrete distribution.
+
+    Each draw consumes exactly one uniform from the session stream, which is
+    what makes a recorded draw index enough to regenerate the sample.
+    """
+
+    __slots__ = ('values', 'prob', 'alias')
+
+    def __init__(self, values: Sequence[Any], weights: Sequence[float]):
+        if len(values) != len(weights):
+            raise ValueError("Alias table needs one weight per value.")
+        if not values:
+            raise ValueError("Alias table needs at least one value.")
+        weights = [float(weight) for weight in weights]
+        if any(weight < 0 for weight in weights):
+            raise ValueError("Alias table weights must be non-negative.")
+        total = sum(weights)
+        if total <= 0:
+            raise ValueError("Alias table weights must sum above zero.")
+
+        n = len(weights)
+        scaled = [weight * n / total for weight in weights]
+        prob = [0.0] * n
+        alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            prob[s] = scaled[s]
+            alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+        for i in small + large:
+            prob[i] = 1.0
+
+        self.values = tuple(values)
+        self.prob = tuple(prob)
+        self.alias = tuple(alias)
+
+    @classmethod
+    def from_cue(cls, cue: Mapping[str, Any]) -> 'AliasTable':
+        return cls(
+            [int(value) for value in cue['magnitude_values']],
+            [float(probability) for probability in cue['probabilities']],
+        )
+
+    def value_for(self, u: float) -> Any:
+        x = u * len(self.values)
+        i = int(x)
+        return self.values[i] if x - i < self.prob[i] else self.values[self.alias[i]]
+
+
+class SampleStream:
+    """Seeded stream of uniforms, generated in batches and indexed from zero."""
+
+    def __init__(self, seed: Optional[int] = None, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.seed = secrets.randbits(32) if seed is None else int(seed)
+        self.batch_size = batch_size
+        self._rng = random.Random(self.seed)
+        self._buffer: List[float] = []
+        self._offset = 0
+        self.index = 0
+
+    def next(self) -> Tuple[float, int]:
+        if self._offset >= len(self._buffer):
+            rng = self._rng.random
+            self._buffer = [rng() for _ in range(self.batch_size)]
+            self._offset = 0
+        u = self._buffer[self._offset]
+        self._offset += 1
+        index = self.index
+        self.index += 1
+        return u, index
+
+
+class DistributionSampler:
+    def __init__(self):
+        self.tables: Dict[str, AliasTable] = {}
+        self.stream = SampleStream()
+
+    def configure(
+        self,
+        distribution_cues: Mapping[str, Mapping[str, Any]],
+        seed: Optional[int] = None,
+        batch_size: Optional[int] = None,
+    ) -> None:
+        self.tables = {
+            str(cue_id): AliasTable.from_cue(cue)
+            for cue_id, cue in distribution_cues.items()
+        }
+        self.stream = SampleStream(
+            seed=seed,
+            batch_size=batch_size or DEFAULT_BATCH_SIZE,
+        )
+
+    @property
+    def seed(self) -> int:
+        return self.stream.seed
+
+    def table(self, cue_id: str, cue: Optional[Mapping[str, Any]] = None) -> AliasTable:
+        table = self.tables.get(cue_id)
+        if table is None:
+            if cue is None:
+                raise KeyError(f"Unknown distribution cue: {cue_id}")
+            table = self.tables[cue_id] = AliasTable.from_cue(cue)
+        return table
+
+    def draw(self, cue_id: str, cue: Optional[Mapping[str, Any]] = None) -> Tuple[int, int]:
+        table = self.table(cue_id, cue)
+        u, index = self.stream.next()
+        return table.value_for(u), index
+
+
+distribution_sampler = DistributionSampler()
+
+
+def configure_sampler(config: dict) -> None:
+    distribution_sampler.configure(
+        config.get('distribution_cues') or {},
+        seed=config.get('sampling_seed'),
+        batch_size=config.get('sampling_batch_size'),
+    )
+
+
+def replay_draws(
+    seed: int,
+    draws: Iterable[Tuple[Mapping[str, Any], int]],
+) -> List[int]:
+    """Regenerate sampled magnitudes from a session seed.
+
+    `draws` holds (distribution cue, draw index) pairs as recorded with each
+    trial; the stream is walked once up to the largest index.
+    """
+    draws = list(draws)
+    wanted = sorted(set(index for _, index in draws))
+    uniforms: Dict[int, float] = {}
+    rng = random.Random(int(seed))
+    position = 0
+    for index in wanted:
+        while position < index:
+            rng.random()
+            position += 1
+        uniforms[index] = rng.random()
+        position += 1
+    tables: Dict[int, AliasTable] = {}
+    magnitudes = []
+    for cue, index in draws:
+        table = tables.get(id(cue))
+        if table is None:
+            table = tables[id(cue)] = AliasTable.from_cue(cue)
+        magnitudes.append(table.value_for(uniforms[index]))
+    return magnitudes
@@ -0,0 +1,39 @@
+from typing import Any, Dict, Tuple
+
+from experiment.experiments.adapters import TimeCounter
+from experiment.experiments.scene import Scene
+
+
+class SessionScenes:
+    """Outcome scenes that do not depend on the trial, built once per session.
+
+    Scene.run re-initialises its adapter chain every time it starts, so a
+    cached scene only needs its quit flag cleared before it is reused.
+    """
+
+    def __init__(self):
+        self._mgr = None
+        self._scenes: Dict[Tuple[Any, ...], Scene] = {}
+
+    def _bind(self, mgr) -> None:
+        if mgr is not self._mgr:
+            self._scenes.clear()
+            self._mgr = mgr
+
+    def time_counter(self, mgr, duration: float, background) -> Scene:
+        self._bind(mgr)
+        key = ('time_counter', float(duration), tuple(background))
+        scene = self._scenes.get(key)
+        if scene is None:
+            scene = Scene(mgr, adapter=TimeCounter(duration), background=background)
+            self._scenes[key] = scene
+        else:
+            scene.quit = False
+        return scene
+
+    def clear(self) -> None:
+        self._scenes.clear()
+        self._mgr = None
+
+
+session_scenes = SessionScenes()
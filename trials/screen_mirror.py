@@ -0,0 +1,291 @@
+"""Low-bandwidth mirror of the subject display for remote monitoring.
+
+The display surface is only touched on the render thread: while the mirror
+runs, pygame.display.flip/update take a copy downscaled to `width` pixels
+wide just before presenting, at most `fps` times a second. A daemon thread
+compares each copy with the previous one, and only a changed frame is
+encoded (JPEG, or WebP with Pillow) and handed to the clients, so a static
+ITI screen sends nothing after its first frame. The render loop never waits
+on the mirror; its only cost is one small downscale per sample.
+
+Clients hold one connection to an MJPEG stream instead of re-requesting:
+
+    http://<rig>:<port>/screen.mjpg   multipart stream, one part per changed frame
+    http://<rig>:<port>/screen.jpg    the latest frame
+
+The dashboard connects to the stream on DEFAULT_PORT (or the template's
+screen_mirror_port) and falls back to the experiment server's /screen.
+
+Config (all optional; mirroring is off unless enabled):
+
+    config['screen_mirror'] = {
+        'enabled': True, 'port': 8765, 'fps': 5, 'width': 480,
+        'format': 'jpeg', 'quality': 70,
+    }
+"""
+import functools
+import io
+import threading
+import time
+import traceback
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+
+import pygame
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+DEFAULT_PORT = 8765
+DEFAULT_FPS = 5.0
+DEFAULT_WIDTH = 480
+DEFAULT_FORMAT = 'jpeg'
+DEFAULT_QUALITY = 70
+BOUNDARY = 'frame'
+# How long a stream waits for a new frame before checking the mirror is still running.
+CLIENT_WAIT = 5.0
+CONTENT_TYPES = {'jpeg': 'image/jpeg', 'webp': 'image/webp'}
+
+
+class ScreenMirror:
+    def __init__(self):
+        self.enabled = False
+        self.port = DEFAULT_PORT
+        self.fps = DEFAULT_FPS
+        self.width = DEFAULT_WIDTH
+        self.format = DEFAULT_FORMAT
+        self.quality = DEFAULT_QUALITY
+        self.frame: Optional[bytes] = None
+        self.frame_id = 0
+        self.samples = 0
+        self.bytes_encoded = 0
+        self._digest: Optional[int] = None
+        self._sample: Optional[pygame.Surface] = None
+        self._next_sample = 0.0
+        self._sampled = threading.Condition()
+        self._flips: Optional[dict] = None
+        self._changed = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def configure(self, enabled=False, port=None, fps=None, width=None, format=None, quality=None) -> None:
+        settings = (
+            bool(enabled),
+            int(port or DEFAULT_PORT),
+            float(fps or DEFAULT_FPS),
+            int(width or DEFAULT_WIDTH),
+            str(format or DEFAULT_FORMAT).lower(),
+            int(quality or DEFAULT_QUALITY),
+        )
+        if settings[4] not in CONTENT_TYPES:
+            raise ValueError(f"Unsupported screen mirror format: {settings[4]}")
+        if settings[4] == 'webp' and Image is None:
+            raise ValueError("WebP screen mirroring needs Pillow.")
+        if self.running and settings == self.settings:
+            return
+        self.stop()
+        self.enabled, self.port, self.fps, self.width, self.format, self.quality = settings
+        if self.enabled:
+            self.start()
+
+    @property
+    def settings(self) -> tuple:
+        return (self.enabled, self.port, self.fps, self.width, self.format, self.quality)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and not self._stop.is_set()
+
+    @property
+    def content_type(self) -> str:
+        return CONTENT_TYPES[self.format]
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        try:
+            server = ThreadingHTTPServer(('', self.port), _MirrorHandler)
+        except OSError:
+            # A busy port must not abort the session; it only goes unmirrored.
+            traceback.print_exc()
+            print(f"Screen mirror disabled: could not listen on port {self.port}.")
+            self.enabled = False
+            return
+        self._stop.clear()
+        self._server = server
+        self._server.daemon_threads = True
+        self._server.mirror = self
+        threading.Thread(target=self._server.serve_forever, name='screen-mirror-http', daemon=True).start()
+        self._thread = threading.Thread(target=self._run, name='screen-mirror', daemon=True)
+        self._thread.start()
+        self._hook_display()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._unhook_display()
+        self._stop.set()
+        with self._sampled:
+            self._sampled.notify_all()
+        self._thread.join()
+        self._thread = None
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        with self._changed:
+            self._changed.notify_all()
+
+    def wait_frame(self, last_id: int, timeout: float = CLIENT_WAIT) -> Tuple[int, Optional[bytes]]:
+        """Block until a frame newer than `last_id` exists; returns (frame_id, frame)."""
+        with self._changed:
+            self._changed.wait_for(lambda: self.frame_id != last_id or self._stop.is_set(), timeout)
+            return self.frame_id, self.frame
+
+    def _hook_display(self) -> None:
+        if self._flips is not None:
+            return
+        self._flips = {name: getattr(pygame.display, name) for name in ('flip', 'update')}
+        for name, present in self._flips.items():
+            setattr(pygame.display, name, self._sampling(present))
+
+    def _unhook_display(self) -> None:
+        if self._flips is None:
+            return
+        for name, present in self._flips.items():
+            setattr(pygame.display, name, present)
+        self._flips = None
+
+    def _sampling(self, present):
+        @functools.wraps(present)
+        def sample_then_present(*args, **kwargs):
+            self.on_flip()
+            return present(*args, **kwargs)
+        return sample_then_present
+
+    def on_flip(self) -> None:
+        """Hand the mirror a downscaled copy of the frame about to be shown; runs on the render thread."""
+        now = time.monotonic()
+        if now < self._next_sample or not self.running:
+            return
+        self._next_sample = now + 1.0 / self.fps
+        try:
+            surface = pygame.display.get_surface()
+            if surface is None:
+                return
+            width, height = surface.get_size()
+            if not width or not height:
+                return
+            size = (min(self.width, width), max(1, round(height * min(self.width, width) / width)))
+            small = pygame.transform.scale(surface, size)
+        except pygame.error:
+            # The display is being recreated; sample the next frame.
+            return
+        except Exception:
+            traceback.print_exc()
+            return
+        with self._sampled:
+            self._sample = small
+            self._sampled.notify()
+
+    def publish(self, small: pygame.Surface) -> bool:
+        """Encode a sampled copy if it differs from the last one; returns whether a new frame was published."""
+        raw = pygame.image.tobytes(small, 'RGB')
+        self.samples += 1
+        digest = zlib.crc32(raw)
+        if digest == self._digest:
+            return False
+        self._digest = digest
+        frame = self._encode(small, raw, small.get_size())
+        with self._changed:
+            self.frame = frame
+            self.frame_id += 1
+            self.bytes_encoded += len(frame)
+            self._changed.notify_all()
+        return True
+
+    def _encode(self, small: pygame.Surface, raw: bytes, size: Tuple[int, int]) -> bytes:
+        buffer = io.BytesIO()
+        if Image is not None:
+            # Pillow releases the GIL while encoding.
+            Image.frombytes('RGB', size, raw).save(buffer, format=self.format.upper(), quality=self.quality)
+        else:
+            pygame.image.save(small, buffer, 'frame.jpg')
+        return buffer.getvalue()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            with self._sampled:
+                self._sampled.wait_for(lambda: self._sample is not None or self._stop.is_set())
+                small, self._sample = self._sample, None
+            if small is None:
+                continue
+            try:
+                self.publish(small)
+            except Exception:
+                traceback.print_exc()
+
+
+class _MirrorHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        mirror: ScreenMirror = self.server.mirror
+        path = self.path.split('?', 1)[0]
+        if path == '/screen.mjpg':
+            self._stream(mirror)
+        elif path == '/screen.jpg':
+            _, frame = mirror.wait_frame(0, timeout=0)
+            if frame is None:
+                self.send_error(503, "No frame captured yet")
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', mirror.content_type)
+            self.send_header('Content-Length', str(len(frame)))
+            self.send_header('Cache-Control', 'no-store')
+            self.end_headers()
+            self.wfile.write(frame)
+        else:
+            self.send_error(404)
+
+    def _stream(self, mirror: ScreenMirror) -> None:
+        self.send_response(200)
+        self.send_header('Content-Type', f'multipart/x-mixed-replace; boundary={BOUNDARY}')
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        last_id = 0
+        try:
+            while mirror.running:
+                frame_id, frame = mirror.wait_frame(last_id)
+                if frame is None or frame_id == last_id:
+                    continue
+                last_id = frame_id
+                self.wfile.write(
+                    f'--{BOUNDARY}\r\nContent-Type: {mirror.content_type}\r\n'
+                    f'Content-Length: {len(frame)}\r\n\r\n'.encode('ascii')
+                )
+                self.wfile.write(frame)
+                self.wfile.write(b'\r\n')
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+screen_mirror = ScreenMirror()
+
+
+def configure_screen_mirror(config: dict) -> None:
+    settings = config.get('screen_mirror') or {}
+    screen_mirror.configure(
+        enabled=settings.get('enabled', False),
+        port=settings.get('port'),
+        fps=settings.get('fps'),
+        width=settings.get('width'),
+        format=settings.get('format'),
+        quality=settings.get('quality'),
+    )
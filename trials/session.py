@@ -0,0 +1,17 @@
+from trials.behaviour_feed import configure_behaviour_feed
+from trials.divergence import configure_divergence
+from trials.recorder import configure_recorder
+from trials.sampling import configure_sampler
+from trials.screen_mirror import configure_screen_mirror
+from trials.stimulus_cache import configure_stimulus_cache
+from trials.trial_table import configure_trial_table
+
+
+def configure_session(config: dict) -> None:
+    configure_stimulus_cache(config)
+    configure_recorder(config)
+    configure_trial_table(config)
+    configure_sampler(config)
+    configure_divergence(config)
+    configure_screen_mirror(config)
+    configure_behaviour_feed(config)
@@ -0,0 +1,197 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import pygame
+from experiment.experiments.adapters import ImageAdapter
+from experiment.util.bbox import T_BBOX_SPEC
+
+DEFAULT_MAX_ENTRIES = 64
+DEFAULT_STIMULUS_SIZE = (200, 200)
+DEFAULT_PREFLIGHT_WORKERS = min(8, os.cpu_count() or 1)
+
+CacheKey = Tuple[str, Tuple[float, float], Optional[str]]
+
+
+class StimulusCache:
+    """Session-wide LRU of decoded (and, where possible, pre-scaled) stimulus images.
+
+    Entries are keyed by (image path, size, coordinate_space). Images in ndc
+    space are scaled to their on-screen pixel size once the display size is
+    known; anything else is decoded at native resolution and left for the
+    adapter to scale.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, display_size: Optional[Tuple[int, int]] = None):
+        self.max_entries = max_entries
+        self.display_size = display_size
+        self.hits = 0
+        self.misses = 0
+        self._images: OrderedDict[CacheKey, pygame.Surface] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(self, display_size: Optional[Tuple[int, int]] = None, max_entries: Optional[int] = None) -> None:
+        if display_size is not None:
+            display_size = (int(display_size[0]), int(display_size[1]))
+        with self._lock:
+            if display_size != self.display_size:
+                # Pre-scaled entries are only valid for the display they were built for.
+                self._images.clear()
+                self.display_size = display_size
+            if max_entries is not None:
+                self.max_entries = int(max_entries)
+                self._evict()
+
+    def key(self, image: str, size: Tuple[float, float], coordinate_space: Optional[str]) -> CacheKey:
+        return (str(image), (float(size[0]), float(size[1])), coordinate_space)
+
+    def pixel_size(self, size: Tuple[float, float], coordinate_space: Optional[str]) -> Optional[Tuple[int, int]]:
+        if coordinate_space != 'ndc' or self.display_size is None:
+            return None
+        width, height = self.display_size
+        return (
+            max(1, round(size[0] * width / 2)),
+            max(1, round(size[1] * height / 2)),
+        )
+
+    def load(self, image: str, size: Tuple[float, float], coordinate_space: Optional[str]) -> pygame.Surface:
+        """Decode and pre-scale without touching the display, so it is safe off the main thread."""
+        surface = pygame.image.load(image)
+        pixel_size = self.pixel_size(size, coordinate_space)
+        if pixel_size is not None and surface.get_size() != pixel_size:
+            surface = pygame.transform.smoothscale(surface, pixel_size)
+        return surface
+
+    def finish(self, surface: pygame.Surface) -> pygame.Surface:
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert_alpha()
+        return surface
+
+    def decode(self, image: str, size: Tuple[float, float], coordinate_space: Optional[str]) -> pygame.Surface:
+        return self.finish(self.load(image, size, coordinate_space))
+
+    def get(self, image: str, size: Tuple[float, float], coordinate_space: Optional[str] = None) -> pygame.Surface:
+        key = self.key(image, size, coordinate_space)
+        with self._lock:
+            surface = self._images.get(key)
+            if surface is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return surface
+
+        surface = self.decode(image, size, coordinate_space)
+        with self._lock:
+            self.misses += 1
+            self._store(key, surface)
+        return surface
+
+    def warm(self, keys: Iterable[CacheKey], workers: Optional[int] = None) -> int:
+        """Decode every key missing from the cache in a thread pool.
+
+        Raises ValueError naming every image that failed to decode; nothing is
+        cached in that case. The cache grows to hold the full set so warmed
+        entries are not evicted by each other. Returns the number decoded.
+        """
+        keys = list(dict.fromkeys(keys))
+        with self._lock:
+            missing = [key for key in keys if key not in self._images]
+            self.max_entries = max(self.max_entries, len(keys))
+        if not missing:
+            return 0
+
+        def load(key: CacheKey):
+            try:
+                return key, self.load(*key), None
+            except (OSError, pygame.error, ValueError) as exc:
+                return key, None, exc
+
+        with ThreadPoolExecutor(max_workers=workers or DEFAULT_PREFLIGHT_WORKERS) as pool:
+            results = list(pool.map(load, missing))
+        # The same file can appear under several sizes; report it once.
+        failures = list(dict.fromkeys(f"{key[0]}: {exc}" for key, _, exc in results if exc is not None))
+        if failures:
+            raise ValueError("Stimulus images failed to load:\n  " + "\n  ".join(failures))
+        # convert_alpha needs the display, so it runs here rather than in the workers.
+        surfaces = [(key, self.finish(surface)) for key, surface, _ in results]
+        with self._lock:
+            for key, surface in surfaces:
+                self._store(key, surface)
+        return len(surfaces)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._images.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __contains__(self, key: CacheKey) -> bool:
+        return key in self._images
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+    def _store(self, key: CacheKey, surface: pygame.Surface) -> None:
+        self._images[key] = surface
+        self._images.move_to_end(key)
+        self._evict()
+
+    def _evict(self) -> None:
+        while len(self._images) > self.max_entries:
+            self._images.popitem(last=False)
+
+
+stimulus_cache = StimulusCache()
+
+
+def configure_stimulus_cache(config: dict) -> None:
+    display = config.get('display') or {}
+    stimulus_cache.configure(
+        display_size=display.get('size'),
+        max_entries=config.get('stimulus_cache_size'),
+    )
+
+
+def config_stimulus_images(config: dict) -> Set[CacheKey]:
+    """Every image named by stimulus_sets, items and distribution_cues, at the config's size."""
+    size = tuple(config.get('size', DEFAULT_STIMULUS_SIZE))
+    coordinate_space = config.get('coordinate_space')
+    images: List[str] = []
+    for stimulus_set in (config.get('stimulus_sets') or {}).values():
+        images.extend(stimulus_set.values())
+    images.extend((config.get('items') or {}).values())
+    for cue in (config.get('distribution_cues') or {}).values():
+        images.append(cue['image'])
+    return {stimulus_cache.key(image, size, coordinate_space) for image in images}
+
+
+def preflight_stimuli(config: dict, keys: Iterable[CacheKey] = ()) -> int:
+    """Decode every stimulus the session can show before its first trial.
+
+    `keys` adds the (image, size, coordinate_space) entries the compiled
+    trials will actually request, which can differ from the config-level
+    defaults per condition or trial type.
+    """
+    wanted: Dict[CacheKey, None] = dict.fromkeys(keys)
+    wanted.update(dict.fromkeys(config_stimulus_images(config)))
+    return stimulus_cache.warm(wanted, workers=config.get('stimulus_preflight_workers'))
+
+
+def image_adapter(
+    image: str,
+    position,
+    size: Tuple[float, float],
+    bbox: Optional[T_BBOX_SPEC] = None,
+    coordinate_space: Optional[str] = None,
+) -> ImageAdapter:
+    kwargs: dict[str, Any] = dict(
+        image=stimulus_cache.get(image, size, coordinate_space),
+        position=position,
+        size=size,
+    )
+    if bbox is not None:
+        kwargs['bbox'] = bbox
+    if coordinate_space is not None:
+        kwargs['coordinate_space'] = coordinate_space
+    return ImageAdapter(**kwargs)
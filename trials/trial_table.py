@@ -0,0 +1,207 @@
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, Mapping, Optional, Sequence, Tuple
+
+TABLE_NAME = 'typed_trials'
+# One column per payload field consumers query; everything else stays in the
+# JSON blob the experiment library writes to `data`.
+COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ('date', 'TEXT'),
+    ('time', 'TEXT'),
+    ('recorded_at', 'REAL'),
+    ('data_rowid', 'INTEGER'),
+    ('outcome', 'TEXT'),
+    ('trial_kind', 'TEXT'),
+    ('stimulus_set', 'INTEGER'),
+    ('chosen', 'TEXT'),
+    ('option1_magnitude', 'INTEGER'),
+    ('option2_magnitude', 'INTEGER'),
+    ('option1_loc', 'INTEGER'),
+    ('option2_loc', 'INTEGER'),
+    ('option1_x', 'REAL'),
+    ('option1_y', 'REAL'),
+    ('option2_x', 'REAL'),
+    ('option2_y', 'REAL'),
+    ('option1_distribution', 'TEXT'),
+    ('option2_distribution', 'TEXT'),
+    ('chosen_distribution', 'TEXT'),
+    ('sampled_magnitude', 'INTEGER'),
+    ('RT', 'REAL'),
+)
+COLUMN_NAMES = tuple(name for name, _ in COLUMNS)
+INDEXES = {
+    f'ix_{TABLE_NAME}_outcome_date': ('outcome', 'date'),
+    f'ix_{TABLE_NAME}_stimulus_set_date': ('stimulus_set', 'date'),
+    f'ix_{TABLE_NAME}_data_rowid': ('data_rowid',),
+}
+# Typed rows are matched to their `data` row among this many of the newest
+# rows; older ones (e.g. replayed from the journal) keep data_rowid NULL and
+# join on recorded_at instead.
+DATA_ROWID_WINDOW = 1000
+
+
+def _location_key(position) -> Tuple[float, float]:
+    return (round(float(position[0]), 6), round(float(position[1]), 6))
+
+
+def _pair(values: Optional[Sequence[Any]]) -> Tuple[Any, Any]:
+    values = list(values or ())[:2]
+    return tuple(values + [None] * (2 - len(values)))
+
+
+class TrialTable:
+    """Typed side table written alongside each record.
+
+    Rows are derived from the same fields handed to mgr.record, so the
+    recorder writes them from its writer thread in one transaction per batch;
+    errors are left to the recorder, which keeps the batch for a retry.
+    The connection is opened lazily by that thread.
+
+    `recorded_at` is stamped by the recorder on the trial thread and stored
+    in the `data` payload too, so each typed row joins back to its record:
+    by data_rowid, resolved when the row is written, or on
+    json_extract(data.data, '$.recorded_at').
+    """
+
+    def __init__(self, path: Optional[str] = None, locations: Optional[Mapping[Any, Sequence[float]]] = None):
+        self.path = path
+        self.location_index: Dict[Tuple[float, float], Any] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        if locations:
+            self.set_locations(locations)
+
+    def configure(self, path: Optional[str] = None, locations: Optional[Mapping[Any, Sequence[float]]] = None) -> None:
+        if path != self.path:
+            self.close()
+            self.path = path
+        if locations is not None:
+            self.set_locations(locations)
+
+    def set_locations(self, locations: Mapping[Any, Sequence[float]]) -> None:
+        self.location_index = {
+            _location_key(position): loc
+            for loc, position in locations.items()
+            if isinstance(loc, int)
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def loc_for(self, position) -> Optional[int]:
+        if position is None:
+            return None
+        return self.location_index.get(_location_key(position))
+
+    def row_for(self, fields: Mapping[str, Any], data_rowid: Optional[int] = None) -> Tuple[Any, ...]:
+        magnitudes = fields.get('magnitudes')
+        if magnitudes is None and fields.get('magnitude') is not None:
+            magnitudes = (fields['magnitude'],)
+        locations = fields.get('locations')
+        if locations is None and fields.get('location') is not None:
+            locations = (fields['location'],)
+        option1_magnitude, option2_magnitude = _pair(magnitudes)
+        option1_position, option2_position = _pair(locations)
+        option1_x, option1_y = _pair(option1_position)
+        option2_x, option2_y = _pair(option2_position)
+        option1_loc, option2_loc = self.loc_for(option1_position), self.loc_for(option2_position)
+        option1_distribution, option2_distribution = _pair(fields.get('distribution_options'))
+        recorded_at = fields.get('recorded_at')
+        local = time.localtime(recorded_at)
+        row = {
+            'date': time.strftime('%Y-%m-%d', local),
+            'time': time.strftime('%H:%M:%S', local),
+            'recorded_at': recorded_at,
+            'data_rowid': data_rowid,
+            'outcome': fields.get('outcome'),
+            'trial_kind': fields.get('trial_kind'),
+            'stimulus_set': fields.get('stimulus_set'),
+            'chosen': fields.get('chosen'),
+            'option1_magnitude': option1_magnitude,
+            'option2_magnitude': option2_magnitude,
+            'option1_loc': option1_loc,
+            'option2_loc': option2_loc,
+            'option1_x': option1_x,
+            'option1_y': option1_y,
+            'option2_x': option2_x,
+            'option2_y': option2_y,
+            'option1_distribution': option1_distribution,
+            'option2_distribution': option2_distribution,
+            'chosen_distribution': fields.get('chosen_distribution'),
+            'sampled_magnitude': fields.get('sampled_magnitude'),
+            'RT': fields.get('RT'),
+        }
+        return tuple(row[name] for name in COLUMN_NAMES)
+
+    def write(self, records: Iterable[Mapping[str, Any]]) -> None:
+        if not self.enabled:
+            return
+        records = list(records)
+        if not records:
+            return
+        conn = self._connect()
+        data_rowids = self.data_rowids(conn, [fields.get('recorded_at') for fields in records])
+        rows = [self.row_for(fields, data_rowids.get(fields.get('recorded_at'))) for fields in records]
+        with conn:
+            conn.executemany(
+                f"INSERT INTO {TABLE_NAME} ({', '.join(COLUMN_NAMES)}) "
+                f"VALUES ({', '.join('?' * len(COLUMN_NAMES))})",
+                rows,
+            )
+
+    def data_rowids(self, conn: sqlite3.Connection, recorded_at: Sequence[Optional[float]]) -> Dict[float, int]:
+        """rowids of the `data` rows carrying these recorded_at stamps, among the newest rows."""
+        wanted = {stamp for stamp in recorded_at if stamp is not None}
+        if not wanted:
+            return {}
+        try:
+            rows = conn.execute(
+                "SELECT rowid, json_extract(data, '$.recorded_at') FROM data "
+                "WHERE rowid > (SELECT COALESCE(MAX(rowid), 0) FROM data) - ?",
+                (len(wanted) + DATA_ROWID_WINDOW,),
+            ).fetchall()
+        except sqlite3.OperationalError:
+            # No `data` table in this file, e.g. storage kept elsewhere.
+            return {}
+        return {stamp: rowid for rowid, stamp in rows if stamp in wanted}
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Opened by the writer thread; configure() may close it from the main thread.
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            ensure_schema(conn)
+            self._conn = conn
+        return self._conn
+
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    """Create the typed table and its indexes, adding any columns an older table lacks."""
+    with conn:
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {TABLE_NAME} "
+            f"(id INTEGER PRIMARY KEY, {', '.join(f'{name} {kind}' for name, kind in COLUMNS)})"
+        )
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({TABLE_NAME})")}
+        for name, kind in COLUMNS:
+            if name not in existing:
+                conn.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN {name} {kind}")
+        for index_name, columns in INDEXES.items():
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {TABLE_NAME} ({', '.join(columns)})")
+
+
+trial_table = TrialTable()
+
+
+def configure_trial_table(config: dict) -> None:
+    storage = config.get('storage') or {}
+    path = storage.get('path') if storage.get('type') == 'sqlite' and config.get('typed_trials', True) else None
+    trial_table.configure(path=path, locations=config.get('locations') or {})
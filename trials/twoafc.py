@@ -1,9 +1,15 @@
 from experiment.trial import Trial, TrialResult
-from experiment.experiments.adapters import ImageAdapter, TouchAdapter, RewardAdapter, TimeCounter, RectAdapter
+from experiment.experiments.adapters import ImageAdapter, TouchAdapter, RewardAdapter, RectAdapter
 from experiment.experiments.scene import Scene
 from experiment.util.bbox import T_BBOX_SPEC
 from typing import Any, Optional, Tuple
 
+from trials.scenes import session_scenes
+from trials.recorder import trial_recorder
+from trials.factory import trial_factory
+from trials.latency import TrialTimeline, format_latency_summary, frame_probe, stage_latency
+from trials.stimulus_cache import image_adapter
+
 INTERPULSE_INTERVAL = 0.2
 REWARD_BAR_WIDTH = 0.0833333333
 REWARD_BAR_HEIGHT_PER_LEVEL = 0.1388888889
@@ -27,6 +33,11 @@ class TwoAFCTrial(Trial):
         'timeout': (0, 0, 255),
     }
     CENTER = (0.0, 0.0)
+    CONDITION_FIELDS = ('stimulus_set', 'magnitudes', 'locs')
+    CONFIG_FIELDS = (
+        'items', 'locations', 'magnitude_mapping', 'duration', 'size', 'bbox', 'reward_channels',
+        'cue_incorrect', 'reward_feedback_method', 'coordinate_space', 'prestage_rewards',
+    )
 
     def __init__(
         self,
@@ -43,6 +54,7 @@ class TwoAFCTrial(Trial):
         reward_feedback_method: str = 'bar_height',
         coordinate_space: str = 'ndc',
         stimulus_set: int | None = None,
+        prestage_rewards: bool = False,
     ):
         super().__init__()
         self.options = options
@@ -63,9 +75,15 @@ class TwoAFCTrial(Trial):
         self.reward_feedback_method = reward_feedback_method
         self.coordinate_space = coordinate_space
         self.stimulus_set = stimulus_set
+        self.prestage_rewards = prestage_rewards
+        self.reward_scenes: list[Scene] = []
 
     @classmethod
     def from_config(cls, config: dict) -> 'TwoAFCTrial':
+        return trial_factory.build(cls, config)
+
+    @classmethod
+    def trial_kwargs(cls, config: dict) -> dict[str, Any]:
         magnitudes = tuple(config['magnitudes'])
         options = tuple(config['items'][mag] for mag in magnitudes)
         locs = tuple(config['locations'][loc] for loc in config['locs'])
@@ -79,7 +97,8 @@ class TwoAFCTrial(Trial):
         reward_feedback_method = config.get('reward_feedback_method', 'bar_height')
         coordinate_space = config.get('coordinate_space', 'ndc')
         stimulus_set = config.get('stimulus_set')
-        return cls(
+        prestage_rewards = config.get('prestage_rewards', False)
+        return dict(
             options=options,
             magnitudes=magnitudes,
             locs=locs,
@@ -93,8 +112,12 @@ class TwoAFCTrial(Trial):
             reward_feedback_method=reward_feedback_method,
             coordinate_space=coordinate_space,
             stimulus_set=stimulus_set,
+            prestage_rewards=prestage_rewards,
         )
 
+    def stimulus_images(self) -> list[tuple]:
+        return [(image, self.size, self.coordinate_space) for image in self.options]
+
     def reward_params_for_choices(self) -> list[dict[str, Any]]:
         return [self.magnitude_mapping[mag] for mag in self.magnitudes]
 
@@ -110,7 +133,7 @@ class TwoAFCTrial(Trial):
 
     def build_targets(self) -> dict[str, ImageAdapter]:
         return {
-            choice_name: ImageAdapter(
+            choice_name: image_adapter(
                 image=self.options[index],
                 position=self.locs[index],
                 size=self.size,
@@ -131,8 +154,11 @@ class TwoAFCTrial(Trial):
     def correct_choice(self) -> str:
         return 'option1' if self.magnitudes[0] > self.magnitudes[1] else 'option2'
 
+    def outcome_for_choice(self, chosen: str) -> str:
+        return 'correct' if chosen == self.correct_choice() else 'incorrect'
+
     def result_for_choice(self, chosen: str, data: dict[str, Any], reward_params) -> TrialResult:
-        outcome = 'correct' if chosen == self.correct_choice() else 'incorrect'
+        outcome = self.outcome_for_choice(chosen)
         data['chosen'] = chosen
         return TrialResult(
             continue_session=True,
@@ -182,28 +208,23 @@ class TwoAFCTrial(Trial):
             **reward_params,
             **self.reward_adapter_kwargs(magnitude_level),
         )
-        return Scene(mgr, rew, background=background)
+        return self.reward_scene(mgr, rew, background)
 
-    def outcome_scene_for_result(
-        self,
-        mgr,
-        result: TrialResult,
-        chosen: str | None,
-        data: dict[str, Any],
-        reward_params,
-    ) -> Scene:
-        if result.outcome == 'timeout':
-            return Scene(
-                mgr,
-                adapter=TimeCounter(self.timeout_duration),
-                background=self.backgrounds['timeout'],
-            )
+    def reward_scene(self, mgr, rew: RewardAdapter, background) -> Scene:
+        scene = Scene(mgr, rew, background=background)
+        # run() stamps reward_start on this scene's first frame.
+        self.reward_scenes.append(scene)
+        return scene
 
+    def timeout_scene(self, mgr) -> Scene:
+        return session_scenes.time_counter(mgr, self.timeout_duration, self.backgrounds['timeout'])
+
+    def reward_scene_for_choice(self, mgr, chosen: str, outcome: str, reward_params) -> Scene:
         chosen_index = self.CHOICE_NAMES.index(chosen)
         chosen_reward = reward_params[chosen_index]
         chosen_mag_level = self.magnitudes[chosen_index]
         background = self.backgrounds['correct']
-        if result.outcome == 'incorrect' and self.cue_incorrect:
+        if outcome == 'incorrect' and self.cue_incorrect:
             background = self.backgrounds['incorrect']
         return self.get_reward_scene(
             mgr,
@@ -212,14 +233,58 @@ class TwoAFCTrial(Trial):
             background=background,
         )
 
+    def stage_reward_scenes(self, mgr, reward_params) -> dict[str, Scene]:
+        return {
+            choice_name: self.reward_scene_for_choice(
+                mgr,
+                choice_name,
+                self.outcome_for_choice(choice_name),
+                reward_params,
+            )
+            for choice_name in self.CHOICE_NAMES
+        }
+
+    def outcome_scene_for_result(
+        self,
+        mgr,
+        result: TrialResult,
+        chosen: str | None,
+        data: dict[str, Any],
+        reward_params,
+        staged_scenes: Optional[dict[str, Scene]] = None,
+    ) -> Scene:
+        if result.outcome == 'timeout':
+            return self.timeout_scene(mgr)
+        if staged_scenes is not None:
+            return staged_scenes[chosen]
+        return self.reward_scene_for_choice(mgr, chosen, result.outcome, reward_params)
+
     def run(self, mgr) -> TrialResult:
+        timeline = TrialTimeline()
         reward_params = self.reward_params_for_choices()
         data = self.trial_data(reward_params)
         scene, tc = self.get_choice_scene(mgr)
+        staged_scenes = None
+        if self.prestage_rewards:
+            # Both candidate rewards are known up front; build them before the
+            # choice scene so only the lookup remains between touch and reward.
+            # Building a RewardAdapter only holds its parameters; the pump is
+            # driven when its scene runs, so the unchosen one never rewards.
+            staged_scenes = self.stage_reward_scenes(mgr, reward_params)
 
-        scene.run()
+        timeline.mark('choice_scene_start')
+        frame_probe.arm(timeline, 'choice_first_frame', 'touch_registered')
+        try:
+            scene.run()
+        finally:
+            frame_probe.disarm()
+        timeline.mark('choice_scene_end')
         data['RT'] = tc.RT
+        if tc.chosen not in self.CHOICE_NAMES:
+            # Presses that did not end the scene are not a registered touch.
+            timeline.stamps.pop('touch_registered', None)
         if scene.quit:
+            self.end_session()
             return TrialResult(
                 continue_session=False,
                 outcome="quit",
@@ -230,12 +295,36 @@ class TwoAFCTrial(Trial):
             res = self.result_for_choice(tc.chosen, data, reward_params)
         else:
             res = self.timeout_result(data)
+        timeline.mark('result_computed')
 
-        outcome_scene = self.outcome_scene_for_result(mgr, res, tc.chosen, data, reward_params)
-        outcome_scene.run()
+        outcome_scene = self.outcome_scene_for_result(
+            mgr,
+            res,
+            tc.chosen,
+            data,
+            reward_params,
+            staged_scenes=staged_scenes,
+        )
+        timeline.mark('outcome_scene_built')
+        if any(outcome_scene is scene for scene in self.reward_scenes):
+            frame_probe.arm(timeline, 'reward_start')
+        try:
+            outcome_scene.run()
+        finally:
+            frame_probe.disarm()
         if outcome_scene.quit:
             res.continue_session = False
 
         print(data)
-        mgr.record(**data, outcome=res.outcome)
+        # Marked once the record is assembled, so the stored offsets include it.
+        timeline.mark('record_complete')
+        data['latency_ns'] = timeline.offsets()
+        trial_recorder.record(mgr, **data, outcome=res.outcome)
+        stage_latency.add(timeline)
+        if not res.continue_session:
+            self.end_session()
         return res
+
+    def end_session(self) -> None:
+        trial_recorder.flush()
+        print(format_latency_summary())